@@ -1,34 +1,76 @@
 from __future__ import annotations
+import base64
+import binascii
+import hashlib
+import io
+import json
 import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, Any, List, Tuple
 
-import requests
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, url_for
 from dotenv import load_dotenv
 
-from psycopg2.extras import RealDictCursor
+# Load .env before the local modules below read their settings at import time
+load_dotenv()
+
 from crud import (
     resolve_location_from_query,
     create_weather_request,
     list_requests_db,
+    requests_list_fingerprint,
     get_request_db,
+    get_requests_db,
+    get_daily_weather_db,
+    get_daily_weather_many_db,
+    store_daily_weather_db,
+    DAILY_WEATHER_FIELDS,
     update_request_db,
     relabel_location_db,
     delete_request_db,
+    cached_geo,
+    geocode_point,
+    geocode_cache_stats,
+    location_index,
+    AUTOCOMPLETE_LIMIT,
+    AUTOCOMPLETE_MIN_CHARS,
+    snap_point,
+    range_stats_db,
+    location_stats_version,
 )
+from autocomplete import SUPERSEDED, AutocompleteEngine
+from bulk import detect_format, export_requests, import_requests, iter_records
+from db_raw import DB_URL, get_conn, pool_stats, warm_pool
+from forecast_cache import forecast_cache
+import http_cache
+from json_provider import OrjsonProvider
+from prefetch import PrefetchScheduler
+import range_stats
+from range_stats import stats_cache, summarize, summary_from_row
+from live_updates import LIVE_HEARTBEAT_SECONDS, LIVE_REFRESH_SECONDS, HubFull, WeatherHub, sse_frame
+import metrics
+from units import convert_daily, convert_payload, normalize_unit
+from validators import parse_iso_date
+from upstream import (OPEN_METEO_ARCHIVE_BASE, OPEN_METEO_BASE, client as upstream_client, geo_get as _geo_get,
+                      open_meteo_get, upstream_stats)
 
-from datetime import date
+from datetime import date, datetime, timedelta, timezone
 
 
-load_dotenv()
-
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+metrics.init_app(app)
+http_cache.init_app(app)
 
 # Configure api keys
 GEOCODIFY_API_KEY = os.getenv("GEOCODIFY_API_KEY", "")
-OPEN_METEO_BASE = "https://api.open-meteo.com/v1/forecast"
-HEADERS = {"Accept": "application/json", "User-Agent": "WeatherApp/1.0 (+local)"}
+
+# Startup settings
+LAZY_INIT = os.getenv("LAZY_INIT", "0") == "1"  # start nothing at import; warm up in a fork hook or on first use
+WARM_UPSTREAM_URLS = [u.strip() for u in os.getenv("WARM_UPSTREAM_URLS", OPEN_METEO_BASE).split(",") if u.strip()]
 
 # Regex for detecting coordinates
 COORDS_RE = re.compile(r"^\s*([+-]?(?:\d+(?:\.\d+)?)),\s*([+-]?(?:\d+(?:\.\d+)?))\s*$")
@@ -96,6 +138,48 @@ def deg_to_compass(deg: float | None) -> str:
     ]
     return arr[(val % 16)]
 
+# Code -> (text, daytime icon), built once instead of per field per day
+WMO_DAY_LOOKUP = {code: (text, wmo_to_icon(code, 1)) for code, text in WMO_TEXT.items()}
+UNKNOWN_CODE = ("", wmo_to_icon(None, 1))
+
+# Response column -> Open-Meteo daily variable
+DAILY_COLUMN_SOURCES = (
+    ("t_max", "temperature_2m_max"),
+    ("t_min", "temperature_2m_min"),
+    ("pop", "precipitation_probability_max"),
+    ("wind_max", "wind_speed_10m_max"),
+    ("gust_max", "wind_gusts_10m_max"),
+)
+
+
+def _daily_columns(daily: Dict[str, Any], start: int = 0, stop: int | None = None) -> Dict[str, List[Any]]:
+    """Reshape an Open-Meteo daily block into aligned response columns."""
+    times = (daily.get("time") or [])[start:stop]
+    n = len(times)
+
+    def col(field):
+        values = (daily.get(field) or [])[start:stop]
+        return values + [None] * (n - len(values))
+
+    codes = col("weather_code")
+    looked_up = [WMO_DAY_LOOKUP.get(c, UNKNOWN_CODE) for c in codes]
+    out = {"date": times}
+    for name, field in DAILY_COLUMN_SOURCES:
+        out[name] = col(field)
+    out["code"] = codes
+    out["code_text"] = [t for t, _ in looked_up]
+    out["icon"] = [i for _, i in looked_up]
+    return out
+
+
+def _rows_from_columns(cols: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    keys = list(cols)
+    return [dict(zip(keys, values)) for values in zip(*cols.values())]
+
+
+def _wants_columnar() -> bool:
+    return request.args.get("format") == "columnar"
+
 # Checks if text is in coordinate format "lat, lon"
 def parse_coords(text: str) -> Tuple[float, float] | None:
     match = COORDS_RE.match(text)
@@ -111,17 +195,19 @@ def parse_coords(text: str) -> Tuple[float, float] | None:
 def index():
     return render_template("index.html")
 
-# Calls the api and geocodes the location
-def _geo_get(endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
-    url = f"https://api.geocodify.com/v2/{endpoint}"
-    try:
-        r = requests.get(url, params=params, headers=HEADERS, timeout=10)
-        if r.status_code == 429:
-           return {"_error": "rate_limited"}
-        r.raise_for_status()
-        return r.json()
-    except Exception as e:
-        return {"_error": str(e)}
+
+# Served from the root so the service worker's scope covers the whole app
+@app.get("/sw.js")
+def service_worker():
+    return app.send_static_file("sw.js")
+
+# Raw feature list of a Geocodify response, before any are dropped
+def _features(data: Dict[str, Any]) -> List[Any]:
+    # Geocodify wraps the feature collection in {"meta": ..., "response": {...}}
+    if isinstance(data.get("response"), dict):
+        data = data["response"]
+    feats = data.get("features") or data.get("results") or data.get("data") or []
+    return [feats] if isinstance(feats, dict) else feats
 
 # get location suggestions
 def _extract_suggestions(data: Dict[str, Any], limit: int = 10):
@@ -130,10 +216,7 @@ def _extract_suggestions(data: Dict[str, Any], limit: int = 10):
         return out
     if data.get("_error") == "rate_limited":
         return [{"label": "Rate-limited: pause typing for a second…", "lat": None, "lon": None, "disabled": True}]
-    feats = data.get("features") or data.get("results") or data.get("data") or []
-    if isinstance(feats, dict):
-        feats = [feats]
-    for f in feats[:limit]:
+    for f in _features(data)[:limit]:
         props = (f or {}).get("properties", {})
         geom = (f or {}).get("geometry", {})
         label = props.get("label") or props.get("name") or props.get("formatted") or f.get("text") or f.get("name")
@@ -149,21 +232,52 @@ def _extract_suggestions(data: Dict[str, Any], limit: int = 10):
             out.append({"label": label, "lat": float(lat), "lon": float(lon)})
     return out
 
+# Upstream lookup behind the autocomplete engine, through the geocode_cache table
+def _autocomplete_fetch(qn: str) -> Any:
+    def fetch():
+        data = _geo_get("autocomplete", _autocomplete_params(qn))
+        return data if "_error" in data else _suggestions_page(data)
+
+    return cached_geo("autocomplete", qn, fetch)
+
+
+def _autocomplete_params(qn: str) -> Dict[str, Any]:
+    return {"api_key": GEOCODIFY_API_KEY, "q": qn, "size": AUTOCOMPLETE_LIMIT}
+
+
+# (suggestions, complete): upstream sent fewer features than asked for, so it has no more for this prefix.
+# Counted before features without a label or coordinates are dropped.
+def _suggestions_page(data: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], bool]:
+    return _extract_suggestions(data, AUTOCOMPLETE_LIMIT), len(_features(data)) < AUTOCOMPLETE_LIMIT
+
+
+autocomplete_engine = AutocompleteEngine(_autocomplete_fetch)
+
+
+# One browser tab, from the random X-Client-Id the frontend sends. Without it there is no client to supersede:
+# unrelated callers behind one NAT or proxy share an address and user agent.
+def _client_key(req) -> str | None:
+    return req.headers.get("X-Client-Id", "")[:64] or None
+
+
+def _autocomplete_response(result: Any):
+    if result is SUPERSEDED:
+        return jsonify({"suggestions": [], "superseded": True})
+    if isinstance(result, dict):
+        if result.get("_error") == "rate_limited":
+            return jsonify({"suggestions": [{"label": "Rate-limited: pause typing for a second…", "lat": None, "lon": None, "disabled": True}]})
+        return jsonify({"error": f"Autocomplete failed: {result['_error']}"}), 502
+    return jsonify({"suggestions": result})
+
 # Autocomplete endpoint
 @app.route("/api/autocomplete")
 def autocomplete():
     q = request.args.get("q", "").strip()
-    if len(q) < 3:
+    if len(q) < AUTOCOMPLETE_MIN_CHARS:
         return jsonify({"suggestions": []})
     if not GEOCODIFY_API_KEY:
         return jsonify({"error": "Missing GEOCODIFY_API_KEY on server"}), 500
-    data = _geo_get("autocomplete", {"api_key": GEOCODIFY_API_KEY, "q": q})
-    if data.get("_error") == "rate_limited":
-        return jsonify({"suggestions": [{"label": "Rate-limited: pause typing for a second…", "lat": None, "lon": None, "disabled": True}]})
-    if "_error" in data:
-        return jsonify({"error": f"Autocomplete failed: {data['_error']}"}), 502
-    suggestions = _extract_suggestions(data)
-    return jsonify({"suggestions": suggestions})
+    return _autocomplete_response(autocomplete_engine.suggest(_client_key(request), q))
 
 # Geocode endpoint
 @app.route("/api/geocode")
@@ -174,33 +288,25 @@ def geocode():
 
     coords = parse_coords(q)
     if coords:
-        return jsonify({"label": q, "lat": coords[0], "lon": coords[1]})
+        # Typed coordinates next to a saved location share its forecast cell and cache entries
+        lat, lon, _ = snap_point(*coords)
+        return jsonify({"label": q, "lat": lat, "lon": lon})
     if not GEOCODIFY_API_KEY:
         return jsonify({"error": "Missing GEOCODIFY_API_KEY on server"}), 500
     
-    data = _geo_get("geocode", {"api_key": GEOCODIFY_API_KEY, "q": q})
-    if data.get("_error") == "rate_limited":
+    point = cached_geo("geocode", q, lambda: geocode_point(_geo_get("geocode", {"api_key": GEOCODIFY_API_KEY, "q": q})))
+    if point.get("_error") == "rate_limited":
         return jsonify({"error": "Geocodify rate limit hit. Type slower or upgrade the plan."}), 429
-    if "_error" in data:
-        return jsonify({"error": f"Geocoding failed: {data['_error']}"}), 502
-    c = data['response']['features'][0]['geometry']['coordinates']
-    return jsonify({"label": q, "lat": c[1], "lon": c[0]})
-
-# Gets the weather at a location
-@app.route("/api/weather")
-def weather():
-    try:
-        lat = float(request.args.get("lat"))
-        lon = float(request.args.get("lon"))
-    except Exception:
-        return jsonify({"error": "Invalid or missing lat/lon"}), 400
-
-    unit = request.args.get("unit", "fahrenheit")
-    temp_unit = "fahrenheit" if unit.lower().startswith("f") else "celsius"
+    if "_error" in point:
+        return jsonify({"error": f"Geocoding failed: {point['_error']}"}), 502
+    lat, lon, _ = snap_point(point["lat"], point["lon"])
+    return jsonify({"label": q, "lat": lat, "lon": lon})
 
-    params = {
-        "latitude": lat,
-        "longitude": lon,
+# Open-Meteo parameters for the 7-day forecast at one or more points, always in metric units
+def _forecast_params(lats: List[float], lons: List[float]) -> Dict[str, Any]:
+    return {
+        "latitude": ",".join(str(v) for v in lats),
+        "longitude": ",".join(str(v) for v in lons),
         "current": ",".join([
             "temperature_2m",
             "relative_humidity_2m",
@@ -223,20 +329,22 @@ def weather():
         ]),
         "timezone": "auto",
         "forecast_days": 7,
-        "temperature_unit": temp_unit,
-        "wind_speed_unit": "mph" if temp_unit == "fahrenheit" else "kmh",
-        "precipitation_unit": "inch" if temp_unit == "fahrenheit" else "mm",
     }
 
-    try:
-        r = requests.get(OPEN_METEO_BASE, params=params, headers=HEADERS, timeout=15)
-        r.raise_for_status()
-        data = r.json()
-    except Exception as e:
-        return jsonify({"error": f"Open-Meteo request failed: {e}"}), 502
+# Fetches the 7-day forecast for one point from Open-Meteo, always in metric units
+def _fetch_forecast(lat: float, lon: float) -> Dict[str, Any]:
+    return open_meteo_get(_forecast_params([lat], [lon]))
 
+
+def _fetch_forecasts(points: List[Tuple[float, float]]) -> List[Dict[str, Any]]:
+    """Fetch forecasts for many points in a single multi-coordinate call."""
+    data = open_meteo_get(_forecast_params([p[0] for p in points], [p[1] for p in points]))
+    return data if isinstance(data, list) else [data]
+
+# Current-conditions block of a forecast already converted to the response unit
+def _current_conditions(data: Dict[str, Any]) -> Dict[str, Any]:
     cur = (data or {}).get("current", {})
-    current = {
+    return {
         "temperature": cur.get("temperature_2m"),
         "apparent_temperature": cur.get("apparent_temperature"),
         "humidity": cur.get("relative_humidity_2m"),
@@ -252,27 +360,163 @@ def weather():
         "time": cur.get("time"),
         "unit_labels": data.get("current_units", {}),
     }
-    daily = data.get("daily", {})
-    days = []
-    for i, date in enumerate(daily.get("time", [])[2:7]):
-        code = (daily.get("weather_code", []) or [None])[i]
-        days.append({
-            "date": date,
-            "t_max": (daily.get("temperature_2m_max", []) or [None])[i],
-            "t_min": (daily.get("temperature_2m_min", []) or [None])[i],
-            "pop": (daily.get("precipitation_probability_max", []) or [None])[i],
-            "wind_max": (daily.get("wind_speed_10m_max", []) or [None])[i],
-            "gust_max": (daily.get("wind_gusts_10m_max", []) or [None])[i],
-            "code": code,
-            "code_text": WMO_TEXT.get(code, ""),
-            "icon": wmo_to_icon(code, 1),
-        })
-    return jsonify({
+
+
+# Shapes a metric Open-Meteo forecast into the /api/weather response
+def _weather_payload(lat: float, lon: float, data: Dict[str, Any], temp_unit: str, columnar: bool = False) -> Dict[str, Any]:
+    data = convert_payload(data, temp_unit)
+    current = _current_conditions(data)
+    # Forecast card shows days 2-6 of the 7-day forecast
+    cols = _daily_columns(data.get("daily", {}) or {}, 2, 7)
+    return {
         "location": {"lat": lat, "lon": lon},
         "unit": temp_unit,
         "current": current,
-        "daily": days,
-    })
+        "daily": cols if columnar else _rows_from_columns(cols),
+    }
+
+
+def _cached_forecast(key: Tuple[float, float]) -> Dict[str, Any]:
+    return forecast_cache.get_or_fetch(key, lambda: _fetch_forecast(key[0], key[1]))
+
+
+# One refresher per subscribed grid cell; shares the forecast cache with /api/weather
+weather_hub = WeatherHub(_cached_forecast)
+
+# Gets the weather at a location
+@app.route("/api/weather")
+def weather():
+    try:
+        lat = float(request.args.get("lat"))
+        lon = float(request.args.get("lon"))
+    except Exception:
+        return jsonify({"error": "Invalid or missing lat/lon"}), 400
+
+    unit = request.args.get("unit", "fahrenheit")
+    temp_unit = "fahrenheit" if unit.lower().startswith("f") else "celsius"
+
+    # Nearby points share one upstream fetch for the snapped grid cell, in either unit
+    try:
+        data = _cached_forecast(forecast_cache.key(lat, lon))
+    except Exception as e:
+        return jsonify({"error": f"Open-Meteo request failed: {e}"}), 502
+    return jsonify(_weather_payload(lat, lon, data, temp_unit, _wants_columnar()))
+
+COMPARE_MAX_LOCATIONS = int(os.getenv("COMPARE_MAX_LOCATIONS", "10"))
+COMPARE_GEOCODE_WORKERS = 8
+
+
+# Resolves one compare entry ("lat, lon" or a place name) to a snapped point or {"query", "error"}
+def _compare_point(q: str) -> Dict[str, Any]:
+    coords = parse_coords(q)
+    if coords is None:
+        if not GEOCODIFY_API_KEY:
+            return {"query": q, "error": "Missing GEOCODIFY_API_KEY on server"}
+        point = cached_geo("geocode", q, lambda: geocode_point(_geo_get("geocode", {"api_key": GEOCODIFY_API_KEY, "q": q})))
+        if "_error" in point:
+            return {"query": q, "error": f"Geocoding failed: {point['_error']}"}
+        coords = (point["lat"], point["lon"])
+    lat, lon, _ = snap_point(*coords)
+    return {"query": q, "label": q, "lat": lat, "lon": lon}
+
+
+# Side-by-side 7-day forecasts for several places: one geocode per name, run concurrently,
+# then one multi-coordinate Open-Meteo call for every cell not already cached
+@app.get("/api/weather/compare")
+def weather_compare():
+    queries = [q.strip() for q in request.args.getlist("q") if q.strip()]
+    if not queries:
+        return jsonify({"error": "Missing q (repeat it once per location)"}), 400
+    if len(queries) > COMPARE_MAX_LOCATIONS:
+        return jsonify({"error": f"At most {COMPARE_MAX_LOCATIONS} locations"}), 400
+
+    unit = request.args.get("unit", "fahrenheit")
+    temp_unit = "fahrenheit" if unit.lower().startswith("f") else "celsius"
+
+    if len(queries) == 1:
+        locations = [_compare_point(queries[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(queries), COMPARE_GEOCODE_WORKERS)) as pool:
+            locations = list(pool.map(_compare_point, queries))
+
+    resolved = [loc for loc in locations if "error" not in loc]
+    keys = [forecast_cache.key(loc["lat"], loc["lon"]) for loc in resolved]
+    try:
+        forecasts = forecast_cache.get_many_or_fetch(keys, _fetch_forecasts) if keys else []
+    except Exception as e:
+        return jsonify({"error": f"Open-Meteo request failed: {e}"}), 502
+
+    # Each place's days are in its own timezone, so columns are aligned on the union of dates
+    per_loc = {}
+    for loc, data in zip(resolved, forecasts):
+        data = convert_payload(data, temp_unit)
+        loc["current"] = _current_conditions(data)
+        per_loc[id(loc)] = _daily_columns(data.get("daily", {}) or {})
+    dates = sorted({d for cols in per_loc.values() for d in cols["date"]})
+    daily: Dict[str, List[List[Any]]] = {name: [] for name, _ in DAILY_COLUMN_SOURCES}
+    daily.update({"code": [], "code_text": [], "icon": []})
+    for loc in locations:
+        cols = per_loc.get(id(loc), {"date": []})
+        at = {d: i for i, d in enumerate(cols["date"])}
+        for name in daily:
+            values = cols.get(name, [])
+            daily[name].append([values[at[d]] if d in at else None for d in dates])
+
+    resp = jsonify({"unit": temp_unit, "dates": dates, "locations": locations, "daily": daily})
+    resp.headers["Cache-Control"] = http_cache.forecast_max_age(keys)
+    return resp
+
+# Headers for the live stream; X-Accel-Buffering stops nginx from holding frames back
+LIVE_STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _live_hub_full(e: HubFull):
+    # The page falls back to polling /api/weather
+    resp = jsonify({"error": str(e)})
+    resp.headers["Retry-After"] = str(int(LIVE_REFRESH_SECONDS))
+    return resp, 503
+
+
+# One SSE frame for a hub event, or a keep-alive comment when the wait for one timed out
+def _live_frame(event: Any, lat: float, lon: float, temp_unit: str, columnar: bool) -> str:
+    if event is None:
+        # Comment line keeps proxies from closing the idle stream and surfaces dead clients
+        return ": keep-alive\n\n"
+    kind, data = event
+    if kind == "weather":
+        data = _weather_payload(lat, lon, data, temp_unit, columnar)
+    return sse_frame(kind, app.json.dumps(data))
+
+
+# Pushes /api/weather payloads as Server-Sent Events whenever the cell's forecast changes
+@app.get("/api/weather/stream")
+def weather_stream():
+    try:
+        lat = float(request.args.get("lat"))
+        lon = float(request.args.get("lon"))
+    except Exception:
+        return jsonify({"error": "Invalid or missing lat/lon"}), 400
+
+    unit = request.args.get("unit", "fahrenheit")
+    temp_unit = "fahrenheit" if unit.lower().startswith("f") else "celsius"
+    columnar = _wants_columnar()
+
+    try:
+        sub = weather_hub.subscribe(forecast_cache.key(lat, lon))
+    except HubFull as e:
+        return _live_hub_full(e)
+
+    def generate():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                yield _live_frame(sub.get(LIVE_HEARTBEAT_SECONDS), lat, lon, temp_unit, columnar)
+        finally:
+            sub.close()
+
+    resp = Response(generate(), mimetype="text/event-stream")
+    resp.headers.update(LIVE_STREAM_HEADERS)
+    return resp
 
 # Start database entry
 @app.post("/api/requests")
@@ -304,11 +548,94 @@ def create_request_api():
     except Exception as e:
         return jsonify({"error": f"Create failed: {e}"}), 500
 
-# List database entries    
+# Bulk-load saved requests from a CSV or JSONL request body
+@app.post("/api/requests/bulk")
+def bulk_import_api():
+    fmt = request.args.get("format") or detect_format(None, request.content_type)
+    if fmt not in ("csv", "jsonl"):
+        return jsonify({"error": "format must be csv or jsonl"}), 400
+    stream = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+    try:
+        summary = import_requests(iter_records(stream, fmt))
+    except Exception as e:
+        return jsonify({"error": f"Bulk import failed: {e}"}), 500
+    return jsonify(summary), 201 if summary["inserted"] else 200
+
+# Stream every saved request out as CSV or JSONL
+@app.get("/api/requests/export")
+def bulk_export_api():
+    fmt = request.args.get("format", "jsonl")
+    if fmt not in ("csv", "jsonl"):
+        return jsonify({"error": "format must be csv or jsonl"}), 400
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    resp = Response(export_requests(fmt), mimetype=mimetype)
+    resp.headers["Content-Disposition"] = f"attachment; filename=weather_requests.{fmt}"
+    return resp
+
+# Page size bounds for GET /api/requests
+REQUESTS_PAGE_DEFAULT = 200
+REQUESTS_PAGE_MAX = 500
+
+
+# Opaque keyset cursor over (created_at, id)
+def _encode_cursor(row: Dict[str, Any]) -> str:
+    raw = json.dumps([row["created_at"].isoformat(), row["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    created_at, req_id = json.loads(raw)
+    return datetime.fromisoformat(created_at), int(req_id)
+
+# List database entries
 @app.get("/api/requests")
 def list_requests_api():
-    rows = list_requests_db(limit=200)
-    return jsonify(rows)
+    args = request.args
+    try:
+        limit = min(max(int(args.get("limit", REQUESTS_PAGE_DEFAULT)), 1), REQUESTS_PAGE_MAX)
+        after = _decode_cursor(args["cursor"]) if args.get("cursor") else None
+        location_id = int(args["location_id"]) if args.get("location_id") else None
+        start = parse_iso_date(args["from"]) if args.get("from") else None
+        end = parse_iso_date(args["to"]) if args.get("to") else None
+        unit = normalize_unit(args["unit"]) if args.get("unit") else None
+    except (ValueError, TypeError, binascii.Error):
+        return jsonify({"error": "Invalid limit, cursor, location_id, from, to or unit"}), 400
+
+    # The fingerprint changes with every write to the listed rows, so a matching ETag skips building the page
+    overlaps = (start, end) if start or end else None
+    etag = last_modified = None
+    try:
+        fingerprint, last_modified = requests_list_fingerprint(location_id, overlaps, unit)
+    except Exception:
+        fingerprint = None
+    if fingerprint:
+        etag = hashlib.sha1(f"{fingerprint}?{request.query_string.decode()}".encode()).hexdigest()[:20]
+        not_modified = request.if_none_match.contains_weak(etag) or (
+            not request.if_none_match
+            and last_modified is not None
+            and request.if_modified_since is not None
+            and last_modified.replace(microsecond=0) <= request.if_modified_since
+        )
+        if not_modified:
+            resp = Response(status=304)
+            resp.set_etag(etag, weak=True)
+            resp.last_modified = last_modified
+            return resp
+
+    rows = list_requests_db(limit=limit + 1, after=after, location_id=location_id, overlaps=overlaps, unit=unit)
+    resp = jsonify(rows[:limit])
+    if len(rows) > limit:
+        next_cursor = _encode_cursor(rows[limit - 1])
+        next_args = args.to_dict()
+        next_args["cursor"] = next_cursor
+        resp.headers["X-Next-Cursor"] = next_cursor
+        resp.headers["Link"] = f'<{url_for("list_requests_api", **next_args)}>; rel="next"'
+    if etag:
+        resp.set_etag(etag, weak=True)
+        resp.last_modified = last_modified
+        resp.headers["Cache-Control"] = "no-cache"
+    return resp
 
 
 @app.get("/api/requests/<int:req_id>")
@@ -349,6 +676,25 @@ def relabel_location_api(loc_id: int):
         return jsonify({"error": "Not found"}), 404
     return jsonify({"message": "Updated"})
 
+NEARBY_MAX_RADIUS_KM = 500
+NEARBY_MAX_LIMIT = 100
+
+# Saved locations around a point, nearest first, answered from the in-memory index
+@app.get("/api/locations/nearby")
+def nearby_locations_api():
+    try:
+        lat = float(request.args.get("lat"))
+        lon = float(request.args.get("lon"))
+        radius_km = float(request.args.get("radius_km", "10"))
+        limit = int(request.args.get("limit", "10"))
+    except Exception:
+        return jsonify({"error": "Invalid or missing lat/lon"}), 400
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return jsonify({"error": "lat/lon out of range"}), 400
+    radius_km = min(max(radius_km, 0.0), NEARBY_MAX_RADIUS_KM)
+    limit = min(max(limit, 1), NEARBY_MAX_LIMIT)
+    return jsonify({"locations": location_index.nearby(lat, lon, radius_km * 1000, limit)})
+
 # Delete entry
 @app.delete("/api/requests/<int:req_id>")
 def delete_request_api(req_id: int):
@@ -357,50 +703,224 @@ def delete_request_api(req_id: int):
         return jsonify({"error": "Not found"}), 404
     return jsonify({"message": "Deleted"})
 
+# Daily variables requested for saved date ranges (also the daily_weather columns)
+RANGE_DAILY_FIELDS = DAILY_WEATHER_FIELDS
+
+# Days at least this far before today (UTC) are treated as final in daily_weather
+DAILY_FINAL_AFTER_DAYS = int(os.getenv("DAILY_WEATHER_FINAL_AFTER_DAYS", "2"))
+
+# Max coordinates per multi-location Open-Meteo call
+BATCH_MAX_COORDS = int(os.getenv("BATCH_MAX_COORDS", "50"))
+# Max days one such call may span; every location in it is fetched for the whole span
+BATCH_MAX_SPAN_DAYS = int(os.getenv("BATCH_MAX_SPAN_DAYS", "31"))
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "1000"))
+
+
+# Days older than this come from the archive API, whose reanalysis data lags real time by about five days
+ARCHIVE_AFTER_DAYS = int(os.getenv("OPEN_METEO_ARCHIVE_AFTER_DAYS", "7"))
+FORECAST_HORIZON_DAYS = 16
+# The archive has no precipitation probability; those days keep it as null
+ARCHIVE_DAILY_FIELDS = [f for f in RANGE_DAILY_FIELDS if f != "precipitation_probability_max"]
+
+
+def _range_params(lats: List[float], lons: List[float], start_d: date, end_d: date,
+                  fields: List[str] = RANGE_DAILY_FIELDS) -> Dict[str, Any]:
+    return {
+        "latitude": ",".join(str(v) for v in lats),
+        "longitude": ",".join(str(v) for v in lons),
+        "daily": ",".join(fields),
+        "start_date": start_d.isoformat(),
+        "end_date": end_d.isoformat(),
+        "timezone": "auto",
+    }
+
+
+# Keeps only the days of a daily block that fall inside [start_d, end_d]
+def _slice_daily(daily: Dict[str, Any], start_d: date, end_d: date) -> Dict[str, Any]:
+    times = daily.get("time") or []
+    lo, hi = start_d.isoformat(), end_d.isoformat()
+    idx = [i for i, t in enumerate(times) if lo <= t <= hi]
+    out = {}
+    for k, col in daily.items():
+        if isinstance(col, list) and len(col) == len(times):
+            out[k] = [col[i] for i in idx]
+        else:
+            out[k] = col
+    return out
+
+
+# First day that may still change upstream; earlier days are stored as final
+def _final_before() -> date:
+    return datetime.now(timezone.utc).date() - timedelta(days=DAILY_FINAL_AFTER_DAYS - 1)
+
+
+# Serves a location's range from daily_weather, fetching only missing or still-changing days
+def _stored_range_daily(location_id: int, lat: float, lon: float, start_d: date, end_d: date) -> Dict[str, Any]:
+    try:
+        stored = get_daily_weather_db(location_id, start_d, end_d)
+    except Exception:
+        stored = []
+    by_day, missing = _stored_days(stored, start_d, end_d)
+    if missing:
+        fetched = _range_weather_multi([(lat, lon)], *missing)[0]
+        try:
+            store_daily_weather_db(location_id, fetched, _final_before())
+        except Exception:
+            pass
+        _add_fetched_days(by_day, fetched)
+    return _daily_from_days(by_day, start_d, end_d)
+
+
+# Usable stored days of a span keyed by ISO date, plus the (first, last) missing day or None
+def _stored_days(stored: List[Dict[str, Any]], start_d: date, end_d: date) -> Tuple[Dict[str, Any], Tuple[date, date] | None]:
+    by_day = {row["day"].isoformat(): row for row in stored if row["usable"]}
+    span = [start_d + timedelta(days=i) for i in range((end_d - start_d).days + 1)]
+    missing = [d for d in span if d.isoformat() not in by_day]
+    return by_day, (missing[0], missing[-1]) if missing else None
+
+
+def _add_fetched_days(by_day: Dict[str, Any], fetched: Dict[str, Any]) -> None:
+    times = fetched.get("time") or []
+    for i, t in enumerate(times):
+        if t not in by_day:
+            by_day[t] = {f: (fetched.get(f) or [None] * len(times))[i] for f in RANGE_DAILY_FIELDS}
+
+
+def _daily_from_days(by_day: Dict[str, Any], start_d: date, end_d: date) -> Dict[str, Any]:
+    span = [(start_d + timedelta(days=i)).isoformat() for i in range((end_d - start_d).days + 1)]
+    days = [d for d in span if d in by_day]
+    daily = {"time": days}
+    for f in RANGE_DAILY_FIELDS:
+        daily[f] = [by_day[d][f] for d in days]
+    return daily
+
+
 # Get weather for database entry
-def _range_weather_from_open_meteo(lat, lon, start_d: date, end_d: date, unit: str):
-    """Return list[dict] of daily weather for [start_d, end_d] using the forecast endpoint.
-       If Open-Meteo returns partial/empty results (e.g., far past), we just return what we get.
+def _range_weather_from_open_meteo(lat, lon, start_d: date, end_d: date, unit: str, location_id: int | None = None,
+                                   columnar: bool = False):
+    """Return list[dict] of daily weather for [start_d, end_d].
+       Past days come from the archive endpoint and recent/future ones from the forecast endpoint.
+       Upstream is always queried in metric and converted locally for fahrenheit.
+       With a location_id, finalized days come from daily_weather and fetched days are stored there.
     """
     temp_unit = "fahrenheit" if unit.lower().startswith("f") else "celsius"
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "daily": ",".join([
-            "weather_code",
-            "temperature_2m_max",
-            "temperature_2m_min",
-            "precipitation_probability_max",
-            "wind_speed_10m_max",
-            "wind_gusts_10m_max",
-        ]),
+    if location_id is not None:
+        daily = _stored_range_daily(location_id, lat, lon, start_d, end_d)
+    else:
+        daily = _range_weather_multi([(lat, lon)], start_d, end_d)[0]
+    cols = _daily_columns(convert_daily(daily, temp_unit))
+    return (cols if columnar else _rows_from_columns(cols)), temp_unit
+
+
+# Splits [start_d, end_d] into (kind, start, end) pieces served by different Open-Meteo endpoints
+def _range_segments(start_d: date, end_d: date) -> List[Tuple[str, date, date]]:
+    today = datetime.now(timezone.utc).date()
+    bounds = [
+        ("archive", start_d, min(end_d, today - timedelta(days=ARCHIVE_AFTER_DAYS + 1))),
+        ("recent", max(start_d, today - timedelta(days=ARCHIVE_AFTER_DAYS)), min(end_d, today - timedelta(days=1))),
+        ("forecast", max(start_d, today), min(end_d, today + timedelta(days=FORECAST_HORIZON_DAYS - 1))),
+    ]
+    return [(kind, s, e) for kind, s, e in bounds if s <= e]
+
+
+# Open-Meteo URL and parameters for one segment
+def _segment_request(points: List[Tuple[float, float]], kind: str, start_d: date, end_d: date) -> Tuple[str, Dict[str, Any]]:
+    lats, lons = [p[0] for p in points], [p[1] for p in points]
+    if kind == "archive":
+        return OPEN_METEO_ARCHIVE_BASE, _range_params(lats, lons, start_d, end_d, ARCHIVE_DAILY_FIELDS)
+    return OPEN_METEO_BASE, _range_params(lats, lons, start_d, end_d)
+
+
+def _segment_blocks(data: Any) -> List[Dict[str, Any]]:
+    # Open-Meteo answers a single coordinate with an object and several with a list
+    results = data if isinstance(data, list) else [data]
+    return [(r or {}).get("daily", {}) or {} for r in results]
+
+
+# Concatenates one point's segment blocks (oldest first) into a single daily block
+def _merge_daily(blocks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    if len(blocks) == 1:
+        return blocks[0]
+    merged: Dict[str, Any] = {"time": []}
+    for f in RANGE_DAILY_FIELDS:
+        merged[f] = []
+    for block in blocks:
+        times = block.get("time") or []
+        merged["time"].extend(times)
+        for f in RANGE_DAILY_FIELDS:
+            values = block.get(f) or []
+            merged[f].extend(values[:len(times)] + [None] * (len(times) - len(values)))
+    return merged
+
+
+def _range_weather_multi(points: List[Tuple[float, float]], start_d: date, end_d: date) -> List[Dict[str, Any]]:
+    """Fetch metric daily blocks for many points over one shared range.
+
+    Archive, recent and forecast segments each take one multi-coordinate
+    call to their endpoint, run in parallel. Days past the forecast horizon
+    are left out.
+    """
+    segments = _range_segments(start_d, end_d)
+    if not segments:
+        return [{} for _ in points]
+
+    def fetch(segment):
+        url, params = _segment_request(points, *segment)
+        return _segment_blocks(open_meteo_get(params, base=url))
+
+    if len(segments) == 1:
+        per_segment = [fetch(segments[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=len(segments)) as pool:
+            per_segment = list(pool.map(fetch, segments))
+    return [_merge_daily([blocks[i] for blocks in per_segment]) for i in range(len(points))]
+
+
+# Loads one prefetch chunk's forecasts into this process's cache with one upstream call
+def _prefetch_warm(locs: List[Dict[str, Any]]) -> None:
+    keys = list(dict.fromkeys(forecast_cache.key(float(r["lat"]), float(r["lon"])) for r in locs))
+    for key, data in zip(keys, _fetch_forecasts(keys)):
+        forecast_cache.put(key, data)
+
+
+# Leader pass: forecasts plus the still-changing days of each location's saved requests
+def _prefetch_refresh(locs: List[Dict[str, Any]]) -> None:
+    _prefetch_warm(locs)
+    ranged = [r for r in locs if r["start_date"] <= r["end_date"]]
+    if not ranged:
+        return
+    start_d = min(r["start_date"] for r in ranged)
+    end_d = max(r["end_date"] for r in ranged)
+    blocks = _range_weather_multi([(float(r["lat"]), float(r["lon"])) for r in ranged], start_d, end_d)
+    final_before = _final_before()
+    for r, daily in zip(ranged, blocks):
+        store_daily_weather_db(r["location_id"], _slice_daily(daily, r["start_date"], r["end_date"]), final_before)
+
+
+prefetcher = PrefetchScheduler(_prefetch_warm, _prefetch_refresh, DAILY_FINAL_AFTER_DAYS)
+
+
+@app.before_request
+def _start_prefetcher():
+    prefetcher.ensure_started()
+
+
+# Parses a saved request row into its response header and date range
+def _saved_request_meta(row: Dict[str, Any]) -> Tuple[Dict[str, Any], date, date]:
+    # row["start_date"]/["end_date"] may already be strings ('YYYY-MM-DD') from the DB;
+    # if they are date objects, .isoformat() handles it the same.
+    start_d = date.fromisoformat(str(row["start_date"])[:10])
+    end_d = date.fromisoformat(str(row["end_date"])[:10])
+    meta = {
+        "id": row["id"],
+        "label": row["label"],
         "start_date": start_d.isoformat(),
         "end_date": end_d.isoformat(),
-        "timezone": "auto",
-        "temperature_unit": temp_unit,
-        "wind_speed_unit": "mph" if temp_unit == "fahrenheit" else "kmh",
-        "precipitation_unit": "inch" if temp_unit == "fahrenheit" else "mm",
+        "unit": row.get("unit", "fahrenheit"),
+        "lat": float(row["lat"]),
+        "lon": float(row["lon"]),
     }
-    r = requests.get(OPEN_METEO_BASE, params=params, headers=HEADERS, timeout=15)
-    r.raise_for_status()
-    data = r.json() or {}
-    daily = data.get("daily", {}) or {}
-    out = []
-    times = daily.get("time") or []
-    for i, d in enumerate(times):
-        code = (daily.get("weather_code") or [None])[i]
-        out.append({
-            "date": d,
-            "t_max": (daily.get("temperature_2m_max") or [None])[i],
-            "t_min": (daily.get("temperature_2m_min") or [None])[i],
-            "pop": (daily.get("precipitation_probability_max") or [None])[i],
-            "wind_max": (daily.get("wind_speed_10m_max") or [None])[i],
-            "gust_max": (daily.get("wind_gusts_10m_max") or [None])[i],
-            "code": code,
-            "code_text": WMO_TEXT.get(code, "") if code is not None else "",
-            "icon": wmo_to_icon(code, 1),
-        })
-    return out, temp_unit
+    return meta, start_d, end_d
 
 @app.get("/api/requests/<int:req_id>/weather")
 def weather_for_saved_request(req_id: int):
@@ -408,39 +928,270 @@ def weather_for_saved_request(req_id: int):
     if not row:
         return jsonify({"error": "Not found"}), 404
 
-    # row["start_date"]/["end_date"] may already be strings ('YYYY-MM-DD') from the DB;
-    # if they are date objects, .isoformat() handles it the same.
     try:
-        # Accept both strings and date objects
-        start_s = str(row["start_date"])
-        end_s = str(row["end_date"])
-        start_d = date.fromisoformat(start_s[:10])
-        end_d = date.fromisoformat(end_s[:10])
+        meta, start_d, end_d = _saved_request_meta(row)
     except Exception:
         return jsonify({"error": "Bad dates in saved request"}), 500
 
-    lat = float(row["lat"])
-    lon = float(row["lon"])
-    unit = row.get("unit", "fahrenheit")
-
+    prefetcher.note_access(row["location_id"])
     try:
-        days, temp_unit = _range_weather_from_open_meteo(lat, lon, start_d, end_d, unit)
+        days, temp_unit = _range_weather_from_open_meteo(
+            meta["lat"], meta["lon"], start_d, end_d, meta["unit"], location_id=row["location_id"],
+            columnar=_wants_columnar(),
+        )
     except Exception as e:
         return jsonify({"error": f"Open-Meteo request failed: {e}"}), 502
 
     return jsonify({
-        "request": {
-            "id": row["id"],
-            "label": row["label"],
-            "start_date": start_d.isoformat(),
-            "end_date": end_d.isoformat(),
-            "unit": unit,
-            "lat": lat,
-            "lon": lon,
-        },
+        "request": meta,
         "daily": days,
         "unit": temp_unit,
     })
 
+def _describe_code(code: int) -> str:
+    return WMO_TEXT.get(code, "Unknown")
+
+
+# Summary of a saved request's range, cached per (location, range, unit)
+@app.get("/api/requests/<int:req_id>/stats")
+def saved_request_stats(req_id: int):
+    row = get_request_db(req_id)
+    if not row:
+        return jsonify({"error": "Not found"}), 404
+
+    try:
+        meta, start_d, end_d = _saved_request_meta(row)
+    except Exception:
+        return jsonify({"error": "Bad dates in saved request"}), 500
+
+    temp_unit = normalize_unit(request.args.get("unit") or meta["unit"])
+
+    def compute():
+        cols, _ = _range_weather_from_open_meteo(meta["lat"], meta["lon"], start_d, end_d, temp_unit,
+                                                 location_id=row["location_id"], columnar=True)
+        return summarize(cols, _describe_code)
+
+    prefetcher.note_access(row["location_id"])
+    try:
+        stats = stats_cache.get_or_fetch((row["location_id"], start_d, end_d, temp_unit), compute)
+    except Exception as e:
+        return jsonify({"error": f"Open-Meteo request failed: {e}"}), 502
+    return jsonify({"request": meta, "unit": temp_unit, "stats": stats})
+
+
+# The same summary for every saved request of a location, computed in SQL over stored days only
+@app.get("/api/locations/<int:loc_id>/stats")
+def location_stats_api(loc_id: int):
+    temp_unit = normalize_unit(request.args.get("unit"))
+
+    def compute():
+        rows, overall = range_stats_db(loc_id)
+        return {
+            "location_id": loc_id,
+            "unit": temp_unit,
+            "overall": summary_from_row(overall, temp_unit, _describe_code),
+            "requests": [{
+                "id": r["id"],
+                "start_date": r["start_date"].isoformat(),
+                "end_date": r["end_date"].isoformat(),
+                "unit": r["unit"],
+                "stats": summary_from_row(r, temp_unit, _describe_code),
+            } for r in rows],
+        }
+
+    # Keyed on the rows it is computed from, so a write handled by another worker is seen at once
+    version = location_stats_version(loc_id)
+    if version[0] == 0:
+        return jsonify({"error": "No saved requests for this location"}), 404
+    return jsonify(stats_cache.get_or_fetch((loc_id, None, None, temp_unit, *version[1:]), compute))
+
+# Splits locations sorted by missing span into upstream calls. Neighbouring spans share a call, which covers
+# their union, so a call stops taking locations once that union would pass BATCH_MAX_SPAN_DAYS.
+def _span_chunks(groups: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    chunks: List[List[Dict[str, Any]]] = []
+    for g in groups:
+        chunk = chunks[-1] if chunks else None
+        if chunk is not None and len(chunk) < BATCH_MAX_COORDS:
+            end_d = max(g["missing"][1], max(c["missing"][1] for c in chunk))
+            if (end_d - chunk[0]["missing"][0]).days < BATCH_MAX_SPAN_DAYS:
+                chunk.append(g)
+                continue
+        chunks.append([g])
+    return chunks
+
+
+# Weather for many saved requests, streamed back as NDJSON (one request per line)
+@app.post("/api/requests/weather")
+def batch_weather_for_saved_requests():
+    p = request.get_json(force=True, silent=True) or {}
+    columnar = _wants_columnar() or p.get("format") == "columnar"
+    if p.get("all"):
+        rows = list_requests_db(limit=BATCH_MAX_REQUESTS)
+    else:
+        try:
+            ids = [int(i) for i in p.get("ids") or []]
+        except (TypeError, ValueError):
+            return jsonify({"error": "ids must be a list of integers"}), 400
+        if not ids:
+            return jsonify({"error": "Provide ids or all=true"}), 400
+        if len(ids) > BATCH_MAX_REQUESTS:
+            return jsonify({"error": f"At most {BATCH_MAX_REQUESTS} ids per batch"}), 400
+        rows = get_requests_db(ids)
+
+    # One entry per location covering all of its requests' dates
+    by_loc: Dict[Any, Dict[str, Any]] = {}
+    errors = []
+    for row in rows:
+        try:
+            meta, start_d, end_d = _saved_request_meta(row)
+        except Exception:
+            errors.append({"id": row["id"], "error": "Bad dates in saved request"})
+            continue
+        g = by_loc.setdefault(row["location_id"], {"location_id": row["location_id"], "lat": meta["lat"],
+                                                   "lon": meta["lon"], "start": start_d, "end": end_d,
+                                                   "requests": []})
+        g["start"] = min(g["start"], start_d)
+        g["end"] = max(g["end"], end_d)
+        g["requests"].append((meta, start_d, end_d))
+        prefetcher.note_access(row["location_id"])
+
+    # Stored days answer first; only the missing or still-changing span of each location is fetched
+    try:
+        stored = get_daily_weather_many_db([(g["location_id"], g["start"], g["end"]) for g in by_loc.values()])
+    except Exception:
+        stored = {}
+    for g in by_loc.values():
+        g["days"], g["missing"] = _stored_days(stored.get(g["location_id"], []), g["start"], g["end"])
+
+    def request_lines(g):
+        lines = []
+        for meta, s, e in g["requests"]:
+            temp_unit = "fahrenheit" if meta["unit"].lower().startswith("f") else "celsius"
+            cols = _daily_columns(convert_daily(_daily_from_days(g["days"], s, e), temp_unit))
+            days = cols if columnar else _rows_from_columns(cols)
+            lines.append({"request": meta, "daily": days, "unit": temp_unit})
+        return lines
+
+    complete = [g for g in by_loc.values() if g["missing"] is None]
+    chunks = _span_chunks(sorted((g for g in by_loc.values() if g["missing"] is not None), key=lambda g: g["missing"]))
+
+    def fetch_chunk(chunk):
+        start_d = min(g["missing"][0] for g in chunk)
+        end_d = max(g["missing"][1] for g in chunk)
+        blocks = _range_weather_multi([(g["lat"], g["lon"]) for g in chunk], start_d, end_d)
+        final_before = _final_before()
+        lines = []
+        for g, daily in zip(chunk, blocks):
+            daily = _slice_daily(daily, *g["missing"])
+            try:
+                store_daily_weather_db(g["location_id"], daily, final_before)
+            except Exception:
+                pass
+            _add_fetched_days(g["days"], daily)
+            lines.extend(request_lines(g))
+        return lines
+
+    def failed(chunk, e):
+        return [{"id": meta["id"], "error": f"Open-Meteo request failed: {e}"}
+                for g in chunk for meta, _, _ in g["requests"]]
+
+    def generate():
+        for err in errors:
+            yield app.json.dumps(err) + "\n"
+        for g in complete:
+            for line in request_lines(g):
+                yield app.json.dumps(line) + "\n"
+        if not chunks:
+            return
+        with ThreadPoolExecutor(max_workers=min(len(chunks), 4)) as pool:
+            futures = {pool.submit(fetch_chunk, c): c for c in chunks}
+            for fut in as_completed(futures):
+                try:
+                    lines = fut.result()
+                except Exception as e:
+                    lines = failed(futures[fut], e)
+                for line in lines:
+                    yield app.json.dumps(line) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+# Pool and cache counters
+@app.get("/api/stats")
+def stats_api():
+    return jsonify({
+        "db_pool": pool_stats(),
+        "forecast_cache": forecast_cache.stats(),
+        "geocode_cache": geocode_cache_stats(),
+        "autocomplete": autocomplete_engine.stats(),
+        "upstream": upstream_stats(),
+        "live": weather_hub.stats(),
+        "prefetch": prefetcher.stats(),
+        "location_index": location_index.stats(),
+        "http_cache": http_cache.http_cache_stats(),
+        "range_stats": stats_cache.stats(),
+    })
+
+_warm_lock = threading.Lock()
+_warmed: Dict[str, Any] = {"pid": None, "result": None}
+
+
+def warm_up() -> Dict[str, Any]:
+    """Open this process's database and upstream connections, load its indexes and start its
+    background work, so the first requests do not pay for it. Runs once per process.
+
+    Called by the gunicorn post_fork hook (gunicorn.conf.py), the ASGI startup and /api/ready.
+    """
+    with _warm_lock:
+        if _warmed["pid"] == os.getpid():
+            return _warmed["result"]
+        t0 = time.perf_counter()
+        result: Dict[str, Any] = {}
+        if DB_URL:
+            try:
+                result["db_connections_opened"] = warm_pool()
+                location_index.reload()
+            except Exception as e:
+                result["db_error"] = str(e)
+        result["upstream"] = upstream_client.warm(WARM_UPSTREAM_URLS)
+        range_stats.preload()
+        prefetcher.ensure_started()
+        result["seconds"] = round(time.perf_counter() - t0, 3)
+        _warmed.update(pid=os.getpid(), result=result)
+        return result
+
+
+# Readiness probe: warms the process on first call, then checks the database on every call.
+# Upstream reachability is reported but does not fail it, so an Open-Meteo outage cannot drain every instance.
+@app.get("/api/ready")
+def readiness():
+    warm = warm_up()
+    checks: Dict[str, Any] = {"database": "not configured"}
+    if DB_URL:
+        try:
+            with get_conn() as conn, conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            checks["database"] = "ok"
+        except Exception as e:
+            checks["database"] = f"error: {e}"
+    ready = not DB_URL or checks["database"] == "ok"
+    return jsonify({"ready": ready, "checks": checks, "warm_up": warm}), 200 if ready else 503
+
+metrics.REGISTRY.add_collector("weatherapp_db_pool", "Connection pool counters", pool_stats)
+metrics.REGISTRY.add_collector("weatherapp_forecast_cache", "Forecast cache counters", forecast_cache.stats)
+metrics.REGISTRY.add_collector("weatherapp_geocode_cache", "Geocode cache counters", geocode_cache_stats)
+metrics.REGISTRY.add_collector("weatherapp_autocomplete", "Autocomplete engine counters", autocomplete_engine.stats)
+metrics.REGISTRY.add_collector("weatherapp_upstream", "Outbound client counters by host", upstream_stats)
+metrics.REGISTRY.add_collector("weatherapp_location_index", "In-memory spatial index counters", location_index.stats)
+metrics.REGISTRY.add_collector("weatherapp_prefetch", "Background prefetch counters", prefetcher.stats)
+metrics.REGISTRY.add_collector("weatherapp_live", "Server-Sent Events subscribers and refreshes", weather_hub.stats)
+metrics.REGISTRY.add_collector("weatherapp_range_stats", "Range statistics cache counters", stats_cache.stats)
+metrics.REGISTRY.add_collector("weatherapp_http_cache", "Conditional GET and compression counters",
+                               http_cache.http_cache_stats)
+
+# Warm this process's cache now rather than on the first request (restarted per worker after fork).
+# In lazy mode the gunicorn post_fork hook, /api/ready or the first request does it instead.
+if not LAZY_INIT:
+    prefetcher.ensure_started()
+
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=int(os.getenv("PORT", 8080)))
\ No newline at end of file
@@ -0,0 +1,291 @@
+"""Optional ASGI entry point: the hot read routes run as coroutines.
+
+    pip install -r requirements-asgi.txt
+    uvicorn asgi:application --workers 2
+
+/api/weather, /api/weather/stream, /api/autocomplete, /api/geocode and
+/api/requests/<id>/weather are served by a Quart app using httpx and asyncpg,
+so one process can keep thousands of upstream and database waits, and open
+live streams, in flight. Every other path goes
+to the unchanged Flask app through a WSGI adapter.
+"""
+import asyncio
+import re
+import time
+from datetime import date
+from typing import Any, Dict
+
+from asgiref.wsgi import WsgiToAsgi
+from quart import Quart, Response, g, jsonify, request
+from quart.wrappers.response import IterableBody
+
+from app import (
+    AUTOCOMPLETE_MIN_CHARS,
+    GEOCODIFY_API_KEY,
+    LIVE_STREAM_HEADERS,
+    _add_fetched_days,
+    _autocomplete_params,
+    _client_key,
+    _daily_columns,
+    _daily_from_days,
+    _final_before,
+    _forecast_params,
+    _live_frame,
+    _merge_daily,
+    _range_segments,
+    _rows_from_columns,
+    _saved_request_meta,
+    _segment_blocks,
+    _segment_request,
+    _stored_days,
+    _suggestions_page,
+    _weather_payload,
+    app as flask_app,
+    autocomplete_engine,
+    parse_coords,
+    prefetcher,
+    warm_up,
+    weather_hub,
+)
+from autocomplete import SUPERSEDED
+from crud import geocode_point, snap_point
+from crud_async import (
+    acached_geo,
+    aget_daily_weather_db,
+    aget_request_db,
+    astore_daily_weather_db,
+    async_pool_stats,
+    asyncpg,
+    close_async_pool,
+    get_async_pool,
+)
+from db_raw import DB_URL
+from forecast_cache import forecast_cache
+import http_cache
+from json_provider import OrjsonProvider
+from live_updates import LIVE_HEARTBEAT_SECONDS
+import metrics
+from units import convert_daily
+from upstream import aopen_meteo_get, ageo_get, async_client
+
+quart_app = Quart(__name__)
+quart_app.json = OrjsonProvider(quart_app)
+
+# Paths served by quart_app; everything else is handed to the Flask app
+ASYNC_PATHS = re.compile(r"^/api/(?:weather|weather/stream|autocomplete|geocode|requests/\d+/weather)$")
+
+
+def _wants_columnar() -> bool:
+    return request.args.get("format") == "columnar"
+
+
+@quart_app.before_serving
+async def _startup():
+    # The same warm-up as a gunicorn worker, finished before uvicorn accepts connections
+    await asyncio.to_thread(warm_up)
+    if asyncpg is not None and DB_URL:
+        try:
+            await get_async_pool()
+        except Exception:
+            pass
+
+
+@quart_app.after_serving
+async def _shutdown():
+    await async_client.aclose()
+    await close_async_pool()
+
+
+@quart_app.before_request
+async def _start_timer():
+    g._metrics_t0 = time.perf_counter()
+
+
+@quart_app.after_request
+async def _record(response):
+    t0 = g.pop("_metrics_t0", None)
+    if t0 is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.http_duration.observe(time.perf_counter() - t0, route=route, method=request.method,
+                                      status=response.status_code)
+    return response
+
+
+# Same per-endpoint Cache-Control, ETag and compression as the Flask routes
+@quart_app.after_request
+async def _finish(response):
+    if request.method in ("GET", "HEAD") and response.status_code == 200:
+        # Streams are sent as they are produced
+        body = None if isinstance(response.response, IterableBody) else await response.get_data()
+        http_cache.finish_response(response, request, request.endpoint, body)
+    return response
+
+
+@quart_app.route("/api/weather")
+async def weather():
+    try:
+        lat = float(request.args.get("lat"))
+        lon = float(request.args.get("lon"))
+    except Exception:
+        return jsonify({"error": "Invalid or missing lat/lon"}), 400
+
+    unit = request.args.get("unit", "fahrenheit")
+    temp_unit = "fahrenheit" if unit.lower().startswith("f") else "celsius"
+
+    key = forecast_cache.key(lat, lon)
+    try:
+        data = await forecast_cache.aget_or_fetch(key, lambda: aopen_meteo_get(_forecast_params([key[0]], [key[1]])))
+    except Exception as e:
+        return jsonify({"error": f"Open-Meteo request failed: {e}"}), 502
+    return jsonify(_weather_payload(lat, lon, data, temp_unit, _wants_columnar()))
+
+
+# Awaitable app.weather_stream: the cell's refresher pushes into this coroutine's queue, so a stream holds no thread
+@quart_app.route("/api/weather/stream")
+async def weather_stream():
+    try:
+        lat = float(request.args.get("lat"))
+        lon = float(request.args.get("lon"))
+    except Exception:
+        return jsonify({"error": "Invalid or missing lat/lon"}), 400
+
+    unit = request.args.get("unit", "fahrenheit")
+    temp_unit = "fahrenheit" if unit.lower().startswith("f") else "celsius"
+    columnar = _wants_columnar()
+    sub = weather_hub.asubscribe(forecast_cache.key(lat, lon))
+
+    async def generate():
+        try:
+            yield b"retry: 5000\n\n"
+            while True:
+                event = await sub.aget(LIVE_HEARTBEAT_SECONDS)
+                yield _live_frame(event, lat, lon, temp_unit, columnar).encode()
+        finally:
+            sub.close()
+
+    resp = Response(generate(), mimetype="text/event-stream", headers=LIVE_STREAM_HEADERS)
+    resp.timeout = None  # open until the client leaves
+    return resp
+
+
+async def _aautocomplete_fetch(qn: str) -> Any:
+    async def fetch():
+        data = await ageo_get("autocomplete", _autocomplete_params(qn))
+        return data if "_error" in data else _suggestions_page(data)
+
+    return await acached_geo("autocomplete", qn, fetch)
+
+
+autocomplete_engine.afetch = _aautocomplete_fetch
+
+
+@quart_app.route("/api/autocomplete")
+async def autocomplete():
+    q = request.args.get("q", "").strip()
+    if len(q) < AUTOCOMPLETE_MIN_CHARS:
+        return jsonify({"suggestions": []})
+    if not GEOCODIFY_API_KEY:
+        return jsonify({"error": "Missing GEOCODIFY_API_KEY on server"}), 500
+
+    result = await autocomplete_engine.asuggest(_client_key(request), q)
+    if result is SUPERSEDED:
+        return jsonify({"suggestions": [], "superseded": True})
+    if isinstance(result, dict):
+        if result.get("_error") == "rate_limited":
+            return jsonify({"suggestions": [{"label": "Rate-limited: pause typing for a second…", "lat": None, "lon": None, "disabled": True}]})
+        return jsonify({"error": f"Autocomplete failed: {result['_error']}"}), 502
+    return jsonify({"suggestions": result})
+
+
+@quart_app.route("/api/geocode")
+async def geocode():
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"error": "Missing query"}), 400
+
+    coords = parse_coords(q)
+    if coords:
+        # The spatial index may reload from the database, so it runs off the event loop
+        lat, lon, _ = await asyncio.to_thread(snap_point, *coords)
+        return jsonify({"label": q, "lat": lat, "lon": lon})
+    if not GEOCODIFY_API_KEY:
+        return jsonify({"error": "Missing GEOCODIFY_API_KEY on server"}), 500
+
+    async def fetch():
+        return geocode_point(await ageo_get("geocode", {"api_key": GEOCODIFY_API_KEY, "q": q}))
+
+    point = await acached_geo("geocode", q, fetch)
+    if point.get("_error") == "rate_limited":
+        return jsonify({"error": "Geocodify rate limit hit. Type slower or upgrade the plan."}), 429
+    if "_error" in point:
+        return jsonify({"error": f"Geocoding failed: {point['_error']}"}), 502
+    lat, lon, _ = await asyncio.to_thread(snap_point, point["lat"], point["lon"])
+    return jsonify({"label": q, "lat": lat, "lon": lon})
+
+
+# Awaitable app._range_weather_multi for one point: the segments are fetched concurrently
+async def _arange_weather(lat: float, lon: float, start_d: date, end_d: date) -> Dict[str, Any]:
+    async def fetch(segment):
+        url, params = _segment_request([(lat, lon)], *segment)
+        return _segment_blocks(await aopen_meteo_get(params, base=url))[0]
+
+    segments = _range_segments(start_d, end_d)
+    if not segments:
+        return {}
+    return _merge_daily(list(await asyncio.gather(*(fetch(s) for s in segments))))
+
+
+# Awaitable app._stored_range_daily: stored days plus one fetch for the missing or still-changing ones
+async def _astored_range_daily(location_id: int, lat: float, lon: float, start_d: date, end_d: date) -> Dict[str, Any]:
+    try:
+        stored = await aget_daily_weather_db(location_id, start_d, end_d)
+    except Exception:
+        stored = []
+    by_day, missing = _stored_days(stored, start_d, end_d)
+    if missing:
+        fetched = await _arange_weather(lat, lon, *missing)
+        try:
+            await astore_daily_weather_db(location_id, fetched, _final_before())
+        except Exception:
+            pass
+        _add_fetched_days(by_day, fetched)
+    return _daily_from_days(by_day, start_d, end_d)
+
+
+@quart_app.get("/api/requests/<int:req_id>/weather")
+async def weather_for_saved_request(req_id: int):
+    row = await aget_request_db(req_id)
+    if not row:
+        return jsonify({"error": "Not found"}), 404
+
+    try:
+        meta, start_d, end_d = _saved_request_meta(row)
+    except Exception:
+        return jsonify({"error": "Bad dates in saved request"}), 500
+
+    prefetcher.note_access(row["location_id"])
+    temp_unit = "fahrenheit" if meta["unit"].lower().startswith("f") else "celsius"
+    try:
+        daily = await _astored_range_daily(row["location_id"], meta["lat"], meta["lon"], start_d, end_d)
+    except Exception as e:
+        return jsonify({"error": f"Open-Meteo request failed: {e}"}), 502
+    cols = _daily_columns(convert_daily(daily, temp_unit))
+
+    return jsonify({
+        "request": meta,
+        "daily": cols if _wants_columnar() else _rows_from_columns(cols),
+        "unit": temp_unit,
+    })
+
+
+metrics.REGISTRY.add_collector("weatherapp_db_async_pool", "asyncpg pool counters", async_pool_stats)
+
+wsgi_app = WsgiToAsgi(flask_app)
+
+
+async def application(scope, receive, send):
+    """ASGI callable: async routes and lifespan events to Quart, the rest to Flask."""
+    if scope["type"] == "lifespan" or (scope["type"] == "http" and ASYNC_PATHS.match(scope["path"])):
+        await quart_app(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
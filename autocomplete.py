@@ -0,0 +1,251 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from crud import _filter_suggestions, normalize_query
+
+# Autocomplete engine settings (seconds unless noted)
+AUTOCOMPLETE_DEBOUNCE = float(os.getenv("AUTOCOMPLETE_DEBOUNCE_MS", "100")) / 1000  # quiet time before going upstream
+AUTOCOMPLETE_MEMORY_ENTRIES = int(os.getenv("AUTOCOMPLETE_MEMORY_ENTRIES", "5000"))
+AUTOCOMPLETE_MEMORY_TTL = float(os.getenv("AUTOCOMPLETE_MEMORY_TTL", "3600"))
+AUTOCOMPLETE_MAX_CLIENTS = 10000
+AUTOCOMPLETE_POLL = 0.025  # how often waiters check whether their client moved on
+
+SUPERSEDED = "superseded"
+
+
+class _Flight:
+    """An upstream lookup in progress that identical and longer queries can wait on."""
+
+    def __init__(self, qn: str):
+        self.qn = qn
+        self.done = threading.Event()
+        self.value: Any = None
+
+
+class AutocompleteEngine:
+    """Server-side autocomplete front for the geocode cache and Geocodify.
+
+    Each call may name its client (one browser tab). A newer query from the same
+    client supersedes the older one, which returns SUPERSEDED without calling
+    upstream if it is still in its debounce window or waiting on a fetch.
+    Anonymous calls (client None) are neither debounced nor superseded.
+    Identical queries in flight across clients share one fetch, and a query
+    whose shorter prefix is in flight waits for that fetch instead of
+    starting its own. Recent result sets are kept in memory, and a set that
+    upstream marked complete is exhaustive for its prefix, so a longer query is
+    answered by filtering it locally.
+
+    `fetch(q)` returns (suggestions, complete) or a dict with "_error";
+    complete means upstream had no more results for q.
+    """
+
+    def __init__(self, fetch: Callable[[str], Any], afetch: Callable[[str], Awaitable[Any]] | None = None,
+                 debounce: float = AUTOCOMPLETE_DEBOUNCE,
+                 max_entries: int = AUTOCOMPLETE_MEMORY_ENTRIES, ttl: float = AUTOCOMPLETE_MEMORY_TTL):
+        self.fetch = fetch
+        self.afetch = afetch
+        self.debounce = debounce
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._clients: "OrderedDict[str, int]" = OrderedDict()  # client -> generation of its latest query
+        self._recent: "OrderedDict[str, Tuple[float, List[Dict[str, Any]], bool]]" = OrderedDict()
+        self._inflight: Dict[str, _Flight] = {}
+        self._ainflight: Dict[str, "asyncio.Task[Any]"] = {}
+        self._stats = {"queries": 0, "local_hits": 0, "local_prefix_hits": 0, "coalesced": 0,
+                       "prefix_waits": 0, "superseded": 0, "fetches": 0, "errors": 0}
+
+    # ---- shared bookkeeping ----
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += n
+
+    def _begin(self, client: str | None) -> int:
+        with self._lock:
+            self._stats["queries"] += 1
+            if client is None:
+                return 0
+            gen = self._clients.pop(client, 0) + 1
+            self._clients[client] = gen
+            while len(self._clients) > AUTOCOMPLETE_MAX_CLIENTS:
+                self._clients.popitem(last=False)
+            return gen
+
+    def _superseded(self, client: str | None, gen: int) -> bool:
+        if client is None:
+            return False
+        with self._lock:
+            return self._clients.get(client, gen) != gen
+
+    def _complete(self, value: Any) -> bool:
+        return isinstance(value, tuple) and value[1]
+
+    def _local(self, qn: str) -> List[Dict[str, Any]] | None:
+        # Exact entry first, then the longest shorter prefix whose set was exhaustive
+        now = time.time()
+        with self._lock:
+            for n in range(len(qn), 0, -1):
+                entry = self._recent.get(qn[:n])
+                if entry is None:
+                    continue
+                expires, results, complete = entry
+                if expires <= now:
+                    del self._recent[qn[:n]]
+                    continue
+                if n == len(qn):
+                    self._recent.move_to_end(qn)
+                    self._stats["local_hits"] += 1
+                    return results
+                if complete:
+                    self._stats["local_prefix_hits"] += 1
+                    return _filter_suggestions(results, qn)
+        return None
+
+    def _remember(self, qn: str, value: Any) -> None:
+        if not isinstance(value, tuple):
+            return
+        with self._lock:
+            self._recent[qn] = (time.time() + self.ttl, *value)
+            self._recent.move_to_end(qn)
+            while len(self._recent) > self.max_entries:
+                self._recent.popitem(last=False)
+
+    def _from_flight(self, flight_qn: str, value: Any, qn: str) -> Any | None:
+        """Suggestions (or the error) for qn from a fetch of flight_qn, or None if it does not cover qn."""
+        if flight_qn == qn:
+            return value if isinstance(value, dict) else value[0]
+        if self._complete(value):
+            return _filter_suggestions(value[0], qn)
+        return None
+
+    # ---- thread callers (Flask) ----
+
+    def suggest(self, client: str | None, q: str) -> Any:
+        """Suggestions for q, a dict with "_error", or SUPERSEDED."""
+        qn = normalize_query(q)
+        gen = self._begin(client)
+        local = self._local(qn)
+        if local is not None:
+            return local
+        if not self._wait_quiet(client, gen):
+            return SUPERSEDED
+
+        while True:
+            with self._lock:
+                flight = self._inflight.get(qn) or self._prefix_flight_locked(qn)
+                leader = flight is None
+                if leader:
+                    flight = self._inflight[qn] = _Flight(qn)
+                else:
+                    self._stats["coalesced" if flight.qn == qn else "prefix_waits"] += 1
+            if leader:
+                return self._from_flight(qn, self._lead(flight), qn)
+            while not flight.done.wait(AUTOCOMPLETE_POLL):
+                if self._superseded(client, gen):
+                    self._count("superseded")
+                    return SUPERSEDED
+            result = self._from_flight(flight.qn, flight.value, qn)
+            if result is not None:
+                return result
+            # The prefix's set was not exhaustive; go again for this exact query
+
+    def _prefix_flight_locked(self, qn: str) -> _Flight | None:
+        for n in range(len(qn) - 1, 0, -1):
+            flight = self._inflight.get(qn[:n])
+            if flight is not None:
+                return flight
+        return None
+
+    def _wait_quiet(self, client: str | None, gen: int) -> bool:
+        if client is None:
+            return True
+        deadline = time.monotonic() + self.debounce
+        while True:
+            if self._superseded(client, gen):
+                self._count("superseded")
+                return False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            time.sleep(min(AUTOCOMPLETE_POLL, remaining))
+
+    def _lead(self, flight: _Flight) -> Any:
+        # The leader finishes its fetch even if its own client moves on: others may be waiting on it
+        self._count("fetches")
+        try:
+            value = self.fetch(flight.qn)
+        except Exception as e:
+            value = {"_error": str(e)}
+        if isinstance(value, dict):
+            self._count("errors")
+        self._remember(flight.qn, value)
+        flight.value = value
+        with self._lock:
+            self._inflight.pop(flight.qn, None)
+        flight.done.set()
+        return value
+
+    # ---- coroutine callers (ASGI) ----
+
+    async def asuggest(self, client: str | None, q: str) -> Any:
+        qn = normalize_query(q)
+        gen = self._begin(client)
+        local = self._local(qn)
+        if local is not None:
+            return local
+        deadline = time.monotonic() + (self.debounce if client is not None else 0.0)
+        while time.monotonic() < deadline:
+            if self._superseded(client, gen):
+                self._count("superseded")
+                return SUPERSEDED
+            await asyncio.sleep(min(AUTOCOMPLETE_POLL, max(0.0, deadline - time.monotonic())))
+
+        while True:
+            with self._lock:
+                flight_qn = qn if qn in self._ainflight else next(
+                    (qn[:n] for n in range(len(qn) - 1, 0, -1) if qn[:n] in self._ainflight), None)
+                if flight_qn is None:
+                    flight_qn = qn
+                    task = self._ainflight[qn] = asyncio.ensure_future(self._alead(qn))
+                else:
+                    task = self._ainflight[flight_qn]
+                    self._stats["coalesced" if flight_qn == qn else "prefix_waits"] += 1
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=AUTOCOMPLETE_POLL)
+                if done:
+                    break
+                if self._superseded(client, gen):
+                    self._count("superseded")
+                    return SUPERSEDED
+            result = self._from_flight(flight_qn, task.result(), qn)
+            if result is not None:
+                return result
+
+    async def _alead(self, qn: str) -> Any:
+        self._count("fetches")
+        try:
+            value = await self.afetch(qn)
+        except Exception as e:
+            value = {"_error": str(e)}
+        if isinstance(value, dict):
+            self._count("errors")
+        self._remember(qn, value)
+        with self._lock:
+            self._ainflight.pop(qn, None)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out.update({
+                "memory_entries": len(self._recent),
+                "in_flight": len(self._inflight) + len(self._ainflight),
+                "clients": len(self._clients),
+                "debounce_ms": round(self.debounce * 1000),
+            })
+        return out
@@ -0,0 +1,219 @@
+"""Local stand-ins for Open-Meteo and Geocodify used by the benchmark suite.
+
+    python bench/mock_upstreams.py --port 9100 --latency-ms 80 --rate-limit 0.05
+
+Serves /v1/forecast and /v1/archive (Open-Meteo shapes, including
+comma-separated multi-coordinate requests) and /v2/geocode and
+/v2/autocomplete (Geocodify shapes). GET /_stats returns per-path call
+counts and POST /_reset clears them.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+from urllib.parse import parse_qs, urlsplit
+
+DAILY_FIELDS = [
+    "weather_code",
+    "temperature_2m_max",
+    "temperature_2m_min",
+    "precipitation_probability_max",
+    "wind_speed_10m_max",
+    "wind_gusts_10m_max",
+    "precipitation_sum",
+]
+CODES = [0, 1, 2, 3, 45, 51, 61, 63, 71, 80, 95]
+PLACES = [
+    ("New York, NY, USA", 40.7128, -74.0060),
+    ("Los Angeles, CA, USA", 34.0522, -118.2437),
+    ("San Francisco, CA, USA", 37.7749, -122.4194),
+    ("San Diego, CA, USA", 32.7157, -117.1611),
+    ("San Antonio, TX, USA", 29.4241, -98.4936),
+    ("Chicago, IL, USA", 41.8781, -87.6298),
+    ("London, England, GB", 51.5072, -0.1276),
+    ("Paris, France", 48.8566, 2.3522),
+    ("Tokyo, Japan", 35.6762, 139.6503),
+    ("Sydney, NSW, Australia", -33.8688, 151.2093),
+]
+
+
+class MockConfig:
+    def __init__(self, latency_ms: float = 50, jitter_ms: float = 20, rate_limit: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit = rate_limit
+        self.lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+        self.rate_limited: Dict[str, int] = {}
+
+    def count(self, path: str, limited: bool) -> None:
+        with self.lock:
+            self.calls[path] = self.calls.get(path, 0) + 1
+            if limited:
+                self.rate_limited[path] = self.rate_limited.get(path, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"calls": dict(self.calls), "rate_limited": dict(self.rate_limited),
+                    "total_calls": sum(self.calls.values())}
+
+    def reset(self) -> None:
+        with self.lock:
+            self.calls.clear()
+            self.rate_limited.clear()
+
+
+def _seed(*parts: Any) -> random.Random:
+    return random.Random(zlib.crc32(repr(parts).encode()))
+
+
+def _daily(lat: float, lon: float, days: List[date]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"time": [d.isoformat() for d in days]}
+    cols = {f: [] for f in DAILY_FIELDS}
+    for d in days:
+        rnd = _seed(round(lat, 2), round(lon, 2), d.isoformat())
+        base = 25 - abs(lat) * 0.4 + rnd.uniform(-5, 5)
+        cols["weather_code"].append(rnd.choice(CODES))
+        cols["temperature_2m_max"].append(round(base + rnd.uniform(3, 8), 1))
+        cols["temperature_2m_min"].append(round(base - rnd.uniform(3, 8), 1))
+        cols["precipitation_probability_max"].append(rnd.randint(0, 100))
+        cols["wind_speed_10m_max"].append(round(rnd.uniform(2, 40), 1))
+        cols["wind_gusts_10m_max"].append(round(rnd.uniform(10, 70), 1))
+        cols["precipitation_sum"].append(round(rnd.uniform(0, 12), 1))
+    out.update(cols)
+    return out
+
+
+def _forecast(q: Dict[str, List[str]], archive: bool) -> Any:
+    lats = [float(v) for v in q.get("latitude", ["0"])[0].split(",")]
+    lons = [float(v) for v in q.get("longitude", ["0"])[0].split(",")]
+    today = date.today()
+    if "start_date" in q:
+        start = date.fromisoformat(q["start_date"][0])
+        end = date.fromisoformat(q.get("end_date", q["start_date"])[0])
+    else:
+        start = today
+        end = today + timedelta(days=int(q.get("forecast_days", ["7"])[0]) - 1)
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    results = []
+    for lat, lon in zip(lats, lons):
+        rnd = _seed(round(lat, 2), round(lon, 2), today.isoformat())
+        item: Dict[str, Any] = {"latitude": lat, "longitude": lon, "timezone": "GMT", "daily": _daily(lat, lon, days)}
+        if archive:
+            item["daily"].pop("precipitation_probability_max", None)
+        if "current" in q:
+            item["current"] = {
+                "time": f"{today.isoformat()}T12:00",
+                "temperature_2m": round(rnd.uniform(-5, 30), 1),
+                "relative_humidity_2m": rnd.randint(20, 95),
+                "apparent_temperature": round(rnd.uniform(-8, 32), 1),
+                "weather_code": rnd.choice(CODES),
+                "wind_speed_10m": round(rnd.uniform(0, 30), 1),
+                "wind_direction_10m": rnd.randint(0, 359),
+                "is_day": 1,
+                "precipitation": round(rnd.uniform(0, 3), 1),
+                "cloud_cover": rnd.randint(0, 100),
+                "pressure_msl": round(rnd.uniform(990, 1030), 1),
+            }
+            item["current_units"] = {"temperature_2m": "°C", "wind_speed_10m": "km/h", "precipitation": "mm"}
+        results.append(item)
+    return results if len(results) > 1 else results[0]
+
+
+def _features(q: str, limit: int) -> List[Dict[str, Any]]:
+    ql = q.lower()
+    feats = []
+    for label, lat, lon in PLACES:
+        if label.lower().startswith(ql) or ql in label.lower():
+            feats.append({"type": "Feature", "properties": {"label": label},
+                          "geometry": {"type": "Point", "coordinates": [lon, lat]}})
+    if not feats:
+        rnd = _seed(ql)
+        feats.append({"type": "Feature", "properties": {"label": q.title()},
+                      "geometry": {"type": "Point", "coordinates": [round(rnd.uniform(-120, 120), 4),
+                                                                    round(rnd.uniform(-60, 60), 4)]}})
+    return feats[:limit]
+
+
+def make_handler(config: MockConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body are separate writes
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: Any) -> None:
+            raw = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            if status == 429:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_POST(self):
+            if urlsplit(self.path).path == "/_reset":
+                config.reset()
+                return self._send(200, {"ok": True})
+            self._send(404, {"error": "not found"})
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            path, q = parts.path, parse_qs(parts.query)
+            if path == "/_stats":
+                return self._send(200, config.snapshot())
+            if path not in ("/v1/forecast", "/v1/archive", "/v2/geocode", "/v2/autocomplete"):
+                return self._send(404, {"error": "not found"})
+
+            limited = random.random() < config.rate_limit
+            config.count(path, limited)
+            delay = max(0.0, config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)) / 1000
+            time.sleep(delay)
+            if limited:
+                return self._send(429, {"error": "Too Many Requests"})
+
+            if path.startswith("/v1/"):
+                return self._send(200, _forecast(q, archive=path == "/v1/archive"))
+            text = q.get("q", [""])[0]
+            limit = 1 if path == "/v2/geocode" else 10
+            self._send(200, {"meta": {"code": 200}, "response": {"features": _features(text, limit)}})
+
+    return Handler
+
+
+def serve(host: str = "127.0.0.1", port: int = 0, config: MockConfig | None = None) -> ThreadingHTTPServer:
+    """Start the mock server on a daemon thread; port 0 picks a free port."""
+    config = config or MockConfig()
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Mock Open-Meteo + Geocodify server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of calls answered with 429")
+    args = parser.parse_args()
+    server = serve(args.host, args.port, MockConfig(args.latency_ms, args.jitter_ms, args.rate_limit))
+    print(f"mock upstreams on http://{args.host}:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
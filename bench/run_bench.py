@@ -0,0 +1,325 @@
+"""Latency/throughput benchmark for the WeatherApp HTTP API.
+
+    python bench/run_bench.py --concurrency 1,8,32 --requests 300 --out bench.json
+    python bench/run_bench.py --db-url postgresql://localhost/weather_bench --init-db
+    python bench/run_bench.py --baseline last_release.json --max-regression 0.2
+    python bench/run_bench.py --db-url ... --workloads writes --concurrency 1,8
+
+Starts the mock upstreams and app.py (unless --app-url points at a running
+instance), drives each route at every concurrency level and writes p50/p95/p99
+latency, requests/second and upstream call counts as JSON. The CRUD routes
+(the "requests" and write-only "writes" workloads) are only exercised when a
+database is configured via --db-url or DATABASE_URL.
+With --baseline, any route whose p95 regressed more than --max-regression
+makes the run exit non-zero.
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_upstreams import PLACES, MockConfig, serve  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUTES = ["weather", "autocomplete", "geocode", "requests"]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def init_db(db_url: str) -> None:
+    import psycopg2
+
+    with psycopg2.connect(db_url) as conn, conn.cursor() as cur:
+        for path in sorted(glob.glob(os.path.join(ROOT, "sql", "*.sql"))):
+            with open(path, encoding="utf-8") as f:
+                cur.execute(f.read())
+
+
+def start_app(port: int, mock_url: str, db_url: str | None) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "OPEN_METEO_BASE": f"{mock_url}/v1/forecast",
+        "OPEN_METEO_ARCHIVE_BASE": f"{mock_url}/v1/archive",
+        "GEOCODIFY_BASE": f"{mock_url}/v2",
+        "GEOCODIFY_API_KEY": env.get("GEOCODIFY_API_KEY") or "bench",
+    })
+    if db_url:
+        env["DATABASE_URL"] = db_url
+    cmd = [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port), "--no-reload", "--no-debugger"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/api/stats", timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("app did not start")
+
+
+# Workloads: each returns a callable(session, base_url, rnd) -> list of (route, status, seconds)
+SUPERSEDED_STATUS = "superseded"  # recorded in place of 200 for autocomplete answers the server dropped
+def _timed(session: requests.Session, route: str, method: str, url: str, **kw) -> Tuple[str, int, float, Any]:
+    t0 = time.perf_counter()
+    try:
+        r = session.request(method, url, timeout=30, **kw)
+        status = r.status_code
+        body = r.json() if r.headers.get("Content-Type", "").startswith("application/json") else None
+    except requests.RequestException:
+        status, body = 0, None
+    return route, status, time.perf_counter() - t0, body
+
+
+def weather_op(session, base, rnd):
+    _, lat, lon = rnd.choice(PLACES)
+    lat += rnd.uniform(-0.003, 0.003)
+    lon += rnd.uniform(-0.003, 0.003)
+    unit = rnd.choice(["fahrenheit", "celsius"])
+    return [_timed(session, "GET /api/weather", "GET", f"{base}/api/weather",
+                   params={"lat": round(lat, 5), "lon": round(lon, 5), "unit": unit})[:3]]
+
+
+def autocomplete_op(session, base, rnd):
+    label = rnd.choice(PLACES)[0]
+    q = label[:rnd.randint(3, min(10, len(label)))]
+    route, status, secs, body = _timed(session, "GET /api/autocomplete", "GET", f"{base}/api/autocomplete",
+                                       params={"q": q})
+    # An empty superseded answer is fast but not a result; count it as a failure
+    if isinstance(body, dict) and body.get("superseded"):
+        status = SUPERSEDED_STATUS
+    return [(route, status, secs)]
+
+
+def geocode_op(session, base, rnd):
+    label = rnd.choice(PLACES)[0].split(",")[0]
+    return [_timed(session, "GET /api/geocode", "GET", f"{base}/api/geocode", params={"q": label})[:3]]
+
+
+def requests_op(session, base, rnd):
+    _, lat, lon = rnd.choice(PLACES)
+    start = date.today() + timedelta(days=rnd.randint(-3, 3))
+    body = {"lat": lat, "lon": lon, "label": "bench", "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=rnd.randint(0, 5))).isoformat(),
+            "unit": rnd.choice(["fahrenheit", "celsius"])}
+    out = []
+    route, status, secs, created = _timed(session, "POST /api/requests", "POST", f"{base}/api/requests", json=body)
+    out.append((route, status, secs))
+    out.append(_timed(session, "GET /api/requests", "GET", f"{base}/api/requests", params={"limit": 50})[:3])
+    if not created or "id" not in created:
+        return out
+    rid = created["id"]
+    out.append(_timed(session, "GET /api/requests/<id>", "GET", f"{base}/api/requests/{rid}")[:3])
+    out.append(_timed(session, "PUT /api/requests/<id>", "PUT", f"{base}/api/requests/{rid}",
+                      json={"unit": "celsius"})[:3])
+    out.append(_timed(session, "GET /api/requests/<id>/weather", "GET", f"{base}/api/requests/{rid}/weather")[:3])
+    out.append(_timed(session, "DELETE /api/requests/<id>", "DELETE", f"{base}/api/requests/{rid}")[:3])
+    return out
+
+
+# Write path only: a create (half at a known place, half at a new point) and a one-sided date edit
+def writes_op(session, base, rnd):
+    label, lat, lon = rnd.choice(PLACES)
+    if rnd.random() < 0.5:
+        label, lat, lon = "bench", round(rnd.uniform(-60, 60), 4), round(rnd.uniform(-170, 170), 4)
+    start = date.today() + timedelta(days=rnd.randint(-3, 3))
+    body = {"lat": lat, "lon": lon, "label": label, "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=rnd.randint(0, 5))).isoformat(),
+            "unit": rnd.choice(["fahrenheit", "celsius"])}
+    route, status, secs, created = _timed(session, "POST /api/requests", "POST", f"{base}/api/requests", json=body)
+    out = [(route, status, secs)]
+    if created and "id" in created:
+        out.append(_timed(session, "PUT /api/requests/<id>", "PUT", f"{base}/api/requests/{created['id']}",
+                          json={"end_date": (start + timedelta(days=6)).isoformat()})[:3])
+    return out
+
+
+WORKLOADS: Dict[str, Callable] = {
+    "weather": weather_op,
+    "autocomplete": autocomplete_op,
+    "geocode": geocode_op,
+    "requests": requests_op,
+    "writes": writes_op,
+}
+DB_WORKLOADS = ("requests", "writes")
+
+
+def run_level(base: str, workload: Callable, concurrency: int, total_ops: int, seed: int) -> Tuple[Dict[str, List], float]:
+    samples: Dict[str, List[Tuple[int, float]]] = {}
+    lock = threading.Lock()
+    remaining = [total_ops]
+
+    def worker(i: int) -> None:
+        rnd = random.Random(seed * 1000 + i)
+        session = requests.Session()
+        # One client per worker, like one browser tab each; workers never supersede each other
+        session.headers["X-Client-Id"] = f"bench-{seed}-{i}"
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            for route, status, secs in workload(session, base, rnd):
+                with lock:
+                    samples.setdefault(route, []).append((status, secs))
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return samples, time.perf_counter() - t0
+
+
+def _failed(status: Any) -> bool:
+    return status in (0, SUPERSEDED_STATUS) or int(status) >= 500
+
+
+def summarize(samples: Dict[str, List[Tuple[Any, float]]], elapsed: float) -> Dict[str, Any]:
+    out = {}
+    for route, values in sorted(samples.items()):
+        statuses: Dict[str, int] = {}
+        for status, _ in values:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        errors = sum(1 for status, _ in values if _failed(status))
+        # Throughput and latency cover answered requests only, so fast failures cannot flatter them
+        lat_ms = sorted(s * 1000 for status, s in values if not _failed(status)) or [0.0]
+        out[route] = {
+            "count": len(values),
+            "errors": errors,
+            "statuses": statuses,
+            "rps": round((len(values) - errors) / elapsed, 2) if elapsed else 0.0,
+            "mean_ms": round(sum(lat_ms) / len(lat_ms), 2),
+            "p50_ms": round(percentile(lat_ms, 50), 2),
+            "p95_ms": round(percentile(lat_ms, 95), 2),
+            "p99_ms": round(percentile(lat_ms, 99), 2),
+            "max_ms": round(lat_ms[-1], 2),
+        }
+    return out
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    regressions = []
+    base_runs = {(r["workload"], r["concurrency"]): r for r in baseline.get("runs", [])}
+    for run in results["runs"]:
+        old = base_runs.get((run["workload"], run["concurrency"]))
+        if not old:
+            continue
+        for route, stats in run["routes"].items():
+            before = old["routes"].get(route, {}).get("p95_ms")
+            if before and stats["p95_ms"] > before * (1 + max_regression):
+                regressions.append(f"{route} @ c={run['concurrency']}: p95 {before:.1f}ms -> {stats['p95_ms']:.1f}ms")
+    return regressions
+
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="WeatherApp latency benchmark")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated worker counts")
+    parser.add_argument("--requests", type=int, default=200, help="operations per workload and level")
+    parser.add_argument("--workloads", default=",".join(ROUTES))
+    parser.add_argument("--app-url", help="benchmark an already running app instead of starting one")
+    parser.add_argument("--db-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--init-db", action="store_true", help="apply sql/*.sql to --db-url first")
+    parser.add_argument("--mock-latency-ms", type=float, default=50)
+    parser.add_argument("--mock-jitter-ms", type=float, default=20)
+    parser.add_argument("--mock-rate-limit", type=float, default=0.0, help="fraction of upstream calls answered 429")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", help="previous results JSON to compare p95 against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    levels = [int(c) for c in args.concurrency.split(",") if c]
+    workloads = [w for w in args.workloads.split(",") if w]
+    if not args.db_url:
+        for name in DB_WORKLOADS:
+            if name in workloads:
+                print(f"no database configured; skipping the {name} workload", file=sys.stderr)
+                workloads.remove(name)
+    if args.init_db and args.db_url:
+        init_db(args.db_url)
+
+    mock = serve(config=MockConfig(args.mock_latency_ms, args.mock_jitter_ms, args.mock_rate_limit))
+    mock_url = f"http://127.0.0.1:{mock.server_address[1]}"
+    proc = None
+    base = args.app_url
+    if not base:
+        port = _free_port()
+        proc = start_app(port, mock_url, args.db_url)
+        base = f"http://127.0.0.1:{port}"
+
+    results: Dict[str, Any] = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_rev": _git_rev(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("db_url",)},
+        "runs": [],
+    }
+    try:
+        for workload in workloads:
+            for level in levels:
+                mock.config.reset()
+                samples, elapsed = run_level(base, WORKLOADS[workload], level, args.requests, args.seed)
+                run = {
+                    "workload": workload,
+                    "concurrency": level,
+                    "elapsed_s": round(elapsed, 3),
+                    "routes": summarize(samples, elapsed),
+                    "upstream": mock.config.snapshot(),
+                }
+                results["runs"].append(run)
+                for route, s in run["routes"].items():
+                    print(f"{route:34s} c={level:<4d} n={s['count']:<5d} rps={s['rps']:<8} "
+                          f"p50={s['p50_ms']:<8} p95={s['p95_ms']:<8} p99={s['p99_ms']:<8} "
+                          f"err={s['errors']:<4d} upstream={run['upstream']['total_calls']}")
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=10)
+        mock.shutdown()
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"wrote {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""Bulk import/export of saved weather requests.
+
+    python bulk.py import requests.csv
+    python bulk.py import saved.jsonl --chunk-size 5000
+    python bulk.py export --format jsonl > saved.jsonl
+
+Input rows need start_date, end_date and either lat/lon or a query to
+geocode; label and unit are optional. CSV input uses those names as headers.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from itertools import islice
+from typing import Any, Dict, IO, Iterable, Iterator, List, Tuple
+
+from dotenv import load_dotenv
+
+# Load .env before the local modules below read their settings at import time
+load_dotenv()
+
+from crud import (bulk_upsert_locations_db, copy_weather_requests_db, iter_requests_db, location_index,
+                  resolve_location_from_query)
+from range_stats import invalidate_location
+from units import normalize_unit
+from validators import validate_range
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+EXPORT_FIELDS = ["id", "label", "lat", "lon", "start_date", "end_date", "unit", "created_at"]
+MAX_REPORTED_ERRORS = 100
+
+
+# Yields (line number, record) pairs from a CSV or JSONL text stream
+def iter_records(stream: IO[str], fmt: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for n, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield n, json.loads(line)
+        except ValueError:
+            yield n, {"_error": "invalid JSON"}
+
+
+def detect_format(name: str | None, content_type: str | None = None) -> str:
+    name = (name or "").lower()
+    content_type = (content_type or "").lower()
+    if name.endswith(".csv") or "csv" in content_type:
+        return "csv"
+    return "jsonl"
+
+
+def _validate(rec: Dict[str, Any]) -> Tuple[str, float, float, Any, Any, str]:
+    if "_error" in rec:
+        raise ValueError(rec["_error"])
+    start, end = validate_range(str(rec.get("start_date") or ""), str(rec.get("end_date") or ""))
+    if rec.get("lat") not in (None, "") and rec.get("lon") not in (None, ""):
+        lat, lon = float(rec["lat"]), float(rec["lon"])
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError("lat/lon out of range")
+        label = rec.get("label") or f"{lat},{lon}"
+    else:
+        q = str(rec.get("query") or "").strip()
+        if not q:
+            raise ValueError("Provide query or lat/lon")
+        loc = resolve_location_from_query(q)
+        lat, lon = float(loc["lat"]), float(loc["lon"])
+        label = rec.get("label") or loc["label"]
+    return label, round(lat, 6), round(lon, 6), start, end, normalize_unit(rec.get("unit"))
+
+
+def import_requests(records: Iterable[Tuple[int, Dict[str, Any]]], chunk_size: int = BULK_CHUNK_SIZE) -> Dict[str, Any]:
+    """Validate and insert records chunk by chunk; returns counts and the first errors.
+
+    Locations are resolved once per distinct coordinate for the whole import,
+    and each chunk's requests go in with a single COPY.
+    """
+    loc_ids: Dict[Tuple[float, float], int] = {}
+    summary: Dict[str, Any] = {"inserted": 0, "rejected": 0, "locations_created_or_matched": 0, "errors": []}
+    it = iter(records)
+    while True:
+        chunk = list(islice(it, chunk_size))
+        if not chunk:
+            break
+        valid = []
+        for line, rec in chunk:
+            try:
+                valid.append(_validate(rec))
+            except Exception as e:
+                summary["rejected"] += 1
+                if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+                    summary["errors"].append({"line": line, "error": str(e)})
+
+        new_locs = {}
+        for label, lat, lon, _, _, _ in valid:
+            if (lat, lon) in loc_ids or (lat, lon) in new_locs:
+                continue
+            # Points next to a saved location reuse it instead of creating a near-duplicate
+            hit = location_index.nearest(lat, lon)
+            if hit is not None:
+                loc_ids[(lat, lon)] = hit["id"]
+                summary["locations_created_or_matched"] += 1
+            else:
+                new_locs[(lat, lon)] = label
+        if new_locs:
+            ids = bulk_upsert_locations_db([(label, lat, lon) for (lat, lon), label in new_locs.items()])
+            loc_ids.update(ids)
+            for (lat, lon), label in new_locs.items():
+                location_index.add({"id": ids[(lat, lon)], "label": label, "lat": lat, "lon": lon})
+            summary["locations_created_or_matched"] += len(new_locs)
+
+        rows = [(loc_ids[(lat, lon)], start, end, unit) for _, lat, lon, start, end, unit in valid]
+        if rows:
+            summary["inserted"] += copy_weather_requests_db(rows)
+            for loc_id in {r[0] for r in rows}:
+                invalidate_location(loc_id)
+    return summary
+
+
+def _export_value(v: Any) -> Any:
+    if hasattr(v, "isoformat"):
+        return v.isoformat()
+    if v is not None and not isinstance(v, (str, int, float, bool)):
+        return float(v)  # numeric(9,6) comes back as Decimal
+    return v
+
+
+# Streams every saved request as CSV or JSONL text chunks
+def export_requests(fmt: str = "jsonl") -> Iterator[str]:
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(EXPORT_FIELDS)
+        for row in iter_requests_db():
+            writer.writerow([_export_value(row[f]) for f in EXPORT_FIELDS])
+            if buf.tell() > 64 * 1024:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+        return
+    for row in iter_requests_db():
+        yield json.dumps({f: _export_value(row[f]) for f in EXPORT_FIELDS}) + "\n"
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import/export of saved weather requests")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="load requests from a CSV or JSONL file ('-' for stdin)")
+    imp.add_argument("path")
+    imp.add_argument("--format", choices=["csv", "jsonl"])
+    imp.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE)
+    exp = sub.add_parser("export", help="write all requests to stdout")
+    exp.add_argument("--format", choices=["csv", "jsonl"], default="jsonl")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        for part in export_requests(args.format):
+            sys.stdout.write(part)
+        return 0
+
+    fmt = args.format or detect_format(args.path)
+    if args.path == "-":
+        summary = import_requests(iter_records(sys.stdin, fmt), args.chunk_size)
+    else:
+        with open(args.path, newline="", encoding="utf-8") as f:
+            summary = import_requests(iter_records(f, fmt), args.chunk_size)
+    json.dump(summary, sys.stderr, indent=2)
+    sys.stderr.write("\n")
+    return 0 if summary["rejected"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
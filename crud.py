@@ -1,13 +1,37 @@
+import io
+import math
 import os
-import requests
 import re
-from typing import Optional, Dict, Any, List, Tuple
-from psycopg2.extras import RealDictCursor
-from db_raw import get_conn
-from validators import validate_range
+import threading
+from datetime import date
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterator
+from psycopg2.extras import RealDictCursor, Json, execute_values
+from db_raw import execute_numbered, execute_prepared, get_conn
+from metrics import timed_query
+from validators import parse_iso_date, validate_range
+from upstream import geo_get as _geo_get
+from spatial import LOCATION_SNAP_METERS, LocationIndex
+from range_stats import WET_DAY_POP, invalidate_location
 
 GEOCODIFY_API_KEY = os.getenv("GEOCODIFY_API_KEY", "")
-HEADERS = {"Accept": "application/json", "User-Agent": "WeatherApp/1.0 (+server)"}
+
+# Geocode cache settings
+GEOCODE_CACHE_MAX_AGE = float(os.getenv("GEOCODE_CACHE_MAX_AGE", str(30 * 86400)))
+AUTOCOMPLETE_CACHE_MAX_AGE = float(os.getenv("AUTOCOMPLETE_CACHE_MAX_AGE", str(7 * 86400)))
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MIN_CHARS = 3
+
+# Columns of daily_weather, in the same names Open-Meteo uses for its daily arrays
+DAILY_WEATHER_FIELDS = [
+    "weather_code",
+    "temperature_2m_max",
+    "temperature_2m_min",
+    "precipitation_probability_max",
+    "wind_speed_10m_max",
+    "wind_gusts_10m_max",
+]
+# Non-final stored days younger than this are served without refetching
+DAILY_WEATHER_FRESH_SECONDS = float(os.getenv("DAILY_WEATHER_FRESH_SECONDS", "900"))
 
 COORDS_RE = re.compile(r"^\s*([+-]?(?:\d+(?:\.\d+)?)),\s*([+-]?(?:\d+(?:\.\d+)?))\s*$")
 
@@ -21,123 +45,647 @@ def parse_coords(text: str) -> Tuple[float, float] | None:
             return (lat, lon)
     return None
 
-# Geocodes a location
-def _geo_get(params: Dict[str, Any]) -> Dict[str, Any]:
-    url = f"https://api.geocodify.com/v2/geocode"
+# Extracts lat/lon from a Geocodify geocode response
+def geocode_point(data: Dict[str, Any]) -> Dict[str, Any]:
+    if "_error" in data:
+        return data
     try:
-        r = requests.get(url, params=params, headers=HEADERS, timeout=10)
-        if r.status_code == 429:
-           return {"_error": "rate_limited"}
-        r.raise_for_status()
-        return r.json()
-    except Exception as e:
-        return {"_error": str(e)}
+        c = data['response']['features'][0]['geometry']['coordinates']
+    except (KeyError, IndexError, TypeError):
+        return {"_error": "No results"}
+    return {"lat": c[1], "lon": c[0]}
 
 
 def resolve_location_from_query(q: str) -> Dict[str, Any]:
-    if not GEOCODIFY_API_KEY:
-        raise RuntimeError("Missing GEOCODIFY_API_KEY")
     coords = parse_coords(q)
     if coords:
-        return {"label": q, "lat": coords[0], "lon": coords[1]}
+        lat, lon, _ = snap_point(*coords)
+        return {"label": q, "lat": lat, "lon": lon}
     if not GEOCODIFY_API_KEY:
-        return {"error": "Missing GEOCODIFY_API_KEY on server"}, 500
-    
-    data = _geo_get("geocode", {"api_key": GEOCODIFY_API_KEY, "q": q})
-    if data.get("_error") == "rate_limited":
-        return {"error": "Geocodify rate limit hit. Type slower or upgrade the plan."}, 429
-    if "_error" in data:
-        return {"error": f"Geocoding failed: {data['_error']}"}, 502
-    c = data['response']['features'][0]['geometry']['coordinates']
-    return {"label": q, "lat": c[1], "lon": c[0]}
-    
-# Upsets location in database
-def upsert_location(label: str, lat: float, lon: float) -> int:
-    sql = """
-    INSERT INTO locations (label, lat, lon)
-    VALUES (%s, %s, %s)
-    ON CONFLICT (lat, lon) DO UPDATE SET label = EXCLUDED.label
-    RETURNING id;
+        raise RuntimeError("Missing GEOCODIFY_API_KEY")
+
+    point = cached_geo("geocode", q, lambda: geocode_point(_geo_get("geocode", {"api_key": GEOCODIFY_API_KEY, "q": q})))
+    if point.get("_error") == "rate_limited":
+        raise RuntimeError("Geocodify rate limit hit. Type slower or upgrade the plan.")
+    if "_error" in point:
+        raise ValueError(f"Geocoding failed: {point['_error']}")
+    lat, lon, _ = snap_point(point["lat"], point["lon"])
+    return {"label": q, "lat": lat, "lon": lon}
+
+
+# Moves a point onto a saved location within LOCATION_SNAP_METERS, if the in-memory index knows one
+def snap_point(lat: float, lon: float) -> Tuple[float, float, Optional[Dict[str, Any]]]:
+    hit = location_index.nearest(lat, lon)
+    if hit is None:
+        return lat, lon, None
+    return hit["lat"], hit["lon"], hit
+
+
+_geo_stats_lock = threading.Lock()
+_geo_stats = {"hits": 0, "prefix_hits": 0, "misses": 0, "stale_served": 0, "db_errors": 0}
+
+
+def _count_geo(name: str) -> None:
+    with _geo_stats_lock:
+        _geo_stats[name] += 1
+
+
+def normalize_query(q: str) -> str:
+    return re.sub(r"\s+", " ", q.strip().lower())
+
+
+def _like_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _query_words(text: str) -> List[str]:
+    return [w for w in re.split(r"[^\w]+", text.lower()) if w]
+
+
+# Narrows an exhaustive shorter-prefix result set down to a longer query
+def _filter_suggestions(suggestions: List[Dict[str, Any]], qn: str) -> List[Dict[str, Any]]:
+    tokens = _query_words(qn)
+    out = []
+    for s in suggestions:
+        words = _query_words(s.get("label") or "")
+        if all(any(w.startswith(t) for w in words) for t in tokens):
+            out.append(s)
+    return out
+
+
+# Cache lookups and writes, shared with crud_async and so written with $n placeholders.
+# An autocomplete query also matches the longest cached shorter query whose result set
+# was complete, found via the prefix index ($4 is the LIKE stem of the query).
+_GEOCODE_LOOKUP_SQL = """
+  SELECT query_norm, results, complete,
+         fetched_at < now() - make_interval(secs => $3) AS stale
+  FROM geocode_cache
+  WHERE kind = $1 AND query_norm = ({match});
+"""
+_GEOCODE_MATCH = {
+    "autocomplete": """
+      SELECT query_norm FROM geocode_cache
+      WHERE kind = $1
+        AND query_norm LIKE $4
+        AND left($2, length(query_norm)) = query_norm
+        AND (query_norm = $2 OR complete)
+      ORDER BY length(query_norm) DESC
+      LIMIT 1
+    """,
+    "geocode": "SELECT $2::text",
+}
+_GEOCODE_STORE_SQL = """
+  INSERT INTO geocode_cache (kind, query_norm, results, complete)
+  VALUES ($1, $2, $3, $4)
+  ON CONFLICT (kind, query_norm) DO UPDATE
+    SET results = EXCLUDED.results, complete = EXCLUDED.complete, fetched_at = now();
+"""
+
+
+def _geocode_lookup(kind: str, qn: str) -> Tuple[str, List[Any]]:
+    if kind == "autocomplete":
+        args = [kind, qn, AUTOCOMPLETE_CACHE_MAX_AGE, _like_escape(qn[:AUTOCOMPLETE_MIN_CHARS]) + "%"]
+    else:
+        args = [kind, qn, GEOCODE_CACHE_MAX_AGE]
+    return _GEOCODE_LOOKUP_SQL.format(match=_GEOCODE_MATCH[kind]), args
+
+
+@timed_query
+def geocode_cache_lookup(kind: str, qn: str) -> Optional[Dict[str, Any]]:
+    """Return the best cached entry for `qn`.
+
+    Geocodes match exactly. Autocomplete also accepts the longest cached
+    shorter query whose result set was complete, found via the prefix index.
     """
+    # Plain read; hits are counted in-process by geocode_cache_stats
+    sql, args = _geocode_lookup(kind, qn)
+    with get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        execute_numbered(cur, sql, args)
+        return cur.fetchone()
+
+
+@timed_query
+def geocode_cache_store(kind: str, qn: str, results: Any, complete: bool = False) -> None:
     with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, (label, lat, lon))
-        return cur.fetchone()[0]
-    
+        execute_numbered(cur, _GEOCODE_STORE_SQL, (kind, qn, Json(results), complete))
+
+
+def _from_entry(kind: str, entry: Dict[str, Any], qn: str) -> Any:
+    if kind != "autocomplete":
+        return entry["results"]
+    if entry["query_norm"] != qn:
+        # Only complete sets answer longer queries, and what survives the filter is complete for qn too
+        return _filter_suggestions(entry["results"], qn), True
+    return entry["results"], entry["complete"]
+
+
+# Value and completeness of a fresh fetch, as stored in geocode_cache
+def _to_entry(kind: str, result: Any) -> Tuple[Any, bool]:
+    return result if kind == "autocomplete" else (result, False)
 
+
+def cached_geo(kind: str, q: str, fetch: Callable[[], Any]) -> Any:
+    """Serve a geocode ("geocode") or suggestion list ("autocomplete") from the
+    geocode_cache table, calling `fetch` on a miss or a stale entry.
+
+    `fetch` returns the value to cache or a dict with "_error". For autocomplete
+    the value is (suggestions, complete), where complete means upstream had no
+    more results for the query; it is returned in the same shape. A stale entry
+    is still served when the refresh fails, e.g. when Geocodify rate-limits us.
+    """
+    qn = normalize_query(q)
+    try:
+        entry = geocode_cache_lookup(kind, qn)
+    except Exception:
+        _count_geo("db_errors")
+        entry = None
+    if entry and not entry["stale"]:
+        _count_geo("hits" if entry["query_norm"] == qn else "prefix_hits")
+        return _from_entry(kind, entry, qn)
+
+    result = fetch()
+    if isinstance(result, dict) and "_error" in result:
+        if entry:
+            _count_geo("stale_served")
+            return _from_entry(kind, entry, qn)
+        _count_geo("misses")
+        return result
+
+    _count_geo("misses")
+    try:
+        geocode_cache_store(kind, qn, *_to_entry(kind, result))
+    except Exception:
+        _count_geo("db_errors")
+    return result
+
+
+def geocode_cache_stats() -> Dict[str, Any]:
+    with _geo_stats_lock:
+        out = dict(_geo_stats)
+    saved = out["hits"] + out["prefix_hits"]
+    lookups = saved + out["misses"] + out["stale_served"]
+    out["upstream_calls_saved"] = saved
+    out["hit_rate"] = round(saved / lookups, 4) if lookups else 0.0
+    return out
+
+# Every saved location, for the in-memory spatial index
+@timed_query
+def all_locations_db() -> List[Dict[str, Any]]:
+    with get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT id, label, lat, lon FROM locations")
+        return cur.fetchall()
+
+
+location_index = LocationIndex(all_locations_db)
+
+# grid_lat/grid_lon range (hundredths of a degree) covering radius_m around a point
+def _grid_bounds(lat: float, lon: float, radius_m: float) -> Tuple[int, int, int, int]:
+    dlat = radius_m / 111320.0
+    dlon = dlat / max(math.cos(math.radians(lat)), 0.01)
+    return (math.floor((lat - dlat) * 100), math.floor((lat + dlat) * 100),
+            math.floor((lon - dlon) * 100), math.floor((lon + dlon) * 100))
+
+def _same_point(row: Dict[str, Any], lat: float, lon: float) -> bool:
+    # locations stores numeric(9,6), so compare at that precision
+    return (round(float(row["lat"]), 6), round(float(row["lon"]), 6)) == (round(lat, 6), round(lon, 6))
+
+
+_INSERT_REQUEST_SQL = """
+    INSERT INTO weather_requests (location_id, start_date, end_date, unit)
+    VALUES ($1, $2, $3, $4)
+    RETURNING id, location_id
+"""
+
+# Location resolution and request insert in one statement. `near` is the closest saved
+# location within $11 metres (searched in grid cells $7-$8 x $9-$10) unless that is the
+# point itself; without one the point is upserted, rewriting the label only when it
+# changed so repeat saves do not churn the row.
+_CREATE_REQUEST_SQL = """
+    WITH closest AS (
+      SELECT id, lat, lon FROM locations
+      WHERE grid_lat BETWEEN $7 AND $8 AND grid_lon BETWEEN $9 AND $10
+        AND 2 * 6371008.8 * asin(least(1, sqrt(
+              sin(radians(lat - $2) / 2) ^ 2
+              + cos(radians($2)) * cos(radians(lat)) * sin(radians(lon - $3) / 2) ^ 2))) <= $11
+      ORDER BY sin(radians(lat - $2) / 2) ^ 2
+               + cos(radians($2)) * cos(radians(lat)) * sin(radians(lon - $3) / 2) ^ 2, id
+      LIMIT 1
+    ), near AS (
+      SELECT id FROM closest WHERE (lat, lon) <> ($2::numeric(9,6), $3::numeric(9,6))
+    ), ins AS (
+      INSERT INTO locations (label, lat, lon)
+      SELECT $1, $2, $3 WHERE NOT EXISTS (SELECT 1 FROM near)
+      ON CONFLICT (lat, lon) DO UPDATE SET label = EXCLUDED.label, updated_at = now()
+        WHERE locations.label IS DISTINCT FROM EXCLUDED.label
+      RETURNING id, xmax = 0 AS inserted
+    ), loc AS (
+      SELECT id, source FROM (
+        SELECT id, 'near' AS source, 0 AS pick FROM near
+        UNION ALL
+        SELECT id, CASE WHEN inserted THEN 'inserted' ELSE 'relabeled' END, 1 FROM ins
+        UNION ALL
+        SELECT id, 'existing', 2 FROM locations
+        WHERE lat = $2::numeric(9,6) AND lon = $3::numeric(9,6) AND NOT EXISTS (SELECT 1 FROM near)
+      ) candidates
+      ORDER BY pick
+      LIMIT 1
+    ), req AS (
+      INSERT INTO weather_requests (location_id, start_date, end_date, unit)
+      SELECT id, $4, $5, $6 FROM loc
+      RETURNING id, location_id
+    )
+    SELECT req.id, req.location_id, loc.source FROM req, loc
+"""
+_CREATE_REQUEST_TYPES = "text, float8, float8, date, date, text, int, int, int, int, float8"
+
+
+@timed_query
 def create_weather_request(loc: Dict[str, Any], start_s: str, end_s: str, unit: str = "fahrenheit") -> int:
+    """Saves a request in one round trip, resolving its location in the same statement."""
     start, end = validate_range(start_s, end_s)
     unit = "celsius" if str(unit).lower().startswith("c") else "fahrenheit"
-    loc_id = upsert_location(loc["label"], float(loc["lat"]), float(loc["lon"]))
-    sql = """
-    INSERT INTO weather_requests (location_id, start_date, end_date, unit)
-    VALUES (%s, %s, %s, %s)
-    RETURNING id;
-    """
+    label, lat, lon = loc["label"], float(loc["lat"]), float(loc["lon"])
+    hit = location_index.nearest(lat, lon)
     with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, (loc_id, start, end, unit))
-        return cur.fetchone()[0]
+        if hit is not None and not _same_point(hit, lat, lon):
+            execute_prepared(cur, "insert_weather_request", "bigint, date, date, text", _INSERT_REQUEST_SQL,
+                             (hit["id"], start, end, unit))
+            (req_id, loc_id), source = cur.fetchone(), "near"
+        else:
+            radius = LOCATION_SNAP_METERS if LOCATION_SNAP_METERS > 0 else -1.0
+            args = (label, lat, lon, start, end, unit, *_grid_bounds(lat, lon, max(radius, 0.0)), radius)
+            # A concurrent save of the same new point commits after our snapshot: ON CONFLICT
+            # then sees it but the statement cannot, so a second statement (new snapshot) is needed
+            for _ in range(2):
+                execute_prepared(cur, "create_weather_request", _CREATE_REQUEST_TYPES, _CREATE_REQUEST_SQL, args)
+                row = cur.fetchone()
+                if row is not None:
+                    break
+            else:
+                raise RuntimeError("Could not resolve the request's location")
+            req_id, loc_id, source = row
+    if source in ("inserted", "relabeled"):
+        location_index.add({"id": loc_id, "label": label, "lat": lat, "lon": lon})
+    invalidate_location(loc_id)
+    return req_id
 
-def list_requests_db(limit: int = 200) -> List[Dict[str, Any]]:
-    sql = """
-      SELECT wr.id, wr.start_date, wr.end_date, wr.unit, wr.created_at,
-             l.id AS location_id, l.label, l.lat, l.lon
-      FROM weather_requests wr
-      JOIN locations l ON wr.location_id = l.id
-      ORDER BY wr.created_at DESC
+# A saved request with its location; the shared head of the request queries below
+_REQUEST_SELECT = """
+  SELECT wr.id, wr.start_date, wr.end_date, wr.unit, wr.created_at,
+         l.id AS location_id, l.label, l.lat, l.lon
+  FROM weather_requests wr
+  JOIN locations l ON wr.location_id = l.id
+"""
+_REQUEST_BY_ID_SQL = _REQUEST_SELECT + "WHERE wr.id = $1;"
+
+
+@timed_query
+def list_requests_db(limit: int = 200, after: Tuple[Any, int] | None = None, location_id: int | None = None,
+                     overlaps: Tuple[Any, Any] | None = None, unit: str | None = None) -> List[Dict[str, Any]]:
+    """Newest-first page of requests; `after` is the (created_at, id) of the last row already seen."""
+    where, args = _list_filters(location_id, overlaps, unit)
+    if after is not None:
+        where.append("(wr.created_at, wr.id) < (%s, %s)")
+        args.extend(after)
+    sql = _REQUEST_SELECT + f"""
+      {"WHERE " + " AND ".join(where) if where else ""}
+      ORDER BY wr.created_at DESC, wr.id DESC
       LIMIT %s;
     """
+    args.append(limit)
     with get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(sql, (limit,))
+        cur.execute(sql, tuple(args))
         return cur.fetchall()
 
-def get_request_db(req_id: int) -> Optional[Dict[str, Any]]:
-    sql = """
-      SELECT wr.id, wr.start_date, wr.end_date, wr.unit, wr.created_at,
-             l.id AS location_id, l.label, l.lat, l.lon
+
+def _list_filters(location_id: int | None, overlaps: Tuple[Any, Any] | None,
+                  unit: str | None) -> Tuple[List[str], List[Any]]:
+    where, args = [], []
+    if location_id is not None:
+        where.append("wr.location_id = %s")
+        args.append(location_id)
+    if overlaps is not None:
+        start, end = overlaps
+        if start is not None:
+            where.append("wr.end_date >= %s")
+            args.append(start)
+        if end is not None:
+            where.append("wr.start_date <= %s")
+            args.append(end)
+    if unit:
+        where.append("wr.unit = %s")
+        args.append(unit)
+    return where, args
+
+# Validators for the filtered request list: (fingerprint, last change). Inserts and edits stamp
+# weather_requests.updated_at; relabels and deletes stamp locations.updated_at, read through its
+# index for the whole table. Prefetch access-time writes touch neither, and no row is shared by writers.
+@timed_query
+def requests_list_fingerprint(location_id: int | None = None, overlaps: Tuple[Any, Any] | None = None,
+                              unit: str | None = None) -> Tuple[str, Any]:
+    where, args = _list_filters(location_id, overlaps, unit)
+    sql = f"""
+      SELECT count(*), max(wr.updated_at), (SELECT max(updated_at) FROM locations)
       FROM weather_requests wr
-      JOIN locations l ON wr.location_id = l.id
-      WHERE wr.id = %s;
+      {"WHERE " + " AND ".join(where) if where else ""};
     """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(sql, tuple(args))
+        count, requests_at, locations_at = cur.fetchone()
+    changed = [t for t in (requests_at, locations_at) if t is not None]
+    last_modified = max(changed) if changed else None
+    return f"{count}-{requests_at}-{locations_at}", last_modified
+
+@timed_query
+def get_request_db(req_id: int) -> Optional[Dict[str, Any]]:
     with get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(sql, (req_id,))
+        execute_numbered(cur, _REQUEST_BY_ID_SQL, (req_id,))
         return cur.fetchone()
 
+# Loads many weather requests in one query
+@timed_query
+def get_requests_db(req_ids: List[int]) -> List[Dict[str, Any]]:
+    sql = _REQUEST_SELECT + """
+      WHERE wr.id = ANY(%s)
+      ORDER BY wr.created_at DESC;
+    """
+    with get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(sql, (list(req_ids),))
+        return cur.fetchall()
+
+# Resolves many locations to ids in one round trip; existing rows keep their label
+@timed_query
+def bulk_upsert_locations_db(locs: List[Tuple[str, float, float]]) -> Dict[Tuple[float, float], int]:
+    sql = """
+    WITH input (label, lat, lon) AS (VALUES %s),
+    ins AS (
+      INSERT INTO locations (label, lat, lon)
+      SELECT label, lat, lon FROM input
+      ON CONFLICT (lat, lon) DO NOTHING
+      RETURNING id, lat, lon
+    )
+    SELECT id, lat, lon FROM ins
+    UNION ALL
+    SELECT l.id, l.lat, l.lon FROM locations l
+    JOIN input i ON l.lat = i.lat AND l.lon = i.lon;
+    """
+    template = "(%s, %s::numeric(9,6), %s::numeric(9,6))"
+    with get_conn() as conn, conn.cursor() as cur:
+        rows = execute_values(cur, sql, locs, template=template, fetch=True)
+        ids = {(round(float(lat), 6), round(float(lon), 6)): loc_id for loc_id, lat, lon in rows}
+        # A point inserted concurrently is skipped by ON CONFLICT but committed after our
+        # snapshot, so the join cannot see it either; a second statement (new snapshot) can
+        missing = [loc for loc in locs if (round(loc[1], 6), round(loc[2], 6)) not in ids]
+        if missing:
+            rows = execute_values(cur, """
+              SELECT l.id, l.lat, l.lon FROM locations l
+              JOIN (VALUES %s) AS input (label, lat, lon) ON l.lat = input.lat AND l.lon = input.lon;
+            """, missing, template=template, fetch=True)
+            ids.update({(round(float(lat), 6), round(float(lon), 6)): loc_id for loc_id, lat, lon in rows})
+    return ids
+
+# Streams many weather requests into the table with COPY
+@timed_query
+def copy_weather_requests_db(rows: List[Tuple[int, Any, Any, str]]) -> int:
+    buf = io.StringIO()
+    for loc_id, start, end, unit in rows:
+        buf.write(f"{loc_id}\t{start.isoformat()}\t{end.isoformat()}\t{unit}\n")
+    buf.seek(0)
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.copy_expert("COPY weather_requests (location_id, start_date, end_date, unit) FROM STDIN", buf)
+        return cur.rowcount
+
+# Iterates over all requests with a server-side cursor, oldest first
+@timed_query
+def iter_requests_db(batch_size: int = 2000) -> Iterator[Dict[str, Any]]:
+    sql = _REQUEST_SELECT + """
+      ORDER BY wr.created_at, wr.id;
+    """
+    with get_conn() as conn, conn.cursor(name="export_requests", cursor_factory=RealDictCursor) as cur:
+        cur.itersize = batch_size
+        cur.execute(sql)
+        yield from cur
+
 # Updates the weather request with the given ID
+_UPDATE_REQUEST_SQL = """
+    WITH upd AS (
+      UPDATE weather_requests
+      SET start_date = COALESCE($2, start_date), end_date = COALESCE($3, end_date), unit = COALESCE($4, unit),
+          updated_at = now()
+      WHERE id = $1 AND COALESCE($3, end_date) >= COALESCE($2, start_date)
+      RETURNING location_id
+    )
+    SELECT EXISTS (SELECT 1 FROM weather_requests WHERE id = $1), (SELECT location_id FROM upd)
+"""
+
+
+@timed_query
 def update_request_db(req_id: int, start_s: str | None, end_s: str | None, unit: str | None) -> bool:
-    sets, args = [], []
-    if unit:
-        sets.append("unit = %s")
-        args.append("celsius" if unit.lower().startswith("c") else "fahrenheit")
-    if start_s or end_s:
-        # If only one side is provided, reuse the other from current row
-        cur_row = get_request_db(req_id)
-        if not cur_row:
-            return False
-        start = start_s or str(cur_row["start_date"])
-        end = end_s or str(cur_row["end_date"])
-        s, e = validate_range(start, end)
-        sets.append("start_date = %s")
-        sets.append("end_date = %s")
-        args.extend([s, e])
-
-    if not sets:
+    """Applies the given edits in one statement; a missing date keeps the stored one."""
+    start = parse_iso_date(start_s) if start_s else None
+    end = parse_iso_date(end_s) if end_s else None
+    if start is not None and end is not None:
+        validate_range(start_s, end_s)
+    unit = ("celsius" if unit.lower().startswith("c") else "fahrenheit") if unit else None
+    if start is None and end is None and unit is None:
         return True  # nothing to change
 
-    sql = f"UPDATE weather_requests SET {', '.join(sets)} WHERE id = %s"
-    args.append(req_id)
+    with get_conn() as conn, conn.cursor() as cur:
+        execute_prepared(cur, "update_weather_request", "bigint, date, date, text", _UPDATE_REQUEST_SQL,
+                         (req_id, start, end, unit))
+        found, location_id = cur.fetchone()
+    if not found:
+        return False
+    if location_id is None:
+        # Only one date was given and it is on the wrong side of the stored one
+        raise ValueError("end_date must be on/after start_date")
+    # Cached range statistics for the location no longer match its requests
+    invalidate_location(location_id)
+    return True
+
+# Stored daily weather for a location; `usable` marks rows that need no refetch
+_DAILY_WEATHER_SQL = f"""
+  SELECT day, {", ".join(DAILY_WEATHER_FIELDS)}, final,
+         final OR fetched_at > now() - make_interval(secs => $1) AS usable
+  FROM daily_weather
+  WHERE location_id = $2 AND day BETWEEN $3 AND $4
+  ORDER BY day;
+"""
+
+
+@timed_query
+def get_daily_weather_db(location_id: int, start, end) -> List[Dict[str, Any]]:
+    with get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        execute_numbered(cur, _DAILY_WEATHER_SQL, (DAILY_WEATHER_FRESH_SECONDS, location_id, start, end))
+        return cur.fetchall()
+
+# Stored daily weather for several (location_id, start, end) spans in one query, by location
+@timed_query
+def get_daily_weather_many_db(spans: List[Tuple[int, Any, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+    if not spans:
+        return {}
+    sql = f"""
+      SELECT dw.location_id, dw.day, {", ".join("dw." + f for f in DAILY_WEATHER_FIELDS)}, dw.final,
+             dw.final OR dw.fetched_at > now() - make_interval(secs => %s) AS usable
+      FROM unnest(%s::bigint[], %s::date[], %s::date[]) AS s(location_id, start_day, end_day)
+      JOIN daily_weather dw ON dw.location_id = s.location_id AND dw.day BETWEEN s.start_day AND s.end_day
+      ORDER BY dw.location_id, dw.day;
+    """
+    ids, starts, ends = zip(*spans)
+    out: Dict[int, List[Dict[str, Any]]] = {}
+    with get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(sql, (DAILY_WEATHER_FRESH_SECONDS, list(ids), list(starts), list(ends)))
+        for row in cur.fetchall():
+            out.setdefault(row.pop("location_id"), []).append(row)
+    return out
+
+# Aggregates over a set of daily_weather rows aliased dw; columns match range_stats.summary_from_row
+_RANGE_STATS_SELECT = """
+  count(dw.day) AS days,
+  count(dw.temperature_2m_max) AS days_with_data,
+  avg(dw.temperature_2m_max) AS t_max_mean,
+  max(dw.temperature_2m_max) AS t_max,
+  (array_agg(dw.day ORDER BY dw.temperature_2m_max DESC, dw.day)
+     FILTER (WHERE dw.temperature_2m_max IS NOT NULL))[1] AS t_max_date,
+  avg(dw.temperature_2m_min) AS t_min_mean,
+  min(dw.temperature_2m_min) AS t_min,
+  (array_agg(dw.day ORDER BY dw.temperature_2m_min, dw.day)
+     FILTER (WHERE dw.temperature_2m_min IS NOT NULL))[1] AS t_min_date,
+  avg(dw.precipitation_probability_max) AS pop_mean,
+  count(*) FILTER (WHERE dw.precipitation_probability_max >= %(wet)s) AS wet_days,
+  (array_agg(dw.day ORDER BY dw.wind_speed_10m_max DESC, dw.day)
+     FILTER (WHERE dw.wind_speed_10m_max IS NOT NULL))[1] AS windiest_date,
+  max(dw.wind_speed_10m_max) AS wind_max,
+  (array_agg(dw.wind_gusts_10m_max ORDER BY dw.wind_speed_10m_max DESC, dw.day)
+     FILTER (WHERE dw.wind_speed_10m_max IS NOT NULL))[1] AS gust_max,
+  mode() WITHIN GROUP (ORDER BY dw.weather_code) AS dominant_code
+"""
+
 
+# Range statistics from stored daily weather: one row per saved request of the location, plus one
+# over every day any of them covers (overlapping requests count each day once)
+@timed_query
+def range_stats_db(location_id: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    per_request = f"""
+      SELECT wr.id, wr.start_date, wr.end_date, wr.unit, {_RANGE_STATS_SELECT}
+      FROM weather_requests wr
+      LEFT JOIN daily_weather dw
+        ON dw.location_id = wr.location_id AND dw.day BETWEEN wr.start_date AND wr.end_date
+      WHERE wr.location_id = %(loc)s
+      GROUP BY wr.id
+      ORDER BY wr.start_date, wr.id;
+    """
+    overall = f"""
+      SELECT {_RANGE_STATS_SELECT}
+      FROM daily_weather dw
+      WHERE dw.location_id = %(loc)s
+        AND EXISTS (SELECT 1 FROM weather_requests wr
+                    WHERE wr.location_id = dw.location_id AND dw.day BETWEEN wr.start_date AND wr.end_date);
+    """
+    args = {"loc": location_id, "wet": WET_DAY_POP}
+    with get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(per_request, args)
+        rows = cur.fetchall()
+        cur.execute(overall, args)
+        return rows, cur.fetchone()
+
+# What range_stats_db reads for a location: (request count, latest request change, latest stored day fetch).
+# It moves with any write in any process, so caches keyed on it need no cross-process invalidation.
+@timed_query
+def location_stats_version(location_id: int) -> Tuple[int, Any, Any]:
+    sql = """
+      SELECT count(*), max(updated_at),
+             (SELECT max(fetched_at) FROM daily_weather WHERE location_id = %(loc)s)
+      FROM weather_requests
+      WHERE location_id = %(loc)s;
+    """
     with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, tuple(args))
-        return cur.rowcount > 0
+        cur.execute(sql, {"loc": location_id})
+        return cur.fetchone()
+
+# (location_id, day, *DAILY_WEATHER_FIELDS, final) rows of a metric Open-Meteo daily block
+def _daily_weather_rows(location_id: int, daily: Dict[str, Any], final_before: date) -> List[Tuple[Any, ...]]:
+    times = daily.get("time") or []
+    cols = [daily.get(f) or [None] * len(times) for f in DAILY_WEATHER_FIELDS]
+    rows = []
+    for i, t in enumerate(times):
+        values = [c[i] if i < len(c) else None for c in cols]
+        # Days upstream has no data for are left out so they get retried later
+        if all(v is None for v in values):
+            continue
+        day = date.fromisoformat(t)
+        rows.append((location_id, day, *values, day < final_before))
+    return rows
+
+
+# Upsert of daily_weather rows given as `values`; final days are never overwritten
+def _store_daily_weather_sql(values: str) -> str:
+    updates = ", ".join(f"{f} = EXCLUDED.{f}" for f in DAILY_WEATHER_FIELDS)
+    return f"""
+    INSERT INTO daily_weather (location_id, day, {", ".join(DAILY_WEATHER_FIELDS)}, final)
+    VALUES {values}
+    ON CONFLICT (location_id, day) DO UPDATE
+      SET {updates}, final = EXCLUDED.final, fetched_at = now()
+      WHERE NOT daily_weather.final;
+    """
+
+
+# Upserts a metric Open-Meteo daily block; days before `final_before` are frozen
+@timed_query
+def store_daily_weather_db(location_id: int, daily: Dict[str, Any], final_before: date) -> int:
+    rows = _daily_weather_rows(location_id, daily, final_before)
+    if not rows:
+        return 0
+    with get_conn() as conn, conn.cursor() as cur:
+        execute_values(cur, _store_daily_weather_sql("%s"), rows)
+    return len(rows)
+
+# Popular and recently served locations, best first, with the part of their requests inside [window_start, window_end]
+@timed_query
+def prefetch_candidates_db(limit: int, window_start, window_end, recency_weight: float = 2.0,
+                           recency_days: float = 7.0) -> List[Dict[str, Any]]:
+    sql = """
+      SELECT l.id AS location_id, l.lat, l.lon, count(*) AS request_count, l.last_accessed_at,
+             greatest(min(wr.start_date), %s::date) AS start_date,
+             least(max(wr.end_date), %s::date) AS end_date
+      FROM locations l
+      JOIN weather_requests wr ON wr.location_id = l.id
+      GROUP BY l.id
+      ORDER BY ln(1 + count(*))
+               + %s * exp(-extract(epoch FROM now() - coalesce(l.last_accessed_at, max(wr.created_at)))
+                          / 86400.0 / %s) DESC
+      LIMIT %s;
+    """
+    with get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(sql, (window_start, window_end, recency_weight, recency_days, limit))
+        return cur.fetchall()
+
+# Records that these locations' weather was just served
+@timed_query
+def touch_locations_db(location_ids: List[int]) -> int:
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("UPDATE locations SET last_accessed_at = now() WHERE id = ANY(%s)", (list(location_ids),))
+        return cur.rowcount
 
 # Relabels a location in the database
+@timed_query
 def relabel_location_db(loc_id: int, label: str) -> bool:
     with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("UPDATE locations SET label = %s WHERE id = %s", (label, loc_id))
+        cur.execute("UPDATE locations SET label = %s, updated_at = now() WHERE id = %s", (label, loc_id))
         return cur.rowcount > 0
 
-# Deletes the weather request with the given ID
+# Deletes the weather request with the given ID; its location's updated_at records when the list lost a row
+@timed_query
 def delete_request_db(req_id: int) -> bool:
+    sql = """
+      WITH del AS (DELETE FROM weather_requests WHERE id = %s RETURNING location_id)
+      UPDATE locations SET updated_at = now() WHERE id IN (SELECT location_id FROM del)
+      RETURNING id;
+    """
     with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("DELETE FROM weather_requests WHERE id = %s", (req_id,))
-        return cur.rowcount > 0
\ No newline at end of file
+        cur.execute(sql, (req_id,))
+        row = cur.fetchone()
+    if row is None:
+        return False
+    invalidate_location(row[0])
+    return True
@@ -0,0 +1,148 @@
+"""Awaitable versions of the crud.py queries used by the ASGI routes.
+
+Uses an asyncpg pool when asyncpg is installed. Otherwise each call runs the
+psycopg2 version from crud.py in a worker thread, so the event loop is never
+blocked either way. The statements themselves are crud.py's, written with $n
+placeholders so both drivers run the same SQL.
+"""
+import asyncio
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from crud import (
+    DAILY_WEATHER_FRESH_SECONDS,
+    _DAILY_WEATHER_SQL,
+    _GEOCODE_STORE_SQL,
+    _REQUEST_BY_ID_SQL,
+    _count_geo,
+    _daily_weather_rows,
+    _from_entry,
+    _geocode_lookup,
+    _store_daily_weather_sql,
+    _to_entry,
+    geocode_cache_lookup,
+    geocode_cache_store,
+    get_daily_weather_db,
+    get_request_db,
+    normalize_query,
+    store_daily_weather_db,
+)
+from db_raw import DB_URL, POOL_MAX, POOL_MIN, POOL_TIMEOUT, PREPARED_STATEMENTS
+from metrics import timed_query
+
+try:  # optional: native asyncio PostgreSQL driver
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+ASYNC_POOL_MAX = int(os.getenv("DB_ASYNC_POOL_MAX", str(POOL_MAX * 2)))  # a connection is only held per query
+
+_pool = None
+_pool_lock: asyncio.Lock | None = None
+
+
+async def _init_conn(conn) -> None:
+    # Match psycopg2, which hands jsonb back as Python objects
+    await conn.set_type_codec("jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+
+async def get_async_pool():
+    global _pool, _pool_lock
+    if not DB_URL:
+        raise RuntimeError("DATABASE_URL not set")
+    if _pool is None:
+        if _pool_lock is None:
+            _pool_lock = asyncio.Lock()
+        async with _pool_lock:
+            if _pool is None:
+                # asyncpg prepares every statement it runs; with DB_PREPARED_STATEMENTS=0 it must not reuse them
+                cache_size = {} if PREPARED_STATEMENTS else {"statement_cache_size": 0}
+                _pool = await asyncpg.create_pool(DB_URL, min_size=POOL_MIN, max_size=ASYNC_POOL_MAX,
+                                                  timeout=POOL_TIMEOUT, init=_init_conn, **cache_size)
+    return _pool
+
+
+async def close_async_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def async_pool_stats() -> Dict[str, Any]:
+    if _pool is None:
+        return {"driver": "asyncpg" if asyncpg else "threads", "size": 0, "idle": 0, "max": ASYNC_POOL_MAX}
+    return {"driver": "asyncpg", "size": _pool.get_size(), "idle": _pool.get_idle_size(), "max": ASYNC_POOL_MAX}
+
+
+@timed_query
+async def aget_request_db(req_id: int) -> Optional[Dict[str, Any]]:
+    if asyncpg is None:
+        return await asyncio.to_thread(get_request_db, req_id)
+    row = await (await get_async_pool()).fetchrow(_REQUEST_BY_ID_SQL, req_id)
+    return dict(row) if row else None
+
+
+@timed_query
+async def aget_daily_weather_db(location_id: int, start, end) -> List[Dict[str, Any]]:
+    if asyncpg is None:
+        return await asyncio.to_thread(get_daily_weather_db, location_id, start, end)
+    rows = await (await get_async_pool()).fetch(_DAILY_WEATHER_SQL, DAILY_WEATHER_FRESH_SECONDS, location_id, start, end)
+    return [dict(r) for r in rows]
+
+
+@timed_query
+async def astore_daily_weather_db(location_id: int, daily: Dict[str, Any], final_before) -> int:
+    if asyncpg is None:
+        return await asyncio.to_thread(store_daily_weather_db, location_id, daily, final_before)
+    rows = _daily_weather_rows(location_id, daily, final_before)
+    if not rows:
+        return 0
+    placeholders = ", ".join(f"${i}" for i in range(1, len(rows[0]) + 1))
+    await (await get_async_pool()).executemany(_store_daily_weather_sql(f"({placeholders})"), rows)
+    return len(rows)
+
+
+@timed_query
+async def ageocode_cache_lookup(kind: str, qn: str) -> Optional[Dict[str, Any]]:
+    if asyncpg is None:
+        return await asyncio.to_thread(geocode_cache_lookup, kind, qn)
+    sql, args = _geocode_lookup(kind, qn)
+    row = await (await get_async_pool()).fetchrow(sql, *args)
+    return dict(row) if row else None
+
+
+@timed_query
+async def ageocode_cache_store(kind: str, qn: str, results: Any, complete: bool = False) -> None:
+    if asyncpg is None:
+        return await asyncio.to_thread(geocode_cache_store, kind, qn, results, complete)
+    await (await get_async_pool()).execute(_GEOCODE_STORE_SQL, kind, qn, results, complete)
+
+
+async def acached_geo(kind: str, q: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+    """Awaitable crud.cached_geo: same cache table, counters and stale fallback."""
+    qn = normalize_query(q)
+    try:
+        entry = await ageocode_cache_lookup(kind, qn)
+    except Exception:
+        _count_geo("db_errors")
+        entry = None
+    if entry and not entry["stale"]:
+        _count_geo("hits" if entry["query_norm"] == qn else "prefix_hits")
+        return _from_entry(kind, entry, qn)
+
+    result = await fetch()
+    if isinstance(result, dict) and "_error" in result:
+        if entry:
+            _count_geo("stale_served")
+            return _from_entry(kind, entry, qn)
+        _count_geo("misses")
+        return result
+
+    _count_geo("misses")
+    try:
+        await ageocode_cache_store(kind, qn, *_to_entry(kind, result))
+    except Exception:
+        _count_geo("db_errors")
+    return result
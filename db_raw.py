@@ -1,9 +1,316 @@
 import os
+import re
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, List, Sequence, Tuple
+
 import psycopg2
 
+from metrics import db_acquire_duration
+
 DB_URL = os.getenv("DATABASE_URL")  # must include sslmode=require
 
-def get_conn():
+# Pool settings (seconds for all timings)
+POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+POOL_HEALTHCHECK_AFTER = float(os.getenv("DB_POOL_HEALTHCHECK_AFTER", "30"))
+
+# Set to 0 behind a transaction-mode pooler (PgBouncer, Supabase on :6543), where a
+# PREPAREd statement is not guaranteed to exist on the server connection that runs EXECUTE
+PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "1").lower() not in ("0", "false", "no")
+
+
+class PoolTimeout(RuntimeError):
+    pass
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of psycopg2 connections.
+
+    Idle connections are kept newest-first so hot ones get reused and cold ones
+    age out. A connection that sat idle longer than `healthcheck_after` is pinged
+    before being handed out and replaced if the socket turned out to be dead.
+    """
+
+    def __init__(self, dsn: str, minconn: int = POOL_MIN, maxconn: int = POOL_MAX,
+                 timeout: float = POOL_TIMEOUT, max_idle: float = POOL_MAX_IDLE,
+                 healthcheck_after: float = POOL_HEALTHCHECK_AFTER):
+        self.dsn = dsn
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn)
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.healthcheck_after = healthcheck_after
+        self.pid = os.getpid()
+        self._cond = threading.Condition()
+        self._idle: List[Tuple[Any, float]] = []  # (conn, last_used); newest at the end
+        self._size = 0  # open connections, idle + checked out
+        self._stats = {
+            "connects": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "timeouts": 0,
+            "healthcheck_failures": 0,
+            "discarded_broken": 0,
+            "evicted_idle": 0,
+            "in_use_peak": 0,
+        }
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        with self._cond:
+            self._stats["connects"] += 1
+        return conn
+
+    def _evict_idle_locked(self, now: float) -> List[Any]:
+        # Oldest idle connections sit at the front of the list
+        evicted = []
+        while len(self._idle) > 0 and self._size > self.minconn:
+            conn, last_used = self._idle[0]
+            if now - last_used < self.max_idle:
+                break
+            self._idle.pop(0)
+            self._size -= 1
+            self._stats["evicted_idle"] += 1
+            evicted.append(conn)
+        return evicted
+
+    def _healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def acquire(self, timeout: float | None = None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+        with self._cond:
+            evicted = self._evict_idle_locked(time.time())
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"No database connection available after {timeout:.1f}s")
+                waited = True
+                self._cond.wait(remaining)
+            if waited:
+                wait_s = time.monotonic() - started
+                self._stats["waits"] += 1
+                self._stats["wait_seconds_total"] += wait_s
+                self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], wait_s)
+            self._stats["checkouts"] += 1
+            in_use = self._size - len(self._idle)
+            self._stats["in_use_peak"] = max(self._stats["in_use_peak"], in_use)
+
+        for old in evicted:
+            _close_quietly(old)
+
+        try:
+            if conn is not None and (conn.closed or time.time() - last_used >= self.healthcheck_after):
+                if not self._healthy(conn):
+                    with self._cond:
+                        self._stats["healthcheck_failures"] += 1
+                    _close_quietly(conn)
+                    conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            # Give the slot back so a failed connect does not shrink the pool for good
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def release(self, conn, discard: bool = False) -> None:
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        if discard or conn.closed:
+            _close_quietly(conn)
+            with self._cond:
+                self._size -= 1
+                self._stats["discarded_broken"] += 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append((conn, time.time()))
+            self._cond.notify()
+
+    def warm(self, n: int | None = None) -> int:
+        """Open connections until `n` (default minconn, at least one) are idle; returns how many were opened."""
+        target = max(1, self.minconn if n is None else n)
+        opened = 0
+        while True:
+            with self._cond:
+                if len(self._idle) >= target or self._size >= self.maxconn:
+                    return opened
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            self.release(conn)
+            opened += 1
+
+    def close(self) -> None:
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn, _ in idle:
+            _close_quietly(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            out = dict(self._stats)
+            out.update({
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max": self.maxconn,
+            })
+        return out
+
+
+def _close_quietly(conn) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
     if not DB_URL:
         raise RuntimeError("DATABASE_URL not set")
-    return psycopg2.connect(DB_URL)
\ No newline at end of file
+    pool = _pool
+    # A pool inherited across fork (e.g. gunicorn preload) must not share sockets
+    if pool is None or pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = ConnectionPool(DB_URL)
+            pool = _pool
+    return pool
+
+
+@contextmanager
+def get_conn():
+    """Borrow a pooled connection; commits on success, rolls back on error."""
+    pool = get_pool()
+    t0 = time.perf_counter()
+    conn = pool.acquire()
+    db_acquire_duration.observe(time.perf_counter() - t0)
+    broken = False
+    try:
+        with conn:
+            yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        pool.release(conn, discard=broken)
+
+
+# Statement names already PREPAREd on each connection; a pooled connection is used by one thread at a time
+_prepared: "weakref.WeakKeyDictionary[Any, set]" = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
+
+_PLACEHOLDER = re.compile(r"\$(\d+)")
+
+
+@lru_cache(maxsize=None)
+def pyformat(sql: str, types: str | None = None) -> Tuple[str, Tuple[int, ...]]:
+    """`sql` written with $1..$n placeholders (as asyncpg and PREPARE take) for psycopg2.
+
+    Returns the statement with %s placeholders, cast to `types` when given,
+    and the argument index each one takes, since a $n may appear twice.
+    """
+    type_list = [t.strip() for t in types.split(",")] if types else None
+    order: List[int] = []
+
+    def sub(m):
+        i = int(m.group(1)) - 1
+        order.append(i)
+        return f"%s::{type_list[i]}" if type_list else "%s"
+
+    return _PLACEHOLDER.sub(sub, sql.replace("%", "%%")), tuple(order)
+
+
+def execute_numbered(cur, sql: str, args: Sequence[Any]) -> None:
+    """cur.execute for a statement shared with crud_async, so written with $1..$n placeholders."""
+    plain_sql, order = pyformat(sql)
+    cur.execute(plain_sql, [args[i] for i in order])
+
+
+def execute_prepared(cur, name: str, types: str, sql: str, args: Tuple[Any, ...]) -> None:
+    """Run `sql` ($1..$n placeholders of the given types) as a server-side prepared statement.
+
+    It is PREPAREd the first time `name` runs on the cursor's connection and
+    EXECUTEd from then on, so the server parses and plans it once per
+    connection. Prepared statements outlive rolled-back transactions. With
+    DB_PREPARED_STATEMENTS=0 the same statement is sent as a plain query.
+    """
+    if not PREPARED_STATEMENTS:
+        plain_sql, order = pyformat(sql, types)
+        cur.execute(plain_sql, [args[i] for i in order])
+        return
+    conn = cur.connection
+    with _prepared_lock:
+        names = _prepared.setdefault(conn, set())
+        fresh = name not in names
+    if fresh:
+        cur.execute(f"PREPARE {name} ({types}) AS {sql}")
+        with _prepared_lock:
+            names.add(name)
+    cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(args))})", args)
+
+
+def warm_pool() -> int:
+    """Open this process's minimum of idle connections ahead of its first query."""
+    return get_pool().warm()
+
+
+def pool_stats() -> Dict[str, Any]:
+    if _pool is None:
+        return {"size": 0, "idle": 0, "in_use": 0, "max": POOL_MAX}
+    return _pool.stats()
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
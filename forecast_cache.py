@@ -0,0 +1,246 @@
+import asyncio
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+# Forecast cache settings
+CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", "2048"))
+CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "900"))  # Open-Meteo refreshes current conditions every 15 min
+CACHE_GRID = float(os.getenv("WEATHER_CACHE_GRID", "0.01"))  # degrees; ~1.1 km of latitude
+CACHE_EXPIRY_SPREAD = float(os.getenv("WEATHER_CACHE_EXPIRY_SPREAD", "60"))  # seconds keys are staggered by
+
+
+# Stable per-key delay after each aligned expiry boundary, so keys do not all expire (and refetch) in one burst
+def expiry_offset(key: Hashable, ttl: float = CACHE_TTL, spread: float = CACHE_EXPIRY_SPREAD) -> float:
+    spread = min(spread, ttl / 2)
+    if spread <= 0:
+        return 0.0
+    return zlib.crc32(repr(key).encode()) % 1000 / 1000 * spread
+
+
+class _Pending:
+    """A fetch in progress that later callers for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: BaseException | None = None
+
+
+class ForecastCache:
+    """Size-bounded LRU cache with TTL expiry and coalescing of concurrent misses.
+
+    Expiry is aligned to wall-clock multiples of the TTL so an entry never
+    outlives the upstream model update it was fetched after by more than its
+    key's expiry_offset (under `spread` seconds).
+    """
+
+    def __init__(self, maxsize: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL, grid: float = CACHE_GRID,
+                 spread: float = CACHE_EXPIRY_SPREAD):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self.grid = grid
+        self.spread = spread
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()  # key -> (expires_at, value)
+        self._inflight: Dict[Hashable, _Pending] = {}
+        self._ainflight: Dict[Hashable, "asyncio.Task[Any]"] = {}  # misses being fetched by coroutines
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expirations": 0, "errors": 0}
+
+    def snap(self, value: float) -> float:
+        if self.grid <= 0:
+            return value
+        return round(round(value / self.grid) * self.grid, 6)
+
+    def key(self, lat: float, lon: float, *extra: Hashable) -> Tuple[Hashable, ...]:
+        return (self.snap(lat), self.snap(lon)) + tuple(extra)
+
+    def _expires_at(self, key: Hashable, now: float) -> float:
+        if self.ttl <= 0:
+            return now
+        offset = expiry_offset(key, self.ttl, self.spread)
+        return ((now - offset) // self.ttl + 1) * self.ttl + offset
+
+    def _lookup_locked(self, key: Hashable) -> Tuple[bool, Any]:
+        now = time.time()
+        entry = self._data.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._data.move_to_end(key)
+                self._stats["hits"] += 1
+                return True, entry[1]
+            del self._data[key]
+            self._stats["expirations"] += 1
+        return False, None
+
+    def get_or_fetch(self, key: Hashable, fetch: Callable[[], Any]) -> Any:
+        with self._lock:
+            hit, value = self._lookup_locked(key)
+            if hit:
+                return value
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = _Pending()
+                self._inflight[key] = pending
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            pending.error = e
+            with self._lock:
+                self._stats["errors"] += 1
+                self._inflight.pop(key, None)
+            pending.done.set()
+            raise
+
+        pending.value = value
+        with self._lock:
+            self._store_locked(key, value)
+            self._inflight.pop(key, None)
+        pending.done.set()
+        return value
+
+    def get_many_or_fetch(self, keys: List[Hashable], fetch_many: Callable[[List[Hashable]], List[Any]]) -> List[Any]:
+        """get_or_fetch for several keys: all misses share one fetch_many(missing) call.
+
+        Keys already being fetched elsewhere are waited on rather than fetched
+        again. If the shared fetch fails, the error is raised for every key in it.
+        """
+        found: Dict[Hashable, Any] = {}
+        lead: Dict[Hashable, _Pending] = {}
+        waits: Dict[Hashable, _Pending] = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                hit, value = self._lookup_locked(key)
+                if hit:
+                    found[key] = value
+                    continue
+                pending = self._inflight.get(key)
+                if pending is None:
+                    pending = self._inflight[key] = lead[key] = _Pending()
+                    self._stats["misses"] += 1
+                else:
+                    waits[key] = pending
+                    self._stats["coalesced"] += 1
+
+        if lead:
+            try:
+                values = fetch_many(list(lead))
+            except BaseException as e:
+                with self._lock:
+                    self._stats["errors"] += 1
+                    for key, pending in lead.items():
+                        pending.error = e
+                        self._inflight.pop(key, None)
+                for pending in lead.values():
+                    pending.done.set()
+                raise
+            with self._lock:
+                for (key, pending), value in zip(lead.items(), values):
+                    pending.value = found[key] = value
+                    self._store_locked(key, value)
+                    self._inflight.pop(key, None)
+            for pending in lead.values():
+                pending.done.set()
+
+        for key, pending in waits.items():
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            found[key] = pending.value
+        return [found[key] for key in keys]
+
+    async def aget_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Coroutine version of get_or_fetch; concurrent misses in one event loop share a fetch."""
+        with self._lock:
+            hit, value = self._lookup_locked(key)
+            if hit:
+                return value
+            task = self._ainflight.get(key)
+            if task is None:
+                # A task of its own, so a disconnecting first caller does not cancel everyone's fetch
+                task = self._ainflight[key] = asyncio.ensure_future(self._afill(key, fetch))
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    async def _afill(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch()
+        except BaseException:
+            with self._lock:
+                self._stats["errors"] += 1
+                self._ainflight.pop(key, None)
+            raise
+        with self._lock:
+            self._store_locked(key, value)
+            self._ainflight.pop(key, None)
+        return value
+
+    def _store_locked(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (self._expires_at(key, time.time()), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a value fetched out of band, e.g. by a batched prefetch."""
+        with self._lock:
+            self._store_locked(key, value)
+
+    def expires_in(self, key: Hashable) -> float:
+        """Seconds until `key`'s entry expires; for a key not cached, until a fetch now would expire."""
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+        expires = entry[0] if entry is not None and entry[0] > now else self._expires_at(key, now)
+        return max(0.0, expires - now)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_prefix(self, *prefix: Hashable) -> int:
+        """Drop every tuple key that starts with `prefix`; returns how many were dropped."""
+        n = len(prefix)
+        with self._lock:
+            stale = [k for k in self._data if isinstance(k, tuple) and k[:n] == prefix]
+            for k in stale:
+                del self._data[k]
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out.update({
+                "entries": len(self._data),
+                "max_entries": self.maxsize,
+                "in_flight": len(self._inflight) + len(self._ainflight),
+                "ttl_seconds": self.ttl,
+                "grid_degrees": self.grid,
+            })
+        lookups = out["hits"] + out["misses"] + out["coalesced"]
+        out["hit_rate"] = round((out["hits"] + out["coalesced"]) / lookups, 4) if lookups else 0.0
+        return out
+
+
+forecast_cache = ForecastCache()
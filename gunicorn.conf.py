@@ -0,0 +1,24 @@
+"""gunicorn settings: gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master (preload_app) in lazy mode, so no
+threads or sockets are created before fork. Each worker then warms up in
+post_fork, before it accepts its first request.
+"""
+import os
+
+os.environ.setdefault("LAZY_INIT", "1")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# Live streams each pin a thread; live_updates caps them below this count
+os.environ.setdefault("LIVE_WORKER_THREADS", str(threads))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+
+def post_fork(server, worker):
+    # Without preload_app this is also where the worker first imports the app
+    from app import warm_up
+
+    server.log.info("worker %s warmed up: %s", worker.pid, warm_up())
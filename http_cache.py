@@ -0,0 +1,206 @@
+import gzip
+import hashlib
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+from flask import request
+
+from forecast_cache import CACHE_TTL, forecast_cache
+
+try:  # optional: br is preferred over gzip when installed
+    import brotli
+except ImportError:
+    brotli = None
+
+# HTTP caching and compression settings
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))  # smaller bodies are sent as-is
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))  # gzip 1-9; brotli quality is derived from it
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "31536000"))  # for content-hashed static URLs
+HTTP_CACHE_DEFAULT = os.getenv("HTTP_CACHE_DEFAULT", "no-cache")  # GET 200s of endpoints without a policy
+
+COMPRESSIBLE_TYPES = {"application/json", "application/javascript", "application/x-ndjson", "image/svg+xml"}
+
+Policy = str | Callable[[Any], str]  # a callable gets the request
+
+
+def forecast_max_age(keys: List[Hashable]) -> str:
+    """Cache-Control sharing forecasts until the first of their cache entries expires.
+
+    Each key's expiry includes its per-cell offset, so a browser never revalidates
+    before the server has dropped the entry and gets the same stale body again.
+    """
+    if CACHE_TTL <= 0 or not keys:
+        return "no-cache"
+    return f"public, max-age={int(min(forecast_cache.expires_in(k) for k in keys))}"
+
+
+def _until_forecast_refresh(req) -> str:
+    try:
+        key = forecast_cache.key(float(req.args.get("lat")), float(req.args.get("lon")))
+    except (TypeError, ValueError):
+        return "no-cache"
+    return forecast_max_age([key])
+
+
+# Endpoint name -> Cache-Control for its GET 200 responses. A header set by the view itself wins;
+# weather_compare sets forecast_max_age for the places it resolved.
+CACHE_POLICIES: Dict[str, Policy] = {
+    "index": "no-cache",
+    # Browsers already revalidate the worker script; this keeps proxies from pinning an old one
+    "service_worker": "no-cache",
+    "weather": _until_forecast_refresh,
+    "geocode": "public, max-age=3600",
+    # A superseded answer is only right for the request that got it
+    "autocomplete": "no-store",
+    "stats_api": "no-store",
+    "readiness": "no-store",
+    "metrics_endpoint": "no-store",
+}
+
+# HTTP_CACHE_POLICIES="weather=public, max-age=300;geocode=no-store" overrides or adds entries
+for _item in filter(None, os.getenv("HTTP_CACHE_POLICIES", "").split(";")):
+    _endpoint, _, _value = _item.partition("=")
+    CACHE_POLICIES[_endpoint.strip()] = _value.strip()
+
+_lock = threading.Lock()
+_static_versions: Dict[str, Tuple[float, str]] = {}  # path -> (mtime, content hash)
+_static_encoded: Dict[Tuple[str, str, str], bytes] = {}  # (path, etag, encoding) -> body
+_stats = {"etags": 0, "not_modified": 0, "compressed": 0, "bytes_in": 0, "bytes_out": 0}
+
+
+def static_version(static_dir: str, filename: str) -> str | None:
+    """Short content hash of a static file, recomputed when its mtime changes."""
+    path = os.path.join(static_dir, filename)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    with _lock:
+        cached = _static_versions.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, "rb") as f:
+        digest = hashlib.blake2b(f.read(), digest_size=6).hexdigest()
+    with _lock:
+        _static_versions[path] = (mtime, digest)
+    return digest
+
+
+def _compressible(response) -> bool:
+    mimetype = response.mimetype or ""
+    return mimetype.startswith("text/") or mimetype in COMPRESSIBLE_TYPES
+
+
+def _pick_encoding(req) -> str | None:
+    accepted = req.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def _encode(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=min(11, COMPRESS_LEVEL + 1))
+    return gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+
+def cache_control_for(endpoint: str | None, req) -> str:
+    policy = CACHE_POLICIES.get(endpoint or "", HTTP_CACHE_DEFAULT)
+    return policy(req) if callable(policy) else policy
+
+
+def finish_response(response, req, endpoint: str | None, body: bytes | None, static_key: str | None = None) -> None:
+    """Cache-Control, weak ETag / 304 and compression for a GET 200 response.
+
+    `body` is the uncompressed body, or None to only set headers. Static
+    responses pass their file path as `static_key` so encoded copies are kept.
+    """
+    if "Cache-Control" not in response.headers:
+        response.headers["Cache-Control"] = cache_control_for(endpoint, req)
+    if body is None:
+        return
+
+    etag, _ = response.get_etag()
+    if etag is None and "no-store" not in response.headers["Cache-Control"]:
+        etag = hashlib.blake2b(body, digest_size=10).hexdigest()
+        with _lock:
+            _stats["etags"] += 1
+        if req.if_none_match.contains_weak(etag):
+            response.set_etag(etag, weak=True)
+            response.status_code = 304
+            response.set_data(b"")
+            response.headers.pop("Content-Length", None)
+            with _lock:
+                _stats["not_modified"] += 1
+            return
+    if etag is not None:
+        # Weak, so one validator covers every encoding of the same content
+        response.set_etag(etag, weak=True)
+
+    if len(body) < COMPRESS_MIN_BYTES or not _compressible(response) or "Content-Encoding" in response.headers:
+        return
+    response.vary.add("Accept-Encoding")
+    encoding = _pick_encoding(req)
+    if encoding is None:
+        return
+    key = (static_key, etag or "", encoding) if static_key else None
+    with _lock:
+        encoded = _static_encoded.get(key) if key else None
+    if encoded is None:
+        encoded = _encode(body, encoding)
+        if key:
+            with _lock:
+                _static_encoded[key] = encoded
+    if len(encoded) >= len(body):
+        return
+    response.set_data(encoded)
+    response.headers["Content-Encoding"] = encoding
+    with _lock:
+        _stats["compressed"] += 1
+        _stats["bytes_in"] += len(body)
+        _stats["bytes_out"] += len(encoded)
+
+
+def http_cache_stats() -> Dict[str, Any]:
+    with _lock:
+        out = dict(_stats)
+        out.update({"static_files": len(_static_versions), "static_encoded": len(_static_encoded),
+                    "brotli": brotli is not None, "min_bytes": COMPRESS_MIN_BYTES})
+    return out
+
+
+def init_app(app) -> None:
+    """Content-hashed static URLs plus per-endpoint caching and compression."""
+    @app.url_defaults
+    def _static_url_version(endpoint, values):
+        if endpoint == "static" and "filename" in values and "v" not in values:
+            version = static_version(app.static_folder, values["filename"])
+            if version:
+                values["v"] = version
+
+    @app.after_request
+    def _finish(response):
+        if request.method not in ("GET", "HEAD") or response.status_code != 200:
+            return response
+        endpoint = request.endpoint
+        if endpoint == "static":
+            filename = request.view_args.get("filename", "")
+            version = request.args.get("v")
+            # Only a URL carrying the current hash is immutable; a bare or stale one must revalidate
+            if version and version == static_version(app.static_folder, filename):
+                response.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE}, immutable"
+            else:
+                response.headers["Cache-Control"] = "no-cache"
+            if not _compressible(response):
+                return response
+            response.direct_passthrough = False
+            finish_response(response, request, endpoint, response.get_data(),
+                            static_key=os.path.join(app.static_folder, filename))
+            return response
+        # Streams (SSE, NDJSON exports) are sent as they are produced
+        body = None if response.is_streamed else response.get_data()
+        finish_response(response, request, endpoint, body)
+        return response
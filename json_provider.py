@@ -0,0 +1,48 @@
+import dataclasses
+import decimal
+import uuid
+from datetime import date
+from typing import Any
+
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:  # optional: several times faster than the stdlib encoder for large daily payloads
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(o: Any) -> Any:
+    # Same conversions as Flask's default provider, so responses look identical
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson; falls back to the default one without it."""
+
+    @property
+    def _options(self) -> int:
+        # Keys are sorted like the default provider's sort_keys
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        return options | orjson.OPT_SORT_KEYS if self.sort_keys else options
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=self._options).decode()
+
+    def response(self, *args: Any, **kwargs: Any):
+        if orjson is None or self._app.debug:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=self._options) + b"\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -0,0 +1,209 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Set, Tuple
+
+from forecast_cache import CACHE_TTL, expiry_offset
+
+# Live update settings (seconds)
+LIVE_REFRESH_SECONDS = float(os.getenv("LIVE_REFRESH_SECONDS", str(CACHE_TTL)))
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "25"))  # below common proxy idle timeouts
+# Under WSGI each open stream holds a worker thread, so those streams may only take the threads not reserved for
+# other requests. Streams served as coroutines (asgi.py) hold no thread and are not capped.
+LIVE_WORKER_THREADS = int(os.getenv("LIVE_WORKER_THREADS", "8"))  # request threads per process (gunicorn --threads)
+LIVE_RESERVED_THREADS = int(os.getenv("LIVE_RESERVED_THREADS", "4"))
+LIVE_MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", str(max(0, LIVE_WORKER_THREADS - LIVE_RESERVED_THREADS))))
+LIVE_ERROR_RETRY_SECONDS = float(os.getenv("LIVE_ERROR_RETRY_SECONDS", "30"))
+LIVE_QUEUE_SIZE = 4
+
+Event = Tuple[str, Any]  # ("weather", metric payload) or ("error", {"error": ...})
+
+
+class HubFull(RuntimeError):
+    pass
+
+
+class Subscription:
+    """One client's view of a cell: a small queue the cell's refresher pushes into."""
+
+    holds_thread = True  # counts against the hub's max_subscribers
+
+    def __init__(self, hub: "WeatherHub", key: Hashable):
+        self.hub = hub
+        self.key = key
+        self._queue: "queue.Queue[Event]" = queue.Queue(maxsize=LIVE_QUEUE_SIZE)
+
+    def push(self, event: Event) -> None:
+        # A slow reader only ever needs the newest state; drop the oldest instead of blocking the refresher
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: float) -> Event | None:
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        self.hub.unsubscribe(self)
+
+
+class AsyncSubscription(Subscription):
+    """A Subscription read by a coroutine; the refresher thread hands events to the reader's event loop."""
+
+    holds_thread = False
+
+    def __init__(self, hub: "WeatherHub", key: Hashable):
+        self.hub = hub
+        self.key = key
+        self._loop = asyncio.get_running_loop()
+        self._aqueue: "asyncio.Queue[Event]" = asyncio.Queue(maxsize=LIVE_QUEUE_SIZE)
+
+    def push(self, event: Event) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # the reader's loop has closed; its stream is gone
+
+    def _put(self, event: Event) -> None:
+        # Same policy as the thread queue: keep the newest events
+        while True:
+            try:
+                self._aqueue.put_nowait(event)
+                return
+            except asyncio.QueueFull:
+                self._aqueue.get_nowait()
+
+    async def aget(self, timeout: float) -> Event | None:
+        try:
+            return await asyncio.wait_for(self._aqueue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class _Cell:
+    def __init__(self):
+        self.subscribers: Set[Subscription] = set()
+        self.stop = threading.Event()
+        self.last: Event | None = None
+        self.last_data: Any = None
+        self.fetches = 0
+
+
+class WeatherHub:
+    """Fans one periodic upstream fetch per grid cell out to every subscriber of that cell.
+
+    A refresher thread starts with the first subscriber of a cell and stops
+    once the last one leaves. Refreshes are aligned to wall-clock multiples of
+    the interval plus a stable per-cell offset, matching the forecast cache's
+    expiry, and an event is only pushed when the fetched payload actually changed.
+    """
+
+    def __init__(self, fetch: Callable[[Hashable], Any], interval: float = LIVE_REFRESH_SECONDS,
+                 max_subscribers: int = LIVE_MAX_SUBSCRIBERS):
+        self.fetch = fetch
+        self.interval = max(1.0, interval)
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._cells: Dict[Hashable, _Cell] = {}
+        self._subscribers = 0
+        self._thread_subscribers = 0
+        self._stats = {"subscribes": 0, "rejected": 0, "fetches": 0, "fetch_errors": 0, "events_pushed": 0}
+
+    def subscribe(self, key: Hashable) -> Subscription:
+        """Subscribe a thread to the cell `key`; raises HubFull past max_subscribers."""
+        return self._attach(Subscription(self, key))
+
+    def asubscribe(self, key: Hashable) -> AsyncSubscription:
+        """Subscribe the running coroutine to the cell `key`. Holds no thread, so it is not capped."""
+        return self._attach(AsyncSubscription(self, key))
+
+    def _attach(self, sub: Subscription) -> Any:
+        key = sub.key
+        with self._lock:
+            if sub.holds_thread:
+                if self._thread_subscribers >= self.max_subscribers:
+                    self._stats["rejected"] += 1
+                    raise HubFull(f"Too many live subscribers (max {self.max_subscribers})")
+                self._thread_subscribers += 1
+            cell = self._cells.get(key)
+            start = cell is None
+            if start:
+                cell = self._cells[key] = _Cell()
+            cell.subscribers.add(sub)
+            self._subscribers += 1
+            self._stats["subscribes"] += 1
+            if cell.last is not None:
+                sub.push(cell.last)
+        if start:
+            threading.Thread(target=self._run, args=(key, cell), name=f"live-{key}", daemon=True).start()
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            cell = self._cells.get(sub.key)
+            if cell is None or sub not in cell.subscribers:
+                return
+            cell.subscribers.discard(sub)
+            self._subscribers -= 1
+            if sub.holds_thread:
+                self._thread_subscribers -= 1
+            if not cell.subscribers:
+                cell.stop.set()
+                del self._cells[sub.key]
+
+    def _next_delay(self, key: Hashable) -> float:
+        # Wake just after the cell's next expiry (boundary plus its stable offset), so cells do not refresh together
+        offset = expiry_offset(key, self.interval)
+        return self.interval - ((time.time() - offset) % self.interval) + 1.0
+
+    def _run(self, key: Hashable, cell: _Cell) -> None:
+        while not cell.stop.is_set():
+            try:
+                data = self.fetch(key)
+                event: Event | None = None if data is cell.last_data else ("weather", data)
+                cell.last_data = data
+            except Exception as e:
+                event = ("error", {"error": f"Open-Meteo request failed: {e}"})
+                cell.last_data = None  # push the next good payload even if it is the one clients already had
+                with self._lock:
+                    self._stats["fetch_errors"] += 1
+            with self._lock:
+                cell.fetches += 1
+                self._stats["fetches"] += 1
+                if event is not None:
+                    if event[0] == "weather":
+                        cell.last = event
+                    for sub in cell.subscribers:
+                        sub.push(event)
+                    self._stats["events_pushed"] += len(cell.subscribers)
+            delay = self._next_delay(key)
+            if event is not None and event[0] == "error":
+                delay = min(delay, LIVE_ERROR_RETRY_SECONDS)
+            cell.stop.wait(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out.update({
+                "cells": len(self._cells),
+                "subscribers": self._subscribers,
+                "thread_subscribers": self._thread_subscribers,
+                "max_subscribers": self.max_subscribers,
+                "refresh_seconds": self.interval,
+            })
+        return out
+
+
+# Formats one Server-Sent Events frame
+def sse_frame(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
@@ -0,0 +1,229 @@
+import cProfile
+import functools
+import inspect
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from flask import Response, g, request
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # fraction of requests run under cProfile
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "500"))  # only sampled requests slower than this are dumped
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/weatherapp-profiles")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(pairs: Iterable[Tuple[str, Any]]) -> str:
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + inner + "}" if inner else ""
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # labels -> bucket counts + [sum, count]
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for key, series in sorted(items):
+            base = list(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_fmt_labels(base + [('le', _fmt_value(bound))])} {_fmt_value(count)}")
+            lines.append(f"{self.name}_sum{_fmt_labels(base)} {_fmt_value(series[-2])}")
+            lines.append(f"{self.name}_count{_fmt_labels(base)} {_fmt_value(series[-1])}")
+        return lines
+
+
+class Registry:
+    """Histograms plus gauge collectors that flatten the numeric fields of stats dicts."""
+
+    def __init__(self):
+        self.histograms: List[Histogram] = []
+        self.collectors: List[Tuple[str, str, Callable[[], Dict[str, Any]]]] = []
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        h = Histogram(name, help_text, labelnames, buckets)
+        self.histograms.append(h)
+        return h
+
+    def add_collector(self, name: str, help_text: str, fn: Callable[[], Dict[str, Any]]) -> None:
+        self.collectors.append((name, help_text, fn))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for h in self.histograms:
+            lines.extend(h.render())
+        for name, help_text, fn in self.collectors:
+            try:
+                stats = fn()
+            except Exception:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(_gauge_lines(name, stats, []))
+        return "\n".join(lines) + "\n"
+
+
+def _gauge_lines(name: str, stats: Dict[str, Any], labels: List[Tuple[str, Any]]) -> List[str]:
+    out = []
+    for key, value in sorted(stats.items()):
+        if isinstance(value, dict):
+            # Nested dicts (e.g. per-host stats) become an extra label
+            out.extend(_gauge_lines(name, value, labels + [("key", key)]))
+        elif isinstance(value, bool):
+            out.append(f"{name}{_fmt_labels(labels + [('stat', key)])} {int(value)}")
+        elif isinstance(value, (int, float)):
+            out.append(f"{name}{_fmt_labels(labels + [('stat', key)])} {_fmt_value(value)}")
+    return out
+
+
+REGISTRY = Registry()
+
+http_duration = REGISTRY.histogram(
+    "weatherapp_http_request_duration_seconds", "Flask request handling time",
+    ("route", "method", "status"))
+http_size = REGISTRY.histogram(
+    "weatherapp_http_response_size_bytes", "Response body size (non-streaming responses)",
+    ("route", "method", "status"), SIZE_BUCKETS)
+upstream_duration = REGISTRY.histogram(
+    "weatherapp_upstream_request_duration_seconds", "Time per outbound HTTP attempt",
+    ("host", "status"))
+upstream_size = REGISTRY.histogram(
+    "weatherapp_upstream_response_size_bytes", "Outbound response body size",
+    ("host",), SIZE_BUCKETS)
+db_query_duration = REGISTRY.histogram(
+    "weatherapp_db_query_duration_seconds", "Time per crud.py query including connection checkout",
+    ("query", "status"))
+db_acquire_duration = REGISTRY.histogram(
+    "weatherapp_db_connection_acquire_seconds", "Time to check a connection out of the pool (incl. connects)")
+
+
+def timed_query(fn: Callable) -> Callable:
+    """Record a crud.py function's duration under its name; generators are timed until exhausted."""
+    name = fn.__name__
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            status = "error"
+            try:
+                result = await fn(*args, **kwargs)
+                status = "ok"
+                return result
+            finally:
+                db_query_duration.observe(time.perf_counter() - t0, query=name, status=status)
+        return async_wrapper
+
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def gen_wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            status = "error"
+            try:
+                yield from fn(*args, **kwargs)
+                status = "ok"
+            finally:
+                db_query_duration.observe(time.perf_counter() - t0, query=name, status=status)
+        return gen_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        status = "error"
+        try:
+            result = fn(*args, **kwargs)
+            status = "ok"
+            return result
+        finally:
+            db_query_duration.observe(time.perf_counter() - t0, query=name, status=status)
+    return wrapper
+
+
+def _route_label() -> str:
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def init_app(app) -> None:
+    """Install per-request timing, sampled profiling and the /metrics endpoint."""
+    @app.before_request
+    def _start_timer():
+        g._metrics_t0 = time.perf_counter()
+        g._profiler = None
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            g._profiler = cProfile.Profile()
+            g._profiler.enable()
+
+    @app.after_request
+    def _record(response):
+        t0 = g.pop("_metrics_t0", None)
+        if t0 is None:
+            return response
+        elapsed = time.perf_counter() - t0
+        route = _route_label()
+        labels = {"route": route, "method": request.method, "status": response.status_code}
+        http_duration.observe(elapsed, **labels)
+        if not response.is_streamed and response.content_length is not None:
+            http_size.observe(response.content_length, **labels)
+
+        profiler = g.pop("_profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            if elapsed * 1000 >= PROFILE_SLOW_MS:
+                _dump_profile(profiler, route, request.method, elapsed)
+        return response
+
+    @app.teardown_request
+    def _stop_profiler(exc):
+        # after_request is skipped when a request dies mid-flight; never leave a profiler running
+        profiler = g.pop("_profiler", None)
+        if profiler is not None:
+            profiler.disable()
+
+    @app.get("/metrics")
+    def metrics_endpoint():
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+def _dump_profile(profiler: cProfile.Profile, route: str, method: str, elapsed: float) -> None:
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        path = os.path.join(PROFILE_DIR, f"{int(time.time() * 1000)}_{method}_{slug}_{int(elapsed * 1000)}ms.prof")
+        profiler.dump_stats(path)
+    except OSError:
+        pass
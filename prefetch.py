@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+import psycopg2
+
+from crud import prefetch_candidates_db, touch_locations_db
+from db_raw import DB_URL
+from forecast_cache import CACHE_TTL
+
+# Prefetch settings (seconds unless noted)
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") == "1"
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", str(CACHE_TTL)))  # one full pass over the ranked locations
+PREFETCH_MAX_LOCATIONS = int(os.getenv("PREFETCH_MAX_LOCATIONS", "200"))
+PREFETCH_WARM_LOCATIONS = int(os.getenv("PREFETCH_WARM_LOCATIONS", "50"))  # per process at startup
+PREFETCH_CHUNK = int(os.getenv("PREFETCH_CHUNK", "25"))  # coordinates per upstream call
+PREFETCH_SPREAD = float(os.getenv("PREFETCH_SPREAD", "0.8"))  # fraction of the interval chunks are spread over
+PREFETCH_TICK = float(os.getenv("PREFETCH_TICK", "30"))
+PREFETCH_FORECAST_DAYS = 16  # Open-Meteo forecast horizon
+PREFETCH_LOCK_KEY = 720514  # pg advisory lock id shared by all workers
+
+Chunk = List[Dict[str, Any]]
+
+
+class PrefetchScheduler:
+    """Keeps popular saved locations warm in the background.
+
+    Every process warms its own forecast cache for the top locations once at
+    startup and batches "this location was served" notes into
+    locations.last_accessed_at. Only the process holding a PostgreSQL advisory
+    lock runs the periodic pass: it ranks locations by request count and
+    recency, splits them into chunks of PREFETCH_CHUNK coordinates and spreads
+    one chunk at a time over the interval so the upstream sees a steady trickle
+    instead of a burst.
+    """
+
+    def __init__(self, warm: Callable[[Chunk], None], refresh: Callable[[Chunk], None],
+                 final_after_days: int = 2):
+        self.warm = warm
+        self.refresh = refresh
+        self.final_after_days = final_after_days
+        self.pid: int | None = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._accessed: Set[int] = set()
+        self._leader_conn = None
+        self._pending: List[Chunk] = []
+        self._next_pass = 0.0
+        self._next_chunk = 0.0
+        self._gap = 0.0
+        self._stats = {"leader": False, "passes": 0, "chunks": 0, "locations": 0, "errors": 0,
+                       "warmed": 0, "accesses_flushed": 0}
+
+    def ensure_started(self) -> None:
+        # Threads do not survive fork, so a pre-fork instance restarts in each worker
+        if not PREFETCH_ENABLED or not DB_URL or self.pid == os.getpid():
+            return
+        with self._lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self._leader_conn = None
+            self._pending = []
+            self._stop = threading.Event()
+        threading.Thread(target=self._run, name="prefetch", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def note_access(self, location_id: int) -> None:
+        with self._lock:
+            self._accessed.add(location_id)
+
+    def _window(self) -> Tuple[date, date]:
+        today = date.today()
+        return today - timedelta(days=self.final_after_days), today + timedelta(days=PREFETCH_FORECAST_DAYS - 1)
+
+    def _run(self) -> None:
+        self._warm_startup()
+        while not self._stop.is_set():
+            self._flush_accesses()
+            if self._is_leader():
+                self._step()
+            delay = PREFETCH_TICK
+            if self._pending:
+                delay = min(delay, max(0.5, self._next_chunk - time.time()))
+            self._stop.wait(delay)
+        self._release_leader()
+
+    def _warm_startup(self) -> None:
+        try:
+            locs = prefetch_candidates_db(PREFETCH_WARM_LOCATIONS, *self._window())
+            for i in range(0, len(locs), PREFETCH_CHUNK):
+                self.warm(locs[i:i + PREFETCH_CHUNK])
+            with self._lock:
+                self._stats["warmed"] += len(locs)
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+
+    def _flush_accesses(self) -> None:
+        with self._lock:
+            ids, self._accessed = self._accessed, set()
+        if not ids:
+            return
+        try:
+            touch_locations_db(sorted(ids))
+            with self._lock:
+                self._stats["accesses_flushed"] += len(ids)
+        except Exception:
+            with self._lock:
+                self._accessed |= ids
+                self._stats["errors"] += 1
+
+    def _is_leader(self) -> bool:
+        # Session-level lock on a dedicated connection: released by PostgreSQL if this process dies
+        conn = self._leader_conn
+        if conn is not None and not conn.closed:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                return True
+            except psycopg2.Error:
+                self._release_leader()
+        try:
+            conn = psycopg2.connect(DB_URL)
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(%s)", (PREFETCH_LOCK_KEY,))
+                acquired = cur.fetchone()[0]
+        except psycopg2.Error:
+            with self._lock:
+                self._stats["errors"] += 1
+            return False
+        if not acquired:
+            conn.close()
+            return False
+        self._leader_conn = conn
+        with self._lock:
+            self._stats["leader"] = True
+        return True
+
+    def _release_leader(self) -> None:
+        conn, self._leader_conn = self._leader_conn, None
+        with self._lock:
+            self._stats["leader"] = False
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _step(self) -> None:
+        now = time.time()
+        if not self._pending and now >= self._next_pass:
+            try:
+                locs = prefetch_candidates_db(PREFETCH_MAX_LOCATIONS, *self._window())
+            except Exception:
+                with self._lock:
+                    self._stats["errors"] += 1
+                return
+            # Neighbouring date windows share a call, as in the batch endpoint
+            locs.sort(key=lambda r: (r["start_date"], r["end_date"]))
+            self._pending = [locs[i:i + PREFETCH_CHUNK] for i in range(0, len(locs), PREFETCH_CHUNK)]
+            self._next_pass = now + PREFETCH_INTERVAL
+            self._gap = PREFETCH_INTERVAL * PREFETCH_SPREAD / max(1, len(self._pending))
+            self._next_chunk = now
+            with self._lock:
+                self._stats["passes"] += 1
+        if not self._pending or now < self._next_chunk:
+            return
+        chunk = self._pending.pop(0)
+        self._next_chunk = now + self._gap
+        try:
+            self.refresh(chunk)
+            with self._lock:
+                self._stats["chunks"] += 1
+                self._stats["locations"] += len(chunk)
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out.update({
+                "enabled": PREFETCH_ENABLED and bool(DB_URL),
+                "pending_chunks": len(self._pending),
+                "pending_accesses": len(self._accessed),
+                "interval_seconds": PREFETCH_INTERVAL,
+            })
+        return out
@@ -0,0 +1,162 @@
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Sequence
+
+from forecast_cache import ForecastCache
+from units import c_to_f, kmh_to_mph
+
+# Range statistics settings
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "900"))  # bounds staleness of days that may still change
+STATS_CACHE_MAX_ENTRIES = int(os.getenv("STATS_CACHE_MAX_ENTRIES", "2048"))
+WET_DAY_POP = float(os.getenv("STATS_WET_DAY_POP", "50"))  # precipitation probability (%) that makes a wet day
+
+# Keys are (location_id, start, end, unit) for one request's range, read fresh from its row, and
+# (location_id, None, None, unit, *crud.location_stats_version) for a location's summary
+stats_cache = ForecastCache(STATS_CACHE_MAX_ENTRIES, STATS_CACHE_TTL, grid=0)
+
+
+def invalidate_location(location_id: int) -> None:
+    stats_cache.invalidate_prefix(location_id)
+
+
+# optional: vectorized summaries; the pure-Python path gives the same numbers
+@lru_cache(maxsize=None)
+def _numpy():
+    """numpy if installed, imported on the first summary rather than with the app."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _round(value: Any) -> Any:
+    return None if value is None else round(float(value), 1)
+
+
+# ---- per-column reductions; each returns None when the column has no values ----
+
+def _values(column: Sequence[Any]):
+    np = _numpy()
+    if np is not None:
+        return np.array([np.nan if v is None else v for v in column], dtype=float)
+    return list(column)
+
+
+def _mean(values) -> float | None:
+    np = _numpy()
+    if np is not None:
+        present = values[~np.isnan(values)]
+        return float(present.mean()) if present.size else None
+    present = [v for v in values if v is not None]
+    return sum(present) / len(present) if present else None
+
+
+def _arg_extreme(values, largest: bool) -> int | None:
+    """Index of the first max (or min) value."""
+    np = _numpy()
+    if np is not None:
+        if np.isnan(values).all():
+            return None
+        return int(np.nanargmax(values) if largest else np.nanargmin(values))
+    best = None
+    for i, v in enumerate(values):
+        if v is not None and (best is None or (v > values[best] if largest else v < values[best])):
+            best = i
+    return best
+
+
+def _count_at_least(values, threshold: float) -> int:
+    np = _numpy()
+    if np is not None:
+        return int(np.count_nonzero(values >= threshold))
+    return sum(1 for v in values if v is not None and v >= threshold)
+
+
+def _mode(values) -> int | None:
+    """Most frequent value; ties go to the smallest, as PostgreSQL's mode() does."""
+    np = _numpy()
+    if np is not None:
+        present = values[~np.isnan(values)]
+        if not present.size:
+            return None
+        codes, counts = np.unique(present, return_counts=True)
+        return int(codes[int(np.argmax(counts))])
+    counts: Dict[int, int] = {}
+    for v in values:
+        if v is not None:
+            counts[v] = counts.get(v, 0) + 1
+    if not counts:
+        return None
+    return min(counts, key=lambda c: (-counts[c], c))
+
+
+def summarize(cols: Dict[str, List[Any]], describe) -> Dict[str, Any]:
+    """Statistics over a range's columnar daily data (the /weather "columnar" shape, already in its unit).
+
+    `describe(code)` turns a WMO code into its text.
+    """
+    dates = cols.get("date") or []
+    t_max, t_min = _values(cols.get("t_max") or []), _values(cols.get("t_min") or [])
+    pop, wind = _values(cols.get("pop") or []), _values(cols.get("wind_max") or [])
+    gust, codes = cols.get("gust_max") or [], _values(cols.get("code") or [])
+
+    hottest = _arg_extreme(t_max, largest=True)
+    coldest = _arg_extreme(t_min, largest=False)
+    windiest = _arg_extreme(wind, largest=True)
+    dominant = _mode(codes)
+    return {
+        "days": len(dates),
+        "days_with_data": len(dates) - sum(1 for v in cols.get("t_max") or [] if v is None),
+        "t_max_mean": _round(_mean(t_max)),
+        "t_max": _round(cols["t_max"][hottest]) if hottest is not None else None,
+        "t_max_date": dates[hottest] if hottest is not None else None,
+        "t_min_mean": _round(_mean(t_min)),
+        "t_min": _round(cols["t_min"][coldest]) if coldest is not None else None,
+        "t_min_date": dates[coldest] if coldest is not None else None,
+        "pop_mean": _round(_mean(pop)),
+        "wet_days": _count_at_least(pop, WET_DAY_POP),
+        "windiest_date": dates[windiest] if windiest is not None else None,
+        "wind_max": _round(cols["wind_max"][windiest]) if windiest is not None else None,
+        "gust_max": _round(gust[windiest]) if windiest is not None and windiest < len(gust) else None,
+        "dominant_code": dominant,
+        "dominant_text": describe(dominant) if dominant is not None else None,
+        "wet_day_pop": WET_DAY_POP,
+    }
+
+
+def summary_from_row(row: Dict[str, Any], unit: str, describe) -> Dict[str, Any]:
+    """Shape a metric SQL aggregate row (crud.range_stats_db columns) like summarize()."""
+    temp = c_to_f if unit == "fahrenheit" else (lambda v: v)
+    wind = kmh_to_mph if unit == "fahrenheit" else (lambda v: v)
+
+    def conv(fn, value):
+        return None if value is None else _round(fn(float(value)))
+
+    def day(value):
+        return value.isoformat() if value is not None else None
+
+    dominant = row.get("dominant_code")
+    return {
+        "days": row["days"],
+        "days_with_data": row["days_with_data"],
+        "t_max_mean": conv(temp, row["t_max_mean"]),
+        "t_max": conv(temp, row["t_max"]),
+        "t_max_date": day(row["t_max_date"]),
+        "t_min_mean": conv(temp, row["t_min_mean"]),
+        "t_min": conv(temp, row["t_min"]),
+        "t_min_date": day(row["t_min_date"]),
+        "pop_mean": _round(row["pop_mean"]),
+        "wet_days": row["wet_days"],
+        "windiest_date": day(row["windiest_date"]),
+        "wind_max": conv(wind, row["wind_max"]),
+        "gust_max": conv(wind, row["gust_max"]),
+        "dominant_code": dominant,
+        "dominant_text": describe(dominant) if dominant is not None else None,
+        "wet_day_pop": WET_DAY_POP,
+    }
+
+
+def preload() -> None:
+    """Import numpy now (e.g. while a worker warms up) instead of on the first summary."""
+    _numpy()
@@ -0,0 +1,197 @@
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+# Spatial index settings
+LOCATION_SNAP_METERS = float(os.getenv("LOCATION_SNAP_METERS", "100"))  # coordinates this close reuse a location
+LOCATION_INDEX_REFRESH = float(os.getenv("LOCATION_INDEX_REFRESH", "300"))  # seconds; picks up other workers' rows
+LOCATION_INDEX_REBUILD_AFTER = 256  # points added since the last build before the tree is rebuilt
+
+EARTH_RADIUS_M = 6371008.8
+
+Point = Tuple[float, float, float]
+
+
+def _xyz(lat: float, lon: float) -> Point:
+    la, lo = math.radians(lat), math.radians(lon)
+    return (math.cos(la) * math.cos(lo), math.cos(la) * math.sin(lo), math.sin(la))
+
+
+def _chord2(a: Point, b: Point) -> float:
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+def _chord2_for(meters: float) -> float:
+    return (2 * math.sin(min(meters / EARTH_RADIUS_M, math.pi) / 2)) ** 2
+
+
+def _meters_for(chord2: float) -> float:
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(chord2) / 2))
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    return _meters_for(_chord2(_xyz(lat1, lon1), _xyz(lat2, lon2)))
+
+
+class KDTree:
+    """Static 3-d tree over points on the unit sphere.
+
+    Straight-line (chord) distance between unit vectors grows monotonically
+    with great-circle distance, so radius queries need no special handling
+    at the poles or the antimeridian.
+    """
+
+    def __init__(self, items: List[Tuple[float, float, Any]]):
+        self.points: List[Point] = [_xyz(lat, lon) for lat, lon, _ in items]
+        self.payloads = [p for _, _, p in items]
+        self.root = self._build(list(range(len(items))), 0)
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _build(self, idx: List[int], depth: int):
+        if not idx:
+            return None
+        axis = depth % 3
+        idx.sort(key=lambda i: self.points[i][axis])
+        mid = len(idx) // 2
+        # Node: (point index, split axis, left subtree, right subtree)
+        return (idx[mid], axis, self._build(idx[:mid], depth + 1), self._build(idx[mid + 1:], depth + 1))
+
+    def within(self, lat: float, lon: float, radius_m: float) -> List[Tuple[float, Any]]:
+        """(chord², payload) for every point within radius_m, unordered."""
+        q = _xyz(lat, lon)
+        r2 = _chord2_for(radius_m)
+        out = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            i, axis, left, right = node
+            p = self.points[i]
+            d2 = _chord2(p, q)
+            if d2 <= r2:
+                out.append((d2, self.payloads[i]))
+            diff = q[axis] - p[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            stack.append(near)
+            if diff * diff <= r2:
+                stack.append(far)
+        return out
+
+
+class LocationIndex:
+    """In-memory mirror of the locations table for nearest/nearby lookups.
+
+    The tree is rebuilt from the database every LOCATION_INDEX_REFRESH seconds
+    and after LOCATION_INDEX_REBUILD_AFTER local inserts; points added in
+    between are scanned linearly. The table stays authoritative: a miss here
+    is not proof that nothing nearby exists.
+    """
+
+    def __init__(self, loader: Callable[[], List[Dict[str, Any]]], refresh: float = LOCATION_INDEX_REFRESH):
+        self.loader = loader
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._tree = KDTree([])
+        self._extra: List[Tuple[Point, Dict[str, Any]]] = []
+        self._loaded_at = 0.0
+        self._stats = {"loads": 0, "load_errors": 0, "queries": 0, "snaps": 0, "added": 0}
+
+    def _ensure_fresh(self) -> None:
+        if time.time() - self._loaded_at < self.refresh:
+            return
+        # One thread reloads; the others keep answering from the current tree
+        if not self._load_lock.acquire(blocking=self._loaded_at == 0):
+            return
+        try:
+            if time.time() - self._loaded_at < self.refresh:
+                return
+            self.reload()
+        finally:
+            self._load_lock.release()
+
+    def reload(self) -> None:
+        try:
+            rows = self.loader()
+        except Exception:
+            with self._lock:
+                self._stats["load_errors"] += 1
+                self._loaded_at = time.time()  # back off until the next refresh instead of retrying per request
+            return
+        tree = KDTree([(float(r["lat"]), float(r["lon"]), _location(r)) for r in rows])
+        with self._lock:
+            self._tree, self._extra = tree, []
+            self._loaded_at = time.time()
+            self._stats["loads"] += 1
+
+    def add(self, loc: Dict[str, Any]) -> None:
+        loc = _location(loc)
+        with self._lock:
+            self._extra.append((_xyz(loc["lat"], loc["lon"]), loc))
+            self._stats["added"] += 1
+            if len(self._extra) < LOCATION_INDEX_REBUILD_AFTER:
+                return
+        # Fold the scanned points into a new tree outside the lock; skip if a reload or rebuild is running
+        if not self._load_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                base, folded = self._tree, list(self._extra)
+            items = [(p["lat"], p["lon"], p) for p in base.payloads] + [(p["lat"], p["lon"], p) for _, p in folded]
+            tree = KDTree(items)
+            with self._lock:
+                if self._tree is base:
+                    self._tree = tree
+                    self._extra = self._extra[len(folded):]
+        finally:
+            self._load_lock.release()
+
+    def nearby(self, lat: float, lon: float, radius_m: float, limit: int = 10) -> List[Dict[str, Any]]:
+        self._ensure_fresh()
+        with self._lock:
+            tree, extra = self._tree, list(self._extra)
+            self._stats["queries"] += 1
+        found = tree.within(lat, lon, radius_m)
+        q, r2 = _xyz(lat, lon), _chord2_for(radius_m)
+        for p, loc in extra:
+            d2 = _chord2(p, q)
+            if d2 <= r2:
+                found.append((d2, loc))
+        found.sort(key=lambda t: t[0])
+        seen = set()
+        out = []
+        for d2, loc in found:
+            if loc["id"] in seen:
+                continue
+            seen.add(loc["id"])
+            out.append(dict(loc, distance_m=round(_meters_for(d2), 1)))
+            if len(out) >= limit:
+                break
+        return out
+
+    def nearest(self, lat: float, lon: float, radius_m: float = LOCATION_SNAP_METERS) -> Dict[str, Any] | None:
+        hits = self.nearby(lat, lon, radius_m, 1)
+        if hits:
+            with self._lock:
+                self._stats["snaps"] += 1
+        return hits[0] if hits else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out.update({
+                "points": len(self._tree) + len(self._extra),
+                "unindexed": len(self._extra),
+                "age_seconds": round(time.time() - self._loaded_at, 1) if self._loaded_at else None,
+                "snap_meters": LOCATION_SNAP_METERS,
+            })
+        return out
+
+
+def _location(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": row["id"], "label": row["label"], "lat": float(row["lat"]), "lon": float(row["lon"])}
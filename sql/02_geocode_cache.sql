@@ -0,0 +1,15 @@
+-- Resolved geocodes and autocomplete result sets, keyed by normalized query text.
+-- `complete` marks autocomplete sets shorter than the page size, which are exhaustive
+-- for their prefix and can answer any longer query by filtering.
+create table if not exists public.geocode_cache (
+  kind text not null,
+  query_norm text not null,
+  results jsonb not null,
+  complete boolean not null default false,
+  fetched_at timestamptz not null default now(),
+  primary key (kind, query_norm)
+);
+
+-- Prefix scans over cached queries (LIKE 'abc%') regardless of the database collation
+create index if not exists ix_geocode_cache_query_prefix
+  on public.geocode_cache(kind, query_norm text_pattern_ops);
@@ -0,0 +1,15 @@
+-- Materialized daily weather per saved location, always stored in metric units.
+-- Rows marked final are past days whose values no longer change upstream.
+create table if not exists public.daily_weather (
+  location_id bigint not null references public.locations(id) on delete cascade,
+  day date not null,
+  weather_code integer,
+  temperature_2m_max double precision,
+  temperature_2m_min double precision,
+  precipitation_probability_max double precision,
+  wind_speed_10m_max double precision,
+  wind_gusts_10m_max double precision,
+  final boolean not null default false,
+  fetched_at timestamptz not null default now(),
+  primary key (location_id, day)
+);
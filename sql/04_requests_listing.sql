@@ -0,0 +1,6 @@
+-- Keyset pagination for GET /api/requests: ORDER BY created_at DESC, id DESC
+create index if not exists ix_weather_requests_created_id
+  on public.weather_requests(created_at desc, id desc);
+
+create index if not exists ix_weather_requests_location_created
+  on public.weather_requests(location_id, created_at desc, id desc);
@@ -0,0 +1,2 @@
+-- Last time a saved location's weather was served, used to rank background prefetches
+alter table public.locations add column if not exists last_accessed_at timestamptz;
@@ -0,0 +1,7 @@
+-- 0.01-degree grid cell per location (~1.1 km of latitude) for radius lookups without PostGIS.
+-- Nearby points are found by scanning the few cells around the query point.
+alter table public.locations
+  add column if not exists grid_lat integer generated always as (floor(lat * 100)::integer) stored,
+  add column if not exists grid_lon integer generated always as (floor(lon * 100)::integer) stored;
+
+create index if not exists ix_locations_grid on public.locations(grid_lat, grid_lon);
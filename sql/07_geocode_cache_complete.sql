@@ -0,0 +1,7 @@
+-- Autocomplete sets were marked complete when fewer than 10 suggestions survived filtering,
+-- even if Geocodify had more. Completeness is now judged on the raw feature count of a
+-- request that asks for exactly that many, so earlier flags cannot be trusted.
+update public.geocode_cache set complete = false where kind = 'autocomplete' and complete;
+
+-- Lookups are plain reads now; the per-row hit counter was never read back
+alter table public.geocode_cache drop column if exists hit_count;
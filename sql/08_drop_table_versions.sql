@@ -0,0 +1,6 @@
+-- The request list's ETag is now derived from the listed rows themselves (see 09), so
+-- writers no longer serialize on one shared version row. Removes what 04 used to create.
+drop trigger if exists trg_weather_requests_version on public.weather_requests;
+drop trigger if exists trg_locations_version on public.locations;
+drop function if exists public.bump_table_version();
+drop table if exists public.table_versions;
@@ -0,0 +1,8 @@
+-- Change times behind GET /api/requests' ETag and Last-Modified. A location's updated_at moves when it is
+-- relabeled or one of its requests is deleted, never on the prefetcher's last_accessed_at writes.
+alter table public.weather_requests add column if not exists updated_at timestamptz not null default now();
+alter table public.locations add column if not exists updated_at timestamptz not null default now();
+
+create index if not exists ix_weather_requests_updated on public.weather_requests(updated_at);
+create index if not exists ix_weather_requests_location_updated on public.weather_requests(location_id, updated_at);
+create index if not exists ix_locations_updated on public.locations(updated_at);
@@ -20,6 +20,35 @@ function authHeaders(extra={}) {
   return extra;
 }
 
+// Small IndexedDB key-value store for offline data; every call resolves to undefined without IndexedDB
+const IDB_STORES = ["forecasts", "saved", "ranges"];
+let idbPromise = null;
+function idb() {
+  if (!idbPromise) {
+    idbPromise = new Promise((resolve) => {
+      if (!window.indexedDB) return resolve(null);
+      const req = indexedDB.open("weatherapp", 1);
+      req.onupgradeneeded = () => IDB_STORES.forEach(name => req.result.createObjectStore(name));
+      req.onsuccess = () => resolve(req.result);
+      req.onerror = () => resolve(null);
+    });
+  }
+  return idbPromise;
+}
+async function idbOp(store, mode, fn) {
+  const db = await idb();
+  if (!db) return undefined;
+  return new Promise((resolve) => {
+    const tx = db.transaction(store, mode);
+    const req = fn(tx.objectStore(store));
+    tx.oncomplete = () => resolve(req.result);
+    tx.onerror = tx.onabort = () => resolve(undefined);
+  });
+}
+const idbGet = (store, key) => idbOp(store, "readonly", s => s.get(key));
+const idbPut = (store, key, value) => idbOp(store, "readwrite", s => s.put(value, key));
+const idbDelete = (store, key) => idbOp(store, "readwrite", s => s.delete(key));
+
 let UNIT = "fahrenheit"; // default
 
 // Temperature Unit toggle functionality
@@ -50,7 +79,10 @@ btnC.addEventListener("click", () => {
 });
 
 // Autocomplete functionality
-let acTimer; let lastAC = "";
+// One id per tab lets the server drop this tab's superseded queries
+const CLIENT_ID = sessionStorage.getItem("clientId") || Math.random().toString(36).slice(2);
+sessionStorage.setItem("clientId", CLIENT_ID);
+let acTimer; let lastAC = ""; let acAbort = null;
 queryEl.addEventListener("input", () => {
   const q = queryEl.value.trim();
   clearTimeout(acTimer);
@@ -59,8 +91,12 @@ queryEl.addEventListener("input", () => {
     try {
       if (q === lastAC) return;
       lastAC = q;
-      const res = await fetch(`/api/autocomplete?q=${encodeURIComponent(q)}`);
+      if (acAbort) acAbort.abort();
+      acAbort = new AbortController();
+      const res = await fetch(`/api/autocomplete?q=${encodeURIComponent(q)}`,
+        { headers: authHeaders({ "X-Client-Id": CLIENT_ID }), signal: acAbort.signal });
       const data = await res.json();
+      if (data.superseded || q !== queryEl.value.trim()) return;
       if (data.error) {
         suggEl.innerHTML = `<li>${escapeHtml(data.error)}</li>`;
         suggEl.classList.add("show");
@@ -78,6 +114,7 @@ queryEl.addEventListener("input", () => {
         suggEl.innerHTML = "";
       }
     } catch (e) {
+      if (e.name === "AbortError") return;
       suggEl.innerHTML = `<li>Autocomplete error. Try again.</li>`;
       suggEl.classList.add("show");
     }
@@ -129,21 +166,80 @@ useLocBtn.addEventListener("click", () => {
   }, { enableHighAccuracy: true, timeout: 10000, maximumAge: 30000 });
 });
 
-// function for getting weather data
+// Forecasts are cached per 0.01° cell and unit, the same grid the server caches on
+function forecastKey(lat, lon) {
+  return `${UNIT}:${Number(lat).toFixed(2)},${Number(lon).toFixed(2)}`;
+}
+
+// Bumped by every search and saved-range view; older responses must not overwrite the card
+let viewSeq = 0;
+
+// function for getting weather data: the last stored forecast renders at once, then the network refreshes it
 async function fetchWeather(lat, lon) {
-  currentEl.innerHTML = `<div class="loading">Loading weather…</div>`;
+  const seq = ++viewSeq;
+  const key = forecastKey(lat, lon);
+  const cached = await idbGet("forecasts", key);
+  if (seq !== viewSeq) return;
+  if (cached) showWeather(lat, lon, cached);
+  else currentEl.innerHTML = `<div class="loading">Loading weather…</div>`;
   try {
     const res = await fetch(`/api/weather?lat=${lat}&lon=${lon}&unit=${UNIT}`);
     const data = await res.json();
-    if (data.error) { showError(data.error); return; }
-    currentEl.dataset.coords = JSON.stringify({ lat, lon });
-    renderCurrent(data.current, data.unit);
-    renderForecast(data.daily, data.unit);
+    if (seq !== viewSeq) return;
+    if (data.error) { if (!cached) showError(data.error); return; }
+    showWeather(lat, lon, data);
+    idbPut("forecasts", key, data);
+    subscribeLive(lat, lon);
   } catch (e) {
-    showError("Failed to load weather.");
+    if (seq === viewSeq && !cached) showError("Failed to load weather.");
   }
 }
 
+function showWeather(lat, lon, data) {
+  currentEl.dataset.coords = JSON.stringify({ lat, lon });
+  renderCurrent(data.current, data.unit);
+  renderForecast(data.daily, data.unit);
+}
+
+// Keeps the shown location fresh with server-pushed updates; polls instead when the server has no stream slot
+const LIVE_POLL_MS = 15 * 60 * 1000;
+let liveSource = null;
+let livePoll = null;
+function subscribeLive(lat, lon) {
+  closeLive();
+  const key = forecastKey(lat, lon);
+  const update = (data) => {
+    renderCurrent(data.current, data.unit);
+    renderForecast(data.daily, data.unit);
+    idbPut("forecasts", key, data);
+  };
+  const poll = () => {
+    livePoll = setInterval(async () => {
+      try {
+        const res = await fetch(`/api/weather?lat=${lat}&lon=${lon}&unit=${UNIT}`);
+        if (res.ok) update(await res.json());
+      } catch {}
+    }, LIVE_POLL_MS);
+  };
+  if (!window.EventSource) return poll();
+  const source = liveSource = new EventSource(`/api/weather/stream?lat=${lat}&lon=${lon}&unit=${UNIT}`);
+  source.addEventListener("weather", (e) => update(JSON.parse(e.data)));
+  // A refused stream (503) is closed for good rather than retried
+  source.addEventListener("error", () => {
+    if (source === liveSource && source.readyState === EventSource.CLOSED) {
+      liveSource = null;
+      poll();
+    }
+  });
+}
+
+function closeLive() {
+  if (liveSource) liveSource.close();
+  liveSource = null;
+  clearInterval(livePoll);
+  livePoll = null;
+}
+
 // Renders the current weather
 function renderCurrent(c, unit) {
   const tempUnit = unit === "fahrenheit" ? "°F" : "°C";
@@ -227,8 +323,20 @@ function ensureDates() {
   return { start_date: s, end_date: e };
 }
 
+// Saved requests as last shown; edits apply here first and are rolled back if the server refuses them
+let savedRows = [];
+function setSaved(rows) {
+  savedRows = rows;
+  renderSaved(rows);
+  idbPut("saved", "list", rows.filter(r => !r.pending));
+}
+function savedIndex(id) {
+  return savedRows.findIndex(r => String(r.id) === String(id));
+}
+
 // Saves the weather request to database
 async function saveRequest() {
+  let tempId = null;
   try {
     const { start_date, end_date } = ensureDates();
     let body;
@@ -243,6 +351,10 @@ async function saveRequest() {
       if (!q) throw new Error("Enter a location or fetch weather first.");
       body = { query: q, start_date, end_date, unit: UNIT };
     }
+    // Show the row right away; a query's label and coordinates are filled in once the server resolves them
+    tempId = `pending-${Date.now()}`;
+    setSaved([{ id: tempId, pending: true, label: body.label || body.query || `${body.lat},${body.lon}`,
+                lat: body.lat, lon: body.lon, start_date, end_date, unit: UNIT }, ...savedRows]);
     const res = await fetch("/api/requests", {
       method: "POST",
       headers: { "Content-Type": "application/json", ...authHeaders() },
@@ -250,20 +362,29 @@ async function saveRequest() {
     });
     const data = await res.json();
     if (!res.ok) throw new Error(data.error || "Save failed");
-    await fetchSaved(); // refresh list
+    const rowRes = await fetch(`/api/requests/${data.id}`, { headers: authHeaders() });
+    const row = rowRes.ok ? await rowRes.json() : { ...savedRows[savedIndex(tempId)], id: data.id, pending: false };
+    setSaved(savedRows.map(r => r.id === tempId ? row : r));
   } catch (e) {
+    if (tempId) setSaved(savedRows.filter(r => r.id !== tempId));
     showError(e.message || "Save failed");
   }
 }
 
-// Gets the saved requests
+// Gets the saved requests: the stored list first, then the server's (revalidated by ETag)
 async function fetchSaved() {
+  if (!savedRows.length) {
+    const cached = await idbGet("saved", "list");
+    if (cached && !savedRows.length) renderSaved(savedRows = cached);
+  }
   try {
     const res = await fetch("/api/requests", { headers: authHeaders() });
+    if (!res.ok) throw new Error();
     const list = await res.json();
-    renderSaved(list);
+    setSaved([...savedRows.filter(r => r.pending), ...list]);
+    prefetchSavedRanges(list);
   } catch {
-    savedListEl.innerHTML = `<div class="empty">Could not load saved requests.</div>`;
+    if (!savedRows.length) savedListEl.innerHTML = `<div class="empty">Could not load saved requests.</div>`;
   }
 }
 
@@ -274,9 +395,9 @@ function renderSaved(list) {
     return;
   }
   savedListEl.innerHTML = list.map(r => {
-    const loc = `${Number(r.lat).toFixed(4)}, ${Number(r.lon).toFixed(4)}`;
+    const loc = r.lat == null ? "locating…" : `${Number(r.lat).toFixed(4)}, ${Number(r.lon).toFixed(4)}`;
     return `
-      <div class="saved-item" data-id="${r.id}" data-lat="${r.lat}" data-lon="${r.lon}">
+      <div class="saved-item${r.pending ? " pending" : ""}" data-id="${r.id}" data-lat="${r.lat}" data-lon="${r.lon}">
         <div>
           <div class="title">${escapeHtml(r.label)}</div>
           <div class="meta">${iso(r.start_date)} → ${iso(r.end_date)} • ${escapeHtml(r.unit)} • ${loc}</div>
@@ -291,14 +412,79 @@ function renderSaved(list) {
   }).join("");
 }
 
+// Saved-range lookups queued within a few milliseconds share one POST /api/requests/weather
+const rangeQueue = new Map();
+let rangeTimer = null;
+function loadSavedRange(id) {
+  id = String(id);
+  let entry = rangeQueue.get(id);
+  if (!entry) {
+    entry = {};
+    entry.promise = new Promise((resolve, reject) => { entry.resolve = resolve; entry.reject = reject; });
+    rangeQueue.set(id, entry);
+  }
+  if (!rangeTimer) rangeTimer = setTimeout(flushSavedRanges, 10);
+  return entry.promise;
+}
+
+async function flushSavedRanges() {
+  const batch = new Map(rangeQueue);
+  rangeQueue.clear();
+  rangeTimer = null;
+  try {
+    const res = await fetch("/api/requests/weather", {
+      method: "POST",
+      headers: { "Content-Type": "application/json", ...authHeaders() },
+      body: JSON.stringify({ ids: [...batch.keys()].map(Number) })
+    });
+    if (!res.ok) throw new Error((await res.json().catch(() => ({}))).error || "Failed to load range");
+    // One NDJSON line per request, in completion order
+    for (const line of (await res.text()).split("\n")) {
+      if (!line) continue;
+      const item = JSON.parse(line);
+      const id = String(item.request ? item.request.id : item.id);
+      const entry = batch.get(id);
+      if (!entry) continue;
+      batch.delete(id);
+      if (item.error) { entry.reject(new Error(item.error)); continue; }
+      idbPut("ranges", id, item);
+      entry.resolve(item);
+    }
+  } catch (e) {
+    batch.forEach(entry => entry.reject(e));
+    return;
+  }
+  batch.forEach(entry => entry.reject(new Error("Not found")));
+}
+
+// Background range loads: only the newest few rows, once per tab, and never on metered or offline connections
+const PREFETCH_RANGES = 10;
+let rangesPrefetched = false;
+
+// Loads ranges not stored yet in one background call, so View works at once and offline
+async function prefetchSavedRanges(rows) {
+  const conn = navigator.connection || {};
+  if (rangesPrefetched || !navigator.onLine || conn.saveData || /2g/.test(conn.effectiveType || "")) return;
+  rangesPrefetched = true;
+  const idle = window.requestIdleCallback || ((fn) => setTimeout(fn, 1000));
+  idle(async () => {
+    const ids = rows.slice(0, PREFETCH_RANGES).map(r => String(r.id));
+    const stored = await Promise.all(ids.map(id => idbGet("ranges", id)));
+    ids.filter((id, i) => !stored[i]).forEach(id => loadSavedRange(id).catch(() => {}));
+  });
+}
+
 async function viewSavedRequest(id) {
+  const seq = ++viewSeq;
+  closeLive();
+  const cached = await idbGet("ranges", String(id));
+  if (seq !== viewSeq) return;
+  if (cached) renderSavedRange(cached);
   try {
-    const res = await fetch(`/api/requests/${id}/weather`, { headers: authHeaders() });
-    const data = await res.json();
-    if (!res.ok) throw new Error(data.error || "Failed to load range");
-    renderSavedRange(data);
+    const data = await loadSavedRange(id);
+    if (seq === viewSeq) renderSavedRange(data);
   } catch (e) {
-    showError(e.message || "Failed to load range");
+    if (seq === viewSeq && !cached) showError(e.message || "Failed to load range");
   }
 }
 
@@ -327,46 +513,60 @@ function renderSavedRange(payload) {
 
 async function deleteRequest(id) {
   if (!confirm("Delete this request?")) return;
-  const res = await fetch(`/api/requests/${id}`, { method: "DELETE", headers: authHeaders() });
-  const data = await res.json().catch(()=>({}));
-  if (!res.ok) return showError(data.error || "Delete failed");
-  fetchSaved();
+  const idx = savedIndex(id);
+  const row = savedRows[idx];
+  setSaved(savedRows.filter(r => String(r.id) !== String(id)));
+  const res = await fetch(`/api/requests/${id}`, { method: "DELETE", headers: authHeaders() }).catch(() => null);
+  const data = res ? await res.json().catch(()=>({})) : {};
+  if (!res || !res.ok) {
+    if (row) {
+      const rows = savedRows.slice();
+      rows.splice(Math.min(idx, rows.length), 0, row);
+      setSaved(rows);
+    }
+    return showError(data.error || "Delete failed");
+  }
+  idbDelete("ranges", String(id));
 }
 
-async function editRequestPrompt(id, rowEl) {
+async function editRequestPrompt(id) {
   // Simple prompts; you could switch to an inline edit UI later
-  const current = rowEl.querySelector(".meta").textContent;
-  const parts = current.split("•")[0].trim().split("→").map(s => s.trim());
-  const start0 = parts[0]; const end0 = parts[1];
+  const row = savedRows[savedIndex(id)];
+  if (!row) return;
+  const start0 = iso(row.start_date); const end0 = iso(row.end_date);
   const newStart = prompt("New start date (YYYY-MM-DD):", start0) || start0;
   const newEnd = prompt("New end date (YYYY-MM-DD):", end0) || end0;
-  const unit0 = /celsius/i.test(current) ? "celsius" : "fahrenheit";
+  const unit0 = /celsius/i.test(row.unit) ? "celsius" : "fahrenheit";
   const newUnit = prompt("Unit (fahrenheit|celsius):", unit0) || unit0;
   const body = {};
   if (newStart !== start0) body.start_date = newStart;
   if (newEnd !== end0) body.end_date = newEnd;
   if (newUnit !== unit0) body.unit = newUnit;
   if (Object.keys(body).length === 0) return;
+  setSaved(savedRows.map(r => r === row ? { ...row, ...body } : r));
   const res = await fetch(`/api/requests/${id}`, {
     method: "PUT",
     headers: { "Content-Type": "application/json", ...authHeaders() },
     body: JSON.stringify(body)
-  });
-  const data = await res.json().catch(()=>({}));
-  if (!res.ok) return showError(data.error || "Update failed");
-  fetchSaved();
+  }).catch(() => null);
+  const data = res ? await res.json().catch(()=>({})) : {};
+  if (!res || !res.ok) {
+    setSaved(savedRows.map(r => String(r.id) === String(id) ? row : r));
+    return showError(data.error || "Update failed");
+  }
+  idbDelete("ranges", String(id));
 }
 
 saveBtn.addEventListener("click", saveRequest);
 refreshBtn.addEventListener("click", fetchSaved);
 savedListEl.addEventListener("click", (e) => {
   const row = e.target.closest(".saved-item");
-  if (!row) return;
+  if (!row || row.classList.contains("pending")) return;
   const id = row.dataset.id;
   if (e.target.classList.contains("view")) {
     viewSavedRequest(id);
   } else if (e.target.classList.contains("edit")) {
-    editRequestPrompt(id, row);
+    editRequestPrompt(id);
   } else if (e.target.classList.contains("delete")) {
     deleteRequest(id);
   }
@@ -432,4 +632,9 @@ document.addEventListener("keydown", function (e) {
 });
 
 // Load saved requests on startup
-fetchSaved();
\ No newline at end of file
+fetchSaved();
+
+// Offline shell: the service worker keeps the page and hashed static files
+if ("serviceWorker" in navigator) {
+  window.addEventListener("load", () => navigator.serviceWorker.register("/sw.js").catch(() => {}));
+}
\ No newline at end of file
@@ -0,0 +1,54 @@
+// Offline shell: hashed static files are served cache-first and the page network-first with a cached fallback.
+// API data is kept by app.js in IndexedDB, so /api/* always goes to the network here.
+const CACHE = "weatherapp-shell-v1";
+
+self.addEventListener("install", () => self.skipWaiting());
+
+self.addEventListener("activate", (e) => {
+  e.waitUntil((async () => {
+    for (const key of await caches.keys()) {
+      if (key !== CACHE) await caches.delete(key);
+    }
+    await self.clients.claim();
+  })());
+});
+
+self.addEventListener("fetch", (e) => {
+  const req = e.request;
+  if (req.method !== "GET") return;
+  const url = new URL(req.url);
+  if (url.origin !== self.location.origin) return;
+  if (url.pathname.startsWith("/static/") && url.searchParams.has("v")) {
+    e.respondWith(cacheFirst(req, url));
+  } else if (url.pathname === "/") {
+    e.respondWith(networkFirst(req));
+  }
+});
+
+// A ?v= URL never changes, so once stored it is served without a request; older versions are dropped
+async function cacheFirst(req, url) {
+  const cache = await caches.open(CACHE);
+  const hit = await cache.match(req);
+  if (hit) return hit;
+  const res = await fetch(req);
+  if (res.ok) {
+    for (const old of await cache.keys()) {
+      if (new URL(old.url).pathname === url.pathname) await cache.delete(old);
+    }
+    await cache.put(req, res.clone());
+  }
+  return res;
+}
+
+async function networkFirst(req) {
+  const cache = await caches.open(CACHE);
+  try {
+    const res = await fetch(req);
+    if (res.ok) await cache.put(req, res.clone());
+    return res;
+  } catch (err) {
+    const hit = await cache.match(req);
+    if (hit) return hit;
+    throw err;
+  }
+}
@@ -0,0 +1,89 @@
+from typing import Any, Callable, Dict, List
+
+# Open-Meteo is always queried in metric; these fields get converted for imperial views
+TEMP_FIELDS = ("temperature_2m", "apparent_temperature", "temperature_2m_max", "temperature_2m_min")
+WIND_FIELDS = ("wind_speed_10m", "wind_speed_10m_max", "wind_gusts_10m_max")
+PRECIP_FIELDS = ("precipitation", "precipitation_sum")
+
+IMPERIAL_LABELS = {"temp": "°F", "wind": "mph", "precip": "inch"}
+
+
+def normalize_unit(unit: str | None) -> str:
+    return "celsius" if str(unit or "").lower().startswith("c") else "fahrenheit"
+
+
+def _column(values: List[Any] | None, fn: Callable[[float], float], ndigits: int) -> List[Any]:
+    return [None if v is None else round(fn(v), ndigits) for v in (values or [])]
+
+
+def _scalar(value: Any, fn: Callable[[float], float], ndigits: int) -> Any:
+    return None if value is None else round(fn(value), ndigits)
+
+
+def c_to_f(c: float) -> float:
+    return c * 9.0 / 5.0 + 32.0
+
+
+def kmh_to_mph(kmh: float) -> float:
+    return kmh / 1.609344
+
+
+def mm_to_inch(mm: float) -> float:
+    return mm / 25.4
+
+
+_CONVERSIONS = (
+    (TEMP_FIELDS, c_to_f, 1, "temp"),
+    (WIND_FIELDS, kmh_to_mph, 1, "wind"),
+    (PRECIP_FIELDS, mm_to_inch, 2, "precip"),
+)
+
+
+def convert_daily(daily: Dict[str, Any], temp_unit: str) -> Dict[str, Any]:
+    """Return `daily` in the requested unit system; converts whole columns at once."""
+    if temp_unit != "fahrenheit" or not daily:
+        return daily
+    out = dict(daily)
+    for fields, fn, ndigits, _ in _CONVERSIONS:
+        for f in fields:
+            if f in out:
+                out[f] = _column(out[f], fn, ndigits)
+    return out
+
+
+def convert_current(current: Dict[str, Any], temp_unit: str) -> Dict[str, Any]:
+    if temp_unit != "fahrenheit" or not current:
+        return current
+    out = dict(current)
+    for fields, fn, ndigits, _ in _CONVERSIONS:
+        for f in fields:
+            if f in out:
+                out[f] = _scalar(out[f], fn, ndigits)
+    return out
+
+
+def convert_units_labels(labels: Dict[str, Any], temp_unit: str) -> Dict[str, Any]:
+    if temp_unit != "fahrenheit" or not labels:
+        return labels
+    out = dict(labels)
+    for fields, _, _, kind in _CONVERSIONS:
+        for f in fields:
+            if f in out:
+                out[f] = IMPERIAL_LABELS[kind]
+    return out
+
+
+def convert_payload(data: Dict[str, Any], temp_unit: str) -> Dict[str, Any]:
+    """Convert a canonical metric Open-Meteo payload without mutating it (it may be cached)."""
+    if temp_unit != "fahrenheit" or not data:
+        return data
+    out = dict(data)
+    if "current" in out:
+        out["current"] = convert_current(out["current"], temp_unit)
+    if "current_units" in out:
+        out["current_units"] = convert_units_labels(out["current_units"], temp_unit)
+    if "daily" in out:
+        out["daily"] = convert_daily(out["daily"], temp_unit)
+    if "daily_units" in out:
+        out["daily_units"] = convert_units_labels(out["daily_units"], temp_unit)
+    return out
@@ -0,0 +1,363 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict
+from urllib.parse import urlsplit
+
+from metrics import upstream_duration, upstream_size
+
+OPEN_METEO_BASE = os.getenv("OPEN_METEO_BASE", "https://api.open-meteo.com/v1/forecast")
+OPEN_METEO_ARCHIVE_BASE = os.getenv("OPEN_METEO_ARCHIVE_BASE", "https://archive-api.open-meteo.com/v1/archive")
+GEOCODIFY_BASE = os.getenv("GEOCODIFY_BASE", "https://api.geocodify.com/v2")
+HEADERS = {"Accept": "application/json", "User-Agent": "WeatherApp/1.0 (+server)"}
+
+# Outbound client settings (seconds for all timings)
+POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", "20"))  # keep-alive connections per host
+MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "8"))  # in-flight requests per host
+QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "5"))
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3.05"))
+RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.25"))
+BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "2"))
+BREAKER_THRESHOLD = int(os.getenv("UPSTREAM_BREAKER_THRESHOLD", "5"))  # consecutive failures
+BREAKER_COOLDOWN = float(os.getenv("UPSTREAM_BREAKER_COOLDOWN", "30"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+# requests and httpx make up most of this module's import time, so they load with the first client that needs them
+@lru_cache(maxsize=None)
+def _requests():
+    import requests
+    from requests.adapters import HTTPAdapter
+    return requests, HTTPAdapter
+
+
+# optional: native asyncio HTTP client; without it AsyncUpstreamClient runs the pooled sync client in a thread
+@lru_cache(maxsize=None)
+def _httpx():
+    try:
+        import httpx
+    except ImportError:
+        return None
+    return httpx
+
+
+class UpstreamError(Exception):
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+
+class RateLimited(UpstreamError):
+    pass
+
+
+class CircuitOpen(UpstreamError):
+    pass
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; lets one probe through after `cooldown`."""
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.cooldown:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class _HostState:
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "rate_limited": 0, "rejected": 0, "in_flight": 0}
+
+    def count(self, name: str, delta: int = 1) -> None:
+        with self.lock:
+            self.stats[name] += delta
+
+
+_hosts: Dict[str, _HostState] = {}
+_hosts_lock = threading.Lock()
+
+
+def _host(url: str) -> _HostState:
+    netloc = urlsplit(url).netloc
+    state = _hosts.get(netloc)
+    if state is None:
+        with _hosts_lock:
+            state = _hosts.setdefault(netloc, _HostState())
+    return state
+
+
+def _backoff(attempt: int, retry_after: str | None = None) -> float:
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    # Full jitter: spreads retries from many workers instead of synchronizing them
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+class UpstreamClient:
+    """Shared keep-alive session with per-host concurrency limits, retries and circuit breaking."""
+
+    def __init__(self, pool_size: int = POOL_SIZE):
+        self.pool_size = pool_size
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    requests, HTTPAdapter = _requests()
+                    session = requests.Session()
+                    session.headers.update(HEADERS)
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    def warm(self, urls) -> Dict[str, Any]:
+        """Open a keep-alive connection to each URL's host; returns netloc -> HTTP status or error text.
+
+        Uses a HEAD request outside the concurrency limits, retries and breaker:
+        any response means the connection is up, whatever its status.
+        """
+        out = {}
+        for url in urls:
+            netloc = urlsplit(url).netloc
+            try:
+                out[netloc] = self.session.head(url, timeout=(CONNECT_TIMEOUT, CONNECT_TIMEOUT)).status_code
+            except _requests()[0].RequestException as e:
+                out[netloc] = str(e)
+        return out
+
+    def get_json(self, url: str, params: Dict[str, Any] | None = None, timeout: float = 10) -> Any:
+        host = _host(url)
+        if not host.slots.acquire(timeout=QUEUE_TIMEOUT):
+            host.count("rejected")
+            raise UpstreamError(f"{urlsplit(url).netloc} busy: too many requests in flight")
+        host.count("in_flight")
+        try:
+            _check_breaker(host, url)
+            return self._get_with_retries(host, url, params, timeout)
+        finally:
+            host.count("in_flight", -1)
+            host.slots.release()
+
+    def _get_with_retries(self, host: _HostState, url: str, params, timeout: float) -> Any:
+        session, requests = self.session, _requests()[0]
+        attempt = 0
+        while True:
+            host.count("requests")
+            retry_after = None
+            t0 = time.perf_counter()
+            try:
+                r = session.get(url, params=params, timeout=(CONNECT_TIMEOUT, timeout))
+                status = r.status_code
+                retry_after = r.headers.get("Retry-After")
+                _observe(url, status, t0, len(r.content))
+            except requests.RequestException as e:
+                status, error = None, e
+                _observe(url, None, t0)
+            else:
+                error = None
+                if status < 400:
+                    host.breaker.record_success()
+                    return r.json()
+
+            if attempt >= RETRIES or (status is not None and status not in RETRY_STATUSES):
+                break
+            attempt += 1
+            host.count("retries")
+            time.sleep(_backoff(attempt, retry_after))
+
+        return _raise_for(host, url, status, error)
+
+
+def _observe(url: str, status: int | None, t0: float, size: int | None = None) -> None:
+    netloc = urlsplit(url).netloc
+    upstream_duration.observe(time.perf_counter() - t0, host=netloc, status=status or "error")
+    if size is not None:
+        upstream_size.observe(size, host=netloc)
+
+
+def _check_breaker(host: _HostState, url: str) -> None:
+    if not host.breaker.allow():
+        host.count("rejected")
+        raise CircuitOpen(f"{urlsplit(url).netloc} unavailable (circuit open)")
+
+
+def _raise_for(host: _HostState, url: str, status: int | None, error: Exception | None):
+    if status == 429:
+        # Rate limiting means the upstream is reachable, so it does not trip the breaker
+        host.count("rate_limited")
+        host.breaker.record_success()
+        raise RateLimited("rate_limited", status)
+    host.count("failures")
+    if status is None or status >= 500:
+        host.breaker.record_failure()
+    else:
+        host.breaker.record_success()
+    if error is not None:
+        raise UpstreamError(str(error)) from error
+    raise UpstreamError(f"{status} error from {urlsplit(url).netloc}", status)
+
+
+class AsyncUpstreamClient:
+    """Awaitable counterpart of UpstreamClient sharing its per-host breakers.
+
+    Uses httpx when installed. Otherwise each call runs the pooled sync client
+    in a worker thread, so the event loop is still never blocked.
+    """
+
+    def __init__(self, sync_client: UpstreamClient, pool_size: int = POOL_SIZE):
+        self.sync_client = sync_client
+        self.pool_size = pool_size
+        self._client = None
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+
+    def _http(self):
+        if self._client is None:
+            httpx = _httpx()
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            self._client = httpx.AsyncClient(headers=HEADERS, limits=limits)
+        return self._client
+
+    async def get_json(self, url: str, params: Dict[str, Any] | None = None, timeout: float = 10) -> Any:
+        if _httpx() is None:
+            return await asyncio.to_thread(self.sync_client.get_json, url, params, timeout)
+        host = _host(url)
+        netloc = urlsplit(url).netloc
+        slots = self._slots.setdefault(netloc, asyncio.Semaphore(MAX_CONCURRENCY))
+        try:
+            await asyncio.wait_for(slots.acquire(), QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            host.count("rejected")
+            raise UpstreamError(f"{netloc} busy: too many requests in flight")
+        host.count("in_flight")
+        try:
+            _check_breaker(host, url)
+            return await self._get_with_retries(host, url, params, timeout)
+        finally:
+            host.count("in_flight", -1)
+            slots.release()
+
+    async def _get_with_retries(self, host: _HostState, url: str, params, timeout: float) -> Any:
+        client, httpx = self._http(), _httpx()
+        attempt = 0
+        while True:
+            host.count("requests")
+            retry_after = None
+            t0 = time.perf_counter()
+            try:
+                r = await client.get(url, params=params, timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT))
+                status = r.status_code
+                retry_after = r.headers.get("Retry-After")
+                _observe(url, status, t0, len(r.content))
+            except httpx.HTTPError as e:
+                status, error = None, e
+                _observe(url, None, t0)
+            else:
+                error = None
+                if status < 400:
+                    host.breaker.record_success()
+                    return r.json()
+
+            if attempt >= RETRIES or (status is not None and status not in RETRY_STATUSES):
+                break
+            attempt += 1
+            host.count("retries")
+            await asyncio.sleep(_backoff(attempt, retry_after))
+
+        return _raise_for(host, url, status, error)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+client = UpstreamClient()
+async_client = AsyncUpstreamClient(client)
+
+
+# Calls Geocodify; errors come back as {"_error": ...} like the route handlers expect
+def geo_get(endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        return client.get_json(f"{GEOCODIFY_BASE}/{endpoint}", params=params, timeout=10)
+    except RateLimited:
+        return {"_error": "rate_limited"}
+    except Exception as e:
+        return {"_error": str(e)}
+
+
+async def ageo_get(endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        return await async_client.get_json(f"{GEOCODIFY_BASE}/{endpoint}", params=params, timeout=10)
+    except RateLimited:
+        return {"_error": "rate_limited"}
+    except Exception as e:
+        return {"_error": str(e)}
+
+
+# Calls Open-Meteo; raises UpstreamError on failure
+def open_meteo_get(params: Dict[str, Any], base: str = OPEN_METEO_BASE) -> Dict[str, Any]:
+    return client.get_json(base, params=params, timeout=15) or {}
+
+
+async def aopen_meteo_get(params: Dict[str, Any], base: str = OPEN_METEO_BASE) -> Dict[str, Any]:
+    return await async_client.get_json(base, params=params, timeout=15) or {}
+
+
+def upstream_stats() -> Dict[str, Any]:
+    out = {}
+    for netloc, state in list(_hosts.items()):
+        with state.lock:
+            entry = dict(state.stats)
+        entry["circuit"] = state.breaker.state
+        out[netloc] = entry
+    return out